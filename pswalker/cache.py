@@ -0,0 +1,296 @@
+"""
+Persistent caches of fitted mirror to imager gradients and detector noise
+"""
+############
+# Standard #
+############
+import json
+import logging
+import os
+import tempfile
+import time
+
+##########
+# Module #
+##########
+logger = logging.getLogger(__name__)
+
+
+class _JSONCache(object):
+    """
+    Entries with a timestamp, kept in a JSON file
+
+    Entries older than ``max_age`` are ignored and evicted, and once there are
+    more than ``max_entries`` the least recently updated entries are dropped.
+    The file is rewritten atomically on :meth:`.save`.
+    """
+
+    version = 1
+
+    def __init__(self, path, max_age=None, max_entries=256):
+        self.path = os.path.expanduser(path)
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.entries = dict()
+        self.load()
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if self._stale(entry):
+            logger.debug("Evicting stale cache entry %s", key)
+            del self.entries[key]
+            return None
+        return entry
+
+    def _put(self, key, entry):
+        entry["timestamp"] = time.time()
+        self.entries[key] = entry
+        self.evict()
+
+    def _stale(self, entry):
+        if self.max_age is None:
+            return False
+        return time.time() - entry["timestamp"] > self.max_age
+
+    def evict(self):
+        """
+        Remove stale entries and the oldest entries beyond :attr:`.max_entries`
+        """
+        for key in [k for k, v in self.entries.items() if self._stale(v)]:
+            del self.entries[key]
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            oldest = sorted(self.entries, key=lambda k: self.entries[k]["timestamp"])
+            for key in oldest[: len(self.entries) - self.max_entries]:
+                del self.entries[key]
+
+    def load(self):
+        """
+        Read the entries from disk, ignoring a missing or unreadable file
+        """
+        try:
+            with open(self.path, "r") as f:
+                contents = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Unable to read cache %s: %s", self.path, e)
+            return
+        if contents.get("version") != self.version:
+            logger.warning("Ignoring cache with unknown version")
+            return
+        self.entries = contents.get("entries", dict())
+        self.evict()
+
+    def save(self):
+        """
+        Write the entries to disk
+        """
+        self.evict()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves half a cache
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": self.version, "entries": self.entries}, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return "<{}: {} entries at {}>".format(
+            type(self).__name__, len(self), self.path
+        )
+
+
+class GradientCache(_JSONCache):
+    """
+    On-disk cache of the linear fits found while walking a mirror
+
+    Each entry stores the ``slope`` and ``intercept`` of a :class:`.LinearFit`
+    between a mirror and an imager field, keyed by the mirror name, detector
+    name, field and a bucket of the beam energy. :func:`.iterwalk` uses the
+    cached slopes as its ``gradients`` so the first move of a walk can aim at
+    the goal rather than making a blind probe step.
+
+    Entries older than ``max_age`` are ignored and evicted, and once there are
+    more than ``max_entries`` the least recently updated entries are dropped.
+    The cache is stored as JSON and rewritten atomically on :meth:`.save`.
+
+    Parameters
+    ----------
+    path : str
+        Location of the cache file. It is created on the first save
+
+    max_age : float, optional
+        Seconds after which an entry is considered stale. None keeps entries
+        forever
+
+    max_entries : int, optional
+        Maximum number of entries to keep
+
+    energy_bucket : float, optional
+        Width of the beam energy buckets. Walks at energies within the same
+        bucket share an entry
+
+    Example
+    -------
+    .. code::
+
+        cache = GradientCache('~/.pswalker_gradients.json')
+        RE(iterwalk(yags, mirrors, goals, cache=cache, energy=9.5))
+    """
+
+    def __init__(self, path, max_age=7 * 24 * 3600, max_entries=256, energy_bucket=0.1):
+        self.energy_bucket = energy_bucket
+        super().__init__(path, max_age=max_age, max_entries=max_entries)
+
+    def key(self, mirror, detector, field, energy=None):
+        """
+        Key of the entry for a mirror, detector, field and beam energy
+        """
+        if energy is None:
+            bucket = None
+        else:
+            bucket = int(round(energy / self.energy_bucket))
+        return "{}|{}|{}|{}".format(mirror, detector, field, bucket)
+
+    def get(self, mirror, detector, field, energy=None):
+        """
+        Find a fresh entry
+
+        Parameters
+        ----------
+        mirror : str
+            Name of the mirror
+
+        detector : str
+            Name of the detector
+
+        field : str
+            Name of the detector field that was fit
+
+        energy : float, optional
+            Beam energy of the walk
+
+        Returns
+        -------
+        entry : dict or None
+            The ``slope``, ``intercept`` and ``timestamp`` of the fit, or None
+            if there is no fresh entry
+        """
+        return self._get(self.key(mirror, detector, field, energy))
+
+    def put(self, mirror, detector, field, values, energy=None):
+        """
+        Store the result of a fit
+
+        Parameters
+        ----------
+        mirror : str
+            Name of the mirror
+
+        detector : str
+            Name of the detector
+
+        field : str
+            Name of the detector field that was fit
+
+        values : dict
+            Fit parameters, must contain ``slope`` and may contain
+            ``intercept``
+
+        energy : float, optional
+            Beam energy of the walk
+        """
+        key = self.key(mirror, detector, field, energy)
+        self._put(
+            key,
+            {
+                "mirror": mirror,
+                "detector": detector,
+                "field": field,
+                "energy": energy,
+                "slope": float(values["slope"]),
+                "intercept": float(values.get("intercept", float("nan"))),
+            },
+        )
+        logger.debug("Cached gradient %s for %s", values["slope"], key)
+
+
+class NoiseCache(_JSONCache):
+    """
+    On-disk cache of the noise of detector readings at rest
+
+    Each entry stores the statistics found by :func:`.measure_noise` for a
+    detector field, so the noise only has to be characterized again once the
+    entry expires. Noise follows the state of the beam, so entries expire
+    much sooner than those of a :class:`.GradientCache`.
+
+    Parameters
+    ----------
+    path : str
+        Location of the cache file. It is created on the first save
+
+    max_age : float, optional
+        Seconds after which an entry is considered stale. None keeps entries
+        forever
+
+    max_entries : int, optional
+        Maximum number of entries to keep
+    """
+
+    def __init__(self, path, max_age=3600, max_entries=256):
+        super().__init__(path, max_age=max_age, max_entries=max_entries)
+
+    def key(self, detector, field):
+        """
+        Key of the entry for a detector field
+        """
+        return "{}|{}".format(detector, field)
+
+    def get(self, detector, field):
+        """
+        Find a fresh entry
+
+        Parameters
+        ----------
+        detector : str
+            Name of the detector
+
+        field : str
+            Name of the detector field
+
+        Returns
+        -------
+        entry : dict or None
+            The statistics of :func:`.noise_statistics` and a ``timestamp``,
+            or None if there is no fresh entry
+        """
+        return self._get(self.key(detector, field))
+
+    def put(self, detector, field, stats):
+        """
+        Store the noise of a detector field
+
+        Parameters
+        ----------
+        detector : str
+            Name of the detector
+
+        field : str
+            Name of the detector field
+
+        stats : dict
+            Statistics from :func:`.noise_statistics`
+        """
+        entry = dict((k, float(v)) for k, v in stats.items())
+        entry.update(detector=detector, field=field)
+        self._put(self.key(detector, field), entry)
+        logger.debug("Cached noise %s for %s on %s", stats, field, detector)
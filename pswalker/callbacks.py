@@ -5,6 +5,11 @@ Specialized Callbacks for Skywalker
 # Standard #
 ############
 import logging
+import threading
+import time
+import warnings
+from collections import namedtuple
+from functools import partial
 
 ###############
 # Third Party #
@@ -13,11 +18,12 @@ import lmfit
 import numpy as np
 from bluesky.callbacks import LiveFit, LivePlot
 from lmfit.models import LinearModel
+from matplotlib.patches import Rectangle
 
 ##########
 # Module #
 ##########
-from .utils.argutils import isiterable
+from .filters import FilterSpec
 
 logger = logging.getLogger(__name__)
 
@@ -31,9 +37,10 @@ def apply_filters(doc, filters=None, drop_missing=True):
     doc : dict
         Bluesky Document to filter
 
-    filters : dict
+    filters : dict or FilterSpec
         Filters are provided in a dictionary of key / callable pairs that take
-        a single input from the data stream and return a boolean value.
+        a single input from the data stream and return a boolean value. See
+        :mod:`pswalker.filters` for declarative filters
 
     drop_missing : bool, optional
         Only include documents who have associated data for each filter key.
@@ -52,46 +59,9 @@ def apply_filters(doc, filters=None, drop_missing=True):
         apply_filters(doc, filters = {'a' : lambda x : x > 0,
                                       'c' : lambda x : 4 < x < 6})
     """
-    resp = []
-    filters = filters or dict()
-    # Iterate through filters
-    for key, func in filters.items():
-        try:
-
-            # Check iterables for nan and inf
-            if isiterable(doc[key]):
-                if any(np.isnan(doc[key])) or any(np.isinf(doc[key])):
-                    resp.append(not drop_missing)
-                    continue
-
-            # Check string entries for nan and inf
-            elif isinstance(doc[key], str):
-                if "inf" == doc[key].lower() or "nan" == doc[key].lower():
-                    resp.append(not drop_missing)
-                    continue
-
-            # Handle all other types
-            else:
-                if np.isnan(doc[key]) or np.isinf(doc[key]):
-                    resp.append(not drop_missing)
-                    continue
-
-            # Evaluate filter
-            resp.append(bool(func(doc[key])))
-
-        # Handle missing information
-        except KeyError:
-            resp.append(not drop_missing)
-
-        # Handle improper filter
-        except Exception as e:
-            logger.critical(
-                "Filter associated with event_key {}"
-                'reported exception "{}"'
-                "".format(key, e)
-            )
-    # Summarize
-    return all(resp)
+    if not isinstance(filters, FilterSpec):
+        filters = FilterSpec(filters or dict())
+    return filters.passes(doc, drop_missing=drop_missing)
 
 
 def rank_models(models, target, **kwargs):
@@ -100,8 +70,9 @@ def rank_models(models, target, **kwargs):
 
     Parameters
     ----------
-    models : list
-        List of models to evaluate
+    models : list or ModelSet
+        List of models to evaluate. Pass the same :class:`.ModelSet` every
+        time to reuse the predictions of models whose fit has not changed
 
     target : float
         Actual value of target
@@ -114,28 +85,453 @@ def rank_models(models, target, **kwargs):
     model_ranking : list
         List of models sorted by accuracy of predictions
     """
-    # Initialize values
-    model_ranking = np.asarray(models)
-    diffs = list()
-    bad_models = list()
+    if not isinstance(models, ModelSet):
+        models = ModelSet(models)
+    return [ranked.model for ranked in models.rank(target, **kwargs)]
 
-    # Calculate error of each model
-    for model in models:
-        try:
-            estimate = model.eval(**kwargs)
-            diffs.append(np.abs(estimate - target))
-            logger.debug(
-                "Model {} predicted a value of {}" "".format(model.name, estimate)
+
+# Place of a model in a ranking
+Ranking = namedtuple("Ranking", ["model", "estimate", "uncertainty", "error"])
+
+
+class ModelSet(object):
+    """
+    Candidate models that are evaluated and ranked together
+
+    Models that are linear in their parameters, such as :class:`.LinearFit`
+    and :class:`.MultiPitchFit`, are evaluated in a single vectorized pass
+    from their :attr:`~.LiveBuild.linear_params` and features, along with
+    the uncertainty of each prediction from the covariance of the fit. Other
+    models are evaluated with their own ``eval``. The prediction of each
+    :class:`.LiveBuild` is kept until its :attr:`~.LiveBuild.fit_version`
+    or the point it is evaluated at changes.
+
+    Parameters
+    ----------
+    models : iterable, optional
+        Models to rank
+    """
+
+    def __init__(self, models=None):
+        self.models = list(models or [])
+        # Model id -> (version, inputs, estimate, uncertainty)
+        self._cache = dict()
+
+    def add(self, model):
+        """
+        Add a candidate model
+        """
+        self.models.append(model)
+
+    def predict(self, **kwargs):
+        """
+        Predictions of every model
+
+        Parameters
+        ----------
+        kwargs :
+            All of the keys the models will need to evaluate
+
+        Returns
+        -------
+        estimates : numpy.ndarray
+            Prediction of each model, NaN for models without a fit
+
+        uncertainties : numpy.ndarray
+            Standard error of each prediction, NaN where it is unknown
+        """
+        num = len(self.models)
+        estimates = np.full(num, np.nan)
+        uncertainties = np.full(num, np.nan)
+        # Linear models to evaluate, grouped by number of parameters
+        groups = dict()
+        for i, model in enumerate(self.models):
+            version = getattr(model, "fit_version", None)
+            inputs = _model_inputs(model, kwargs)
+            if version is not None and inputs is not None:
+                cached = self._cache.get(id(model))
+                if cached is not None and cached[:2] == (version, inputs):
+                    estimates[i], uncertainties[i] = cached[2:]
+                    continue
+            if inputs is not None and getattr(model, "linear_params", ()):
+                terms = _linear_terms(model, inputs)
+                if terms is None:
+                    continue
+                groups.setdefault(len(terms[0]), list()).append((i,) + terms)
+            else:
+                try:
+                    estimates[i] = model.eval(**kwargs)
+                except RuntimeError as e:
+                    logger.debug(
+                        "Unable to yield estimate from model {}".format(model.name)
+                    )
+                    logger.debug(e)
+                    continue
+            if version is not None and inputs is not None:
+                self._cache[id(model)] = (version, inputs, estimates[i], np.nan)
+        # Evaluate each group of linear models at once
+        for rows in groups.values():
+            index = np.array([row[0] for row in rows])
+            features = np.array([row[1] for row in rows])
+            params = np.array([row[2] for row in rows])
+            covar = np.array([row[3] for row in rows])
+            estimates[index] = np.einsum("ij,ij->i", features, params)
+            uncertainties[index] = np.sqrt(
+                np.abs(np.einsum("ij,ijk,ik->i", features, covar, features))
             )
-        except RuntimeError as e:
-            bad_models.append(model)
-            diffs.append(np.inf)
-            logger.debug("Unable to yield estimate from model {}" "".format(model.name))
-            logger.debug(e)
-    # Rank performances
-    model_ranking = model_ranking[np.argsort(diffs)]
-    # Remove models who failed to make an estimate
-    return [model for model in model_ranking if model not in bad_models]
+            for i in index:
+                model = self.models[i]
+                self._cache[id(model)] = (
+                    model.fit_version,
+                    _model_inputs(model, kwargs),
+                    estimates[i],
+                    uncertainties[i],
+                )
+        for model, estimate in zip(self.models, estimates):
+            if np.isfinite(estimate):
+                logger.debug(
+                    "Model {} predicted a value of {}".format(model.name, estimate)
+                )
+        return estimates, uncertainties
+
+    def rank(self, target, **kwargs):
+        """
+        Rank the models based on the accuracy of their prediction
+
+        Parameters
+        ----------
+        target : float
+            Actual value of target
+
+        kwargs :
+            All of the keys the models will need to evaluate
+
+        Returns
+        -------
+        ranking : list of :class:`.Ranking`
+            Each model that could make a prediction with its ``estimate``,
+            the ``uncertainty`` of the estimate and its ``error`` from the
+            target, most accurate first
+        """
+        estimates, uncertainties = self.predict(**kwargs)
+        errors = np.abs(estimates - target)
+        valid = np.flatnonzero(np.isfinite(errors))
+        order = valid[np.argsort(errors[valid], kind="stable")]
+        return [
+            Ranking(self.models[i], estimates[i], uncertainties[i], errors[i])
+            for i in order
+        ]
+
+    def __len__(self):
+        return len(self.models)
+
+    def __iter__(self):
+        return iter(self.models)
+
+    def __repr__(self):
+        return "<ModelSet: {} models>".format(len(self))
+
+
+def _model_inputs(model, kwargs):
+    """
+    Values of the independent variables of a model, given by variable or
+    field name, or None if they are not all available
+    """
+    independent = getattr(model, "independent_vars", None)
+    if not isinstance(independent, dict):
+        return None
+    inputs = list()
+    for var, field in independent.items():
+        if var in kwargs:
+            value = kwargs[var]
+        elif field in kwargs:
+            value = kwargs[field]
+        else:
+            return None
+        if not np.isscalar(value):
+            return None
+        inputs.append((var, value))
+    return tuple(inputs)
+
+
+def _linear_terms(model, inputs):
+    """
+    Features, parameters and covariance to evaluate a linear model, or None
+    if the model has no fit
+    """
+    result = model.result
+    if not result:
+        logger.debug("Unable to yield estimate from model {}".format(model.name))
+        return None
+    names = list(model.linear_params)
+    features = [1.0] + list(model.features(**dict(inputs)))
+    params = [result.values[name] for name in names]
+    covar = np.full((len(names), len(names)), np.nan)
+    fit_covar = getattr(result, "covar", None)
+    var_names = list(getattr(result, "var_names", ()))
+    if fit_covar is not None and all(name in var_names for name in names):
+        index = [var_names.index(name) for name in names]
+        covar = np.asarray(fit_covar)[np.ix_(index, index)]
+    return features, params, covar
+
+
+class RunningLeastSquares(object):
+    """
+    Least squares fit of a model that is linear in its parameters, updated
+    one point at a time
+
+    The model is ``y = c0 + c1 * f1 + c2 * f2 + ...`` for a set of features
+    ``f``. Instead of storing every point, the running means and co-moments
+    of the features and dependent variable are kept, so adding a point and
+    solving for the parameters both take constant time. Accumulating about
+    the mean, rather than summing raw powers of the data, keeps the fit
+    precise for small steps around large offsets, e.g. pitches of a few
+    nanoradians around a nominal position.
+
+    Parameters
+    ----------
+    n_features : int
+        Number of features, not including the constant term
+
+    forget : float, optional
+        Exponential forgetting factor between 0 and 1. Every new point scales
+        the weight of the previous points by this factor, so the fit can
+        follow parameters that drift. The default of 1 weights every point
+        equally
+    """
+
+    def __init__(self, n_features, forget=1.0):
+        if not 0 < forget <= 1:
+            raise ValueError(
+                "Forgetting factor must be in (0, 1], not {}".format(forget)
+            )
+        self.n_features = int(n_features)
+        self.forget = float(forget)
+        self.reset()
+
+    def reset(self):
+        """
+        Remove every point from the fit
+        """
+        self.count = 0
+        self.weight = 0.0
+        self._xmean = np.zeros(self.n_features)
+        self._ymean = 0.0
+        self._sxx = np.zeros((self.n_features, self.n_features))
+        self._sxy = np.zeros(self.n_features)
+        self._syy = 0.0
+
+    def update(self, features, y):
+        """
+        Add a point to the fit
+
+        Parameters
+        ----------
+        features : array-like
+            Value of each feature for this point
+
+        y : float
+            Dependent variable
+
+        Returns
+        -------
+        added : bool
+            False if the point was ignored because it was not finite
+        """
+        features = np.asarray(features, dtype=float).ravel()
+        if not np.all(np.isfinite(features)) or not np.isfinite(y):
+            return False
+        # Weighted Welford update of the means and co-moments
+        weight = self.forget * self.weight + 1.0
+        scale = self.forget * self.weight / weight
+        dx = features - self._xmean
+        dy = float(y) - self._ymean
+        self._xmean += dx / weight
+        self._ymean += dy / weight
+        self._sxx *= self.forget
+        self._sxx += scale * np.outer(dx, dx)
+        self._sxy *= self.forget
+        self._sxy += scale * dx * dy
+        self._syy = self.forget * self._syy + scale * dy * dy
+        self.weight = weight
+        self.count += 1
+        return True
+
+    @property
+    def degenerate(self):
+        """
+        Whether the dependent variable, or every feature, has not varied
+        across the points in the fit, leaving nothing to fit. Features that
+        are constant while others vary, e.g. the pitch of the mirror that is
+        not being walked, are left at their guess by :meth:`.fit`
+        """
+        return self._syy <= 0 or not np.any(np.diag(self._sxx) > 0)
+
+    def fit(self, guess=None):
+        """
+        Solve for the parameters
+
+        Directions the data do not constrain, e.g. the slope when every point
+        was taken at the same position, are left at the initial guess and are
+        reported without variance, as the fit is conditional on them.
+
+        Parameters
+        ----------
+        guess : array-like, optional
+            Initial guess of the parameters, constant term first
+
+        Returns
+        -------
+        params : numpy.ndarray
+            Best fit parameters, constant term first
+
+        covar : numpy.ndarray
+            Covariance of the parameters, NaN until there are more points than
+            parameters
+
+        chisqr : float
+            Weighted sum of the squared residuals
+        """
+        size = self.n_features + 1
+        guess = np.zeros(size) if guess is None else np.asarray(guess, dtype=float)
+        if not self.count:
+            return guess, np.full((size, size), np.nan), np.nan
+        # Solve for the feature coefficients about the mean
+        coefs = guess[1:] + np.linalg.lstsq(
+            self._sxx, self._sxy - self._sxx.dot(guess[1:]), rcond=None
+        )[0]
+        params = np.concatenate(([self._ymean - coefs.dot(self._xmean)], coefs))
+        chisqr = self._syy - 2 * coefs.dot(self._sxy) + coefs.dot(self._sxx).dot(coefs)
+        chisqr = max(chisqr, 0.0)
+        # Covariance of the mean and coefficients, moved to the intercept
+        dof = self.weight - size
+        if dof <= 0:
+            return params, np.full((size, size), np.nan), chisqr
+        variance = chisqr / dof
+        centered = np.zeros((size, size))
+        centered[0, 0] = variance / self.weight
+        centered[1:, 1:] = variance * np.linalg.pinv(self._sxx)
+        jac = np.eye(size)
+        jac[0, 1:] = -self._xmean
+        return params, jac.dot(centered).dot(jac.T), chisqr
+
+
+class LeastSquaresResult(object):
+    """
+    Result of a fit with :class:`.RunningLeastSquares`
+
+    Mirrors the parts of :class:`lmfit.model.ModelResult` used by the walk, so
+    models fit with either backend can be used interchangeably.
+
+    Attributes
+    ----------
+    model : lmfit.Model
+        Model used to evaluate the fit
+
+    values : dict
+        Best fit value of each parameter
+
+    covar : numpy.ndarray
+        Covariance of the parameters, in the order of :attr:`.var_names`
+
+    chisqr : float
+        Sum of the squared residuals
+
+    ndata : int
+        Number of points in the fit
+    """
+
+    def __init__(self, model, values, covar, chisqr, ndata):
+        self.model = model
+        self.values = values
+        self.var_names = list(values.keys())
+        self.covar = covar
+        self.chisqr = chisqr
+        self.ndata = ndata
+
+    @property
+    def errors(self):
+        """
+        Standard error of each parameter
+        """
+        return dict(zip(self.var_names, np.sqrt(np.abs(np.diag(self.covar)))))
+
+    def eval(self, **kwargs):
+        """
+        Evaluate the model with the best fit parameters
+        """
+        params = dict(self.values)
+        params.update(kwargs)
+        return self.model.eval(**params)
+
+    def fit_report(self):
+        """
+        Summary of the fit
+        """
+        lines = [
+            "[[Model]]",
+            "    {}".format(self.model.name),
+            "[[Fit Statistics]]",
+            "    # data points      = {}".format(self.ndata),
+            "    # variables        = {}".format(len(self.var_names)),
+            "    chi-square         = {:.8g}".format(self.chisqr),
+            "[[Variables]]",
+        ]
+        errors = self.errors
+        for name in self.var_names:
+            lines.append(
+                "    {}: {:.8g} +/- {:.8g}".format(
+                    name, self.values[name], errors[name]
+                )
+            )
+        return "\n".join(lines)
+
+
+class _PointCache(object):
+    """
+    Cache of one field of a fit whose data are held by running sums
+
+    :class:`bluesky.callbacks.LiveFit` schedules its updates from the length
+    of its caches, so every point is counted. The points themselves are only
+    kept until :meth:`.release` is called, once the running sums no longer
+    need ``lmfit`` to fit them
+    """
+
+    def __init__(self):
+        self.points = list()
+        self.count = 0
+        self.kept = True
+
+    def append(self, value):
+        self.count += 1
+        if self.kept:
+            self.points.append(value)
+
+    def release(self):
+        """
+        Stop keeping points
+        """
+        self.kept = False
+        self.points = list()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __getitem__(self, index):
+        return self.points[index]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.points, dtype=dtype)
+
+
+def _fit_model(model, ydata, kwargs):
+    """
+    Fit an lmfit model, a module function so it can be sent to any executor
+    """
+    return model.fit(ydata, **kwargs)
 
 
 class LiveBuild(LiveFit):
@@ -159,8 +555,32 @@ class LiveBuild(LiveFit):
         Update rate of the model. If set to None, the model will only be
         computed at the end of the run. By default, this is set to 1 i.e
         update on every new event
+
+    engine : RunningLeastSquares, optional
+        Fit the model with running sums rather than refitting every point
+        with ``lmfit``. Only available for models that are linear in their
+        parameters; subclasses must implement :meth:`.features` and list the
+        parameters in :attr:`.linear_params`. The points are only kept until
+        the sums can fit them, so memory stays constant through the walk
+
+    average : int, optional
+        Number of events averaged into each point of the fit. Only the
+        :attr:`.field_names` of each event are kept, in a fixed-size buffer
+        with running sums, so no event documents are held on to
+
+    executor : concurrent.futures.Executor, optional
+        Run ``lmfit`` fits on this executor, e.g. a ``ThreadPoolExecutor``,
+        instead of inside the document dispatch of the RunEngine. Updates
+        that arrive while a fit is running are coalesced into a single fit of
+        the latest data. Reading :attr:`.result`, as :meth:`.eval` and
+        :meth:`.backsolve` do, waits for the fits to catch up. Fits by a
+        :class:`.RunningLeastSquares` engine are cheap and stay in place
     """
 
+    #: Parameters of the linear model, matching the order of :meth:`.features`
+    #: with the constant term first
+    linear_params = ()
+
     def __init__(
         self,
         model,
@@ -171,15 +591,28 @@ class LiveBuild(LiveFit):
         filters=None,
         drop_missing=True,
         average=1,
+        engine=None,
+        executor=None,
     ):
+        # Set before LiveFit resets the caches
+        self.engine = engine
+        self.executor = executor
+        self._result = None
+        self._generation = 0
+        self._version = 0
+        self._pending = False
+        self._future = None
+        self._fit_lock = threading.RLock()
+        self._idle = threading.Event()
+        self._idle.set()
         super().__init__(
             model, y, independent_vars, init_guess=init_guess, update_every=update_every
         )
         # Add additional keys
         self.average = average
-        self.filters = filters or {}
+        self.filters = FilterSpec(filters or {})
         self.drop_missing = drop_missing
-        self._avg_cache = list()
+        self._avg_time = None
 
     @property
     def name(self):
@@ -188,6 +621,48 @@ class LiveBuild(LiveFit):
         """
         return self.model.name
 
+    @property
+    def result(self):
+        """
+        Most recent fit of the model, waiting for any fit still running on
+        the :attr:`.executor`
+        """
+        self._idle.wait()
+        return self._result
+
+    @result.setter
+    def result(self, result):
+        with self._fit_lock:
+            # Fits already submitted are of older data
+            self._generation += 1
+            self._version += 1
+            self._result = result
+
+    @property
+    def fit_version(self):
+        """
+        Counter that changes every time the fit is updated, waiting for any
+        fit still running on the :attr:`.executor`
+        """
+        self._idle.wait()
+        return self._version
+
+    @property
+    def average(self):
+        """
+        Number of events averaged into each point of the fit. Changing it
+        discards any partial average
+        """
+        return self._average
+
+    @average.setter
+    def average(self, average):
+        self._average = max(int(average), 1)
+        fields = len(self.field_names)
+        self._avg_ring = np.empty((self._average, fields))
+        self._avg_sums = np.zeros(fields)
+        self._avg_count = 0
+
     @property
     def field_names(self):
         """
@@ -195,6 +670,111 @@ class LiveBuild(LiveFit):
         """
         return [self.y] + list(self.independent_vars.values())
 
+    def features(self, **independent_vars):
+        """
+        Terms of the model that multiply each non-constant parameter.
+        Reimplemented by subclasses that use a :class:`.RunningLeastSquares`
+        engine
+        """
+        raise NotImplementedError
+
+    def _reset(self):
+        super()._reset()
+        if self.engine is not None:
+            self.engine.reset()
+            self.ydata = _PointCache()
+            for key in self.independent_vars_data:
+                self.independent_vars_data[key] = _PointCache()
+
+    def update_caches(self, y, independent_vars):
+        super().update_caches(y, independent_vars)
+        if self.engine is not None:
+            self.engine.update(self.features(**independent_vars), y)
+            # The sums hold everything needed from here on
+            if self.ydata.kept and not self.engine.degenerate:
+                self.ydata.release()
+                for cache in self.independent_vars_data.values():
+                    cache.release()
+
+    def update_fit(self):
+        """
+        Update the fit with the data received so far
+        """
+        # Points that leave nothing to fit, e.g. steps too small to move the
+        # centroid, are fit with lmfit as before
+        if self.engine is None or (self.engine.degenerate and self.ydata.kept):
+            if self.executor is not None:
+                return self._request_fit()
+            return super().update_fit()
+        if self.engine.count < len(self.linear_params):
+            warnings.warn(
+                "{} can not update fit until there are at least {} data points"
+                "".format(self.name, len(self.linear_params))
+            )
+            return
+        guess = [self.init_guess.get(key, 0.0) for key in self.linear_params]
+        params, covar, chisqr = self.engine.fit(guess)
+        self.result = LeastSquaresResult(
+            self.model,
+            dict(zip(self.linear_params, params)),
+            covar,
+            chisqr,
+            self.engine.count,
+        )
+
+    def _request_fit(self):
+        """
+        Fit the data on the executor, or once the running fit is done
+        """
+        if len(self.ydata) < len(self.model.param_names):
+            warnings.warn(
+                "{} can not update fit until there are at least {} data points"
+                "".format(self.name, len(self.model.param_names))
+            )
+            return
+        with self._fit_lock:
+            if self._future is not None and not self._future.done():
+                self._pending = True
+            else:
+                self._submit_fit()
+
+    def _submit_fit(self):
+        """
+        Submit a fit of a snapshot of the data, holding the fit lock
+        """
+        self._pending = False
+        self._idle.clear()
+        # Fit the points both caches have, the events keep arriving
+        count = min(
+            [len(self.ydata)] + [len(v) for v in self.independent_vars_data.values()]
+        )
+        kwargs = {key: v[:count] for key, v in self.independent_vars_data.items()}
+        kwargs.update(self.init_guess)
+        self._future = self.executor.submit(
+            _fit_model, self.model, self.ydata[:count], kwargs
+        )
+        # May run immediately in this thread, hence the reentrant lock
+        self._future.add_done_callback(partial(self._fit_done, self._generation))
+
+    def _fit_done(self, generation, future):
+        """
+        Keep the result of a finished fit and start the next if requested
+        """
+        with self._fit_lock:
+            try:
+                result = future.result()
+            except Exception as exc:
+                logger.warning("Background fit of %s failed: %s", self.name, exc)
+                result = None
+            # Discard fits from before a reset
+            if result is not None and generation == self._generation:
+                self._version += 1
+                self._result = result
+            if self._pending:
+                self._submit_fit()
+            else:
+                self._idle.set()
+
     def install_filters(self, filters):
         """
         Install additional filters
@@ -209,25 +789,52 @@ class LiveBuild(LiveFit):
         self.filters.update(filters)
 
     def event(self, doc):
+        data = doc["data"]
+        # Ignore events from streams that do not contain the model's fields
+        try:
+            row = [data[key] for key in self.field_names]
+        except KeyError:
+            return
+
         # Run event through filters
-        if not apply_filters(doc["data"]):
+        if not self.filters.passes(data, drop_missing=self.drop_missing):
             return
 
-        # Add doc to average cache
-        self._avg_cache.append(doc)
+        # Keep only the model's fields
+        self._avg_ring[self._avg_count % self._average] = row
+        self._avg_sums += self._avg_ring[self._avg_count % self._average]
+        self._avg_count += 1
+        self._avg_time = doc.get("time")
 
         # Check we have the right number of shots to average
-        if len(self._avg_cache) >= self.average:
-            # Overwrite event number
+        if self._avg_count >= self._average:
+            self._emit_average()
+
+    def flush(self):
+        """
+        Send the average of any cached events to the fit, even if fewer than
+        :attr:`.average` events have been received
+        """
+        if self._avg_count:
+            self._emit_average()
+
+    def _emit_average(self):
+        """
+        Pass the average of the buffered events to the fit
+        """
+        means = self._avg_sums / self._avg_count
+        doc = {
+            "time": self._avg_time,
+            # Number the averaged points rather than the events
             # This can be removed with an update to Bluesky Issue #684
-            doc["seq_num"] = len(self.ydata) + 1
-            # Rewrite document with averages
-            for key in self.field_names:
-                doc["data"][key] = np.mean([d["data"][key] for d in self._avg_cache])
-            # Send to callback
-            super().event(doc)
-            # Clear cache
-            self._avg_cache.clear()
+            "seq_num": len(self.ydata) + 1,
+            "data": dict(zip(self.field_names, means.tolist())),
+        }
+        # Send to callback
+        super().event(doc)
+        # Clear buffer
+        self._avg_sums[:] = 0.0
+        self._avg_count = 0
 
     def eval(self, *args, **kwargs):
         """
@@ -288,11 +895,45 @@ class LinearFit(LiveBuild):
         Update rate of the model. If set to None, the model will only be
         computed at the end of the run. By default, this is set to 1 i.e
         update on every new event
+
+    backend : {'sums', 'lmfit'}, optional
+        ``'sums'`` solves for the line in closed form from running sums of
+        the data, so each update takes constant time and memory. Until the
+        data vary in both ``x`` and ``y`` there is no unique line, and only
+        these points are kept to fit with ``lmfit``. ``'lmfit'`` keeps and
+        refits every point with :class:`lmfit.models.LinearModel`
+
+    forget : float, optional
+        Exponential forgetting factor for the ``'sums'`` backend, see
+        :class:`.RunningLeastSquares`
+
+    executor : concurrent.futures.Executor, optional
+        Run ``'lmfit'`` fits off of the RunEngine, see :class:`.LiveBuild`
     """
 
-    def __init__(self, y, x, init_guess=None, update_every=1, name=None, average=1):
+    linear_params = ("intercept", "slope")
+
+    def __init__(
+        self,
+        y,
+        x,
+        init_guess=None,
+        update_every=1,
+        name=None,
+        average=1,
+        backend="sums",
+        forget=1.0,
+        executor=None,
+    ):
         # Create model
         model = LinearModel(missing="drop", name=name)
+        # Choose fitting backend
+        if backend == "sums":
+            engine = RunningLeastSquares(1, forget=forget)
+        elif backend == "lmfit":
+            engine = None
+        else:
+            raise ValueError("Unknown fitting backend {!r}".format(backend))
 
         # Initialize parameters
         init = {"slope": 0, "intercept": 0}
@@ -308,8 +949,13 @@ class LinearFit(LiveBuild):
             init_guess=init,
             update_every=update_every,
             average=average,
+            engine=engine,
+            executor=executor,
         )
 
+    def features(self, x):
+        return [x]
+
     def eval(self, **kwargs):
         """
         Evaluate the predicted outcome based on the most recent fit of
@@ -404,10 +1050,35 @@ class MultiPitchFit(LiveBuild):
         Update rate of the model. If set to None, the model will only be
         computed at the end of the run. By default, this is set to 1 i.e
         update on every new event
+
+    backend : {'rls', 'lmfit'}, optional
+        ``'rls'`` updates the fit recursively with a
+        :class:`.RunningLeastSquares` engine, so each update takes constant
+        time and the coupling coefficients can be tracked as they drift.
+        ``'lmfit'`` refits the entire history with :class:`lmfit.Model`
+
+    forget : float, optional
+        Exponential forgetting factor for the ``'rls'`` backend. Values below
+        one discount old points, e.g. ``0.9`` has a memory of roughly ten
+        points
+
+    executor : concurrent.futures.Executor, optional
+        Run ``'lmfit'`` fits off of the RunEngine, see :class:`.LiveBuild`
     """
 
+    linear_params = ("x0", "x1", "x2")
+
     def __init__(
-        self, centroid, alphas, name=None, init_guess=None, update_every=1, average=1
+        self,
+        centroid,
+        alphas,
+        name=None,
+        init_guess=None,
+        update_every=1,
+        average=1,
+        backend="rls",
+        forget=1.0,
+        executor=None,
     ):
 
         # Simple model of two-bounce system
@@ -416,6 +1087,13 @@ class MultiPitchFit(LiveBuild):
 
         # Create model
         model = lmfit.Model(two_bounce, independent_vars=["a0", "a1"], missing="drop")
+        # Choose fitting backend
+        if backend == "rls":
+            engine = RunningLeastSquares(2, forget=forget)
+        elif backend == "lmfit":
+            engine = None
+        else:
+            raise ValueError("Unknown fitting backend {!r}".format(backend))
 
         # Initialize parameters
         init = {"x0": 0, "x1": 0, "x2": 0}
@@ -431,8 +1109,13 @@ class MultiPitchFit(LiveBuild):
             init_guess=init,
             update_every=update_every,
             average=average,
+            engine=engine,
+            executor=executor,
         )
 
+    def features(self, a0, a1):
+        return [a0, a1]
+
     def eval(self, a0=0.0, a1=0.0, **kwargs):
         """
         Evaluate the predicted outcome based on the most recent fit of
@@ -501,15 +1184,70 @@ class MultiPitchFit(LiveBuild):
         )
         # Return computed value
         if a0:
-            return {"a1": (target - x0 - a0 * x1) / x2, "a0": a0}
+            angles = {"a1": (target - x0 - a0 * x1) / x2, "a0": a0}
+        else:
+            angles = {"a0": (target - x0 - a1 * x2) / x1, "a1": a1}
+        logger.debug(
+            "Model {} backsolved {} with uncertainty {}"
+            "".format(self.name, angles, self.backsolve_error(target, a0=a0, a1=a1))
+        )
+        return angles
+
+    def backsolve_error(self, target, a0=None, a1=None):
+        """
+        Uncertainty of the mirror position found by :meth:`.backsolve`
+
+        The covariance of the fit parameters is propagated to first order
+        through the solution.
+
+        Parameters
+        ----------
+        target : float
+            Desired pixel location
+
+        a0 : float, optional
+            Fix the first mirror in the system
+
+        a1 : float, optional
+            Fix the second mirror in the system
+
+        Returns
+        -------
+        error : dict
+            Standard error of the variable mirror position, NaN if the fit has
+            no estimate of its covariance
+        """
+        # Make sure we have a fit
+        super().backsolve(target, a0=a0, a1=a1)
+        if not any([a0, a1]) or all([a0, a1]):
+            raise ValueError(
+                "Exactly one of the mirror positions "
+                "must be specified to backsolve for the target"
+            )
+        (x0, x1, x2) = [self.result.values[key] for key in self.linear_params]
+        covar = getattr(self.result, "covar", None)
+        if covar is None:
+            covar = np.full((3, 3), np.nan)
+        # Derivatives of the solution with respect to x0, x1 and x2
+        if a0:
+            key, solved = "a1", (target - x0 - a0 * x1) / x2
+            grad = np.array([-1.0, -a0, -solved]) / x2
         else:
-            return {"a0": (target - x0 - a1 * x2) / x1, "a1": a1}
+            key, solved = "a0", (target - x0 - a1 * x2) / x1
+            grad = np.array([-1.0, -solved, -a1]) / x1
+        return {key: float(np.sqrt(np.abs(grad.dot(covar).dot(grad))))}
 
 
 class LivePlotWithGoal(LivePlot):
     """
     Build a function that updates a plot from a stream of Events.
 
+    The goal and its tolerance are drawn as a single line and band that are
+    stretched over the data as it arrives. Redraws are limited to one every
+    ``interval`` seconds and, where the canvas supports it, only the lines of
+    the current run are redrawn over a saved background. Points older than
+    the last ``window`` are thinned out to at most ``history`` points, so a
+    plot left running through a long alignment uses constant memory.
 
     Parameters
     ----------
@@ -528,6 +1266,18 @@ class LivePlotWithGoal(LivePlot):
     averages : float, optional
         The number of images to average. If None is specified, every point is rendered as they come,
         otherwise the graph will update every ```averages``` points.
+    window : int, optional
+        Number of the most recent points kept at full resolution. None keeps
+        every point
+    history : int, optional
+        Largest number of points kept from before the window. Every other
+        point is dropped from them when there are more
+    interval : float, optional
+        Shortest time in seconds between redraws. Points that arrive in
+        between are drawn with the next redraw, or at the end of the run
+    blit : bool, optional
+        Redraw only the lines of the current run when the axes limits have
+        not changed, if the canvas supports blitting
     legend_keys : list, optional
         The list of keys to extract from the RunStart document and format
         in the legend of the plot. The legend will always show the
@@ -557,51 +1307,140 @@ class LivePlotWithGoal(LivePlot):
     >>> RE(my_scan, my_plotter)
     """
 
-    def __init__(self, y, x=None, *, goal=0.0, tolerance=0.0, averages=None, **kwargs):
+    def __init__(
+        self,
+        y,
+        x=None,
+        *,
+        goal=0.0,
+        tolerance=0.0,
+        averages=None,
+        window=1000,
+        history=1000,
+        interval=0.1,
+        blit=True,
+        **kwargs
+    ):
         super().__init__(y, x, **kwargs)
         self.legend_title = None
         self.goal = goal
         self.tolerance = tolerance
         self.averages = averages
+        self.window = window
+        self.history = history
+        self.interval = interval
+        self.blit = blit
         self.event_count = 0
+        self._animated = list()
+        self._background = None
+        self._draw_cid = None
+        self._last_draw = -np.inf
+        self._stale = False
+        self._xmin = np.inf
+        self._xmax = -np.inf
 
     def start(self, doc):
-        self.goal_data = []
-        (self.goal_axis,) = self.ax.plot([], [], "r--", label="Target")
+        # The axes are created when the run starts
         super().start(doc)
+        (self.goal_axis,) = self.ax.plot([], [], "r--", label="Target")
+        self.band = Rectangle(
+            (0, self.goal - self.tolerance),
+            0,
+            2 * self.tolerance,
+            alpha=0.2,
+            facecolor="r",
+            edgecolor="none",
+        )
+        self.ax.add_patch(self.band)
+        self._xmin, self._xmax = np.inf, -np.inf
+        self._last_draw = -np.inf
+        self._stale = False
+        self._background = None
+        self.ax.legend(loc=0, title=self.legend_title)
+        # Only the artists of this run change while it is going
+        self._animated = [self.band, self.goal_axis, self.current_line]
+        canvas = self.ax.figure.canvas
+        if self.blit and getattr(canvas, "supports_blit", False):
+            for artist in self._animated:
+                artist.set_animated(True)
+            self._draw_cid = canvas.mpl_connect("draw_event", self._on_draw)
 
     def event(self, doc):
         super().event(doc)
         self.event_count += 1
 
     def update_plot(self, force=False):
+        self._stale = True
+        if not force:
+            if self.averages is not None and self.event_count % self.averages:
+                return
+            if time.perf_counter() - self._last_draw < self.interval:
+                return
+        self._redraw()
+
+    def _redraw(self):
+        """
+        Update the artists of the run and draw them
+        """
+        self.current_line.set_data(self.x_data, self.y_data)
+        if self._xmin <= self._xmax:
+            self.goal_axis.set_data([self._xmin, self._xmax], [self.goal, self.goal])
+            self.band.set_bounds(
+                self._xmin,
+                self.goal - self.tolerance,
+                self._xmax - self._xmin,
+                2 * self.tolerance,
+            )
+        # Rescale
+        limits = (self.ax.get_xlim(), self.ax.get_ylim())
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view(tight=True)
+        self.ax.set_xlim(left=0, right=None, auto=True)
+        canvas = self.ax.figure.canvas
+        # Redraw everything when the axes have changed
         if (
-            self.averages is None
-            or (self.averages is not None and self.event_count % self.averages == 0)
-            or force
+            self._draw_cid is None
+            or self._background is None
+            or limits != (self.ax.get_xlim(), self.ax.get_ylim())
         ):
-            self.goal_axis.set_data(self.x_data, self.goal_data)
-            goal = np.asarray(self.goal_data)
-            distance = 2 if self.averages is None else self.averages + 1
-            if force:
-                distance -= 1
-            self.ax.fill_between(
-                self.x_data[-distance:],
-                goal[-distance:] - self.tolerance,
-                goal[-distance:] + self.tolerance,
-                alpha=0.2,
-                facecolor="r",
-            )
-            super().update_plot()
-            self.ax.set_xlim(left=0, right=None, auto=True)
+            canvas.draw_idle()
+        else:
+            canvas.restore_region(self._background)
+            for artist in self._animated:
+                self.ax.draw_artist(artist)
+            canvas.blit(self.ax.bbox)
+            canvas.flush_events()
+        self._last_draw = time.perf_counter()
+        self._stale = False
+
+    def _on_draw(self, event):
+        """
+        Save the background of a full redraw and draw the run over it
+        """
+        self._background = self.ax.figure.canvas.copy_from_bbox(self.ax.bbox)
+        for artist in self._animated:
+            self.ax.draw_artist(artist)
 
     def update_caches(self, x, y):
-        self.goal_data.append(self.goal)
         super().update_caches(x, y)
+        self._xmin = min(self._xmin, x)
+        self._xmax = max(self._xmax, x)
+        # Thin out the points from before the window
+        if self.window is not None and len(self.x_data) > self.window + self.history:
+            older = len(self.x_data) - self.window
+            self.x_data[:older] = self.x_data[:older:2]
+            self.y_data[:older] = self.y_data[:older:2]
 
     def stop(self, doc):
         # Ensure that the last events are plotted
-        # Only necessary when we are grouping the points
-        if self.averages is not None:
+        if self._stale:
             self.update_plot(force=True)
+        # Leave the finished run in the background of the next
+        if self._draw_cid is not None:
+            canvas = self.ax.figure.canvas
+            canvas.mpl_disconnect(self._draw_cid)
+            self._draw_cid = None
+            for artist in self._animated:
+                artist.set_animated(False)
+            canvas.draw_idle()
         super().stop(doc)
@@ -328,3 +328,71 @@ def patch_pims(
         return pims[0]
 
     return pims
+
+
+def sim_jacobian(source, mirrors, pims):
+    """
+    Calculates the sensitivity of each pim centroid to each mirror pitch using
+    the same ray-tracing equations chosen by :func:`.patch_pims`
+
+    Parameters
+    ----------
+    source : Undulator
+        The object simulating the source of the beam
+
+    mirrors : OffsetMirror or list
+        Mirrors to calculate reflections off
+
+    pims : PIM or list
+        PIMs to calculate the sensitivity on
+
+    Returns
+    -------
+    jacobian : numpy.ndarray
+        Change in centroid pixel per microradian of pitch, with one row per pim
+        and one column per mirror. Suitable for the ``jacobian`` argument of
+        :func:`.iterwalk`
+    """
+    # Make sure the inputted mirrors and pims are iterables
+    if not isiterable(mirrors):
+        mirrors = [mirrors]
+    if not isiterable(pims):
+        pims = [pims]
+
+    jacobian = np.zeros((len(pims), len(mirrors)))
+    for row, pim in enumerate(pims):
+        z = pim.sim_z.get()
+        # No reflections reach a pim before the first mirror
+        if not mirrors or z <= mirrors[0].sim_z.get():
+            continue
+        cam = pim.detector.cam
+        scale = 1e-6 * cam.size.size_x.get() / cam.resolution.resolution_x.get()
+        # The ray-tracing equations are linear in the pitches so the slope of
+        # each is the difference across a unit change
+        if len(mirrors) == 1 or z <= mirrors[1].sim_z.get():
+            def x(alphas):
+                return one_bounce(
+                    alphas[0],
+                    source.sim_x.get(),
+                    source.sim_xp.get(),
+                    mirrors[0].sim_x.get(),
+                    mirrors[0].sim_z.get(),
+                    z,
+                )
+        else:
+            def x(alphas):
+                return two_bounce(
+                    alphas,
+                    source.sim_x.get(),
+                    source.sim_xp.get(),
+                    mirrors[0].sim_x.get(),
+                    mirrors[0].sim_z.get(),
+                    mirrors[1].sim_x.get(),
+                    mirrors[1].sim_z.get(),
+                    z,
+                )
+        for col in range(min(len(mirrors), 2)):
+            alphas = np.zeros(2)
+            alphas[col] = 1
+            jacobian[row, col] = (x(alphas) - x(np.zeros(2))) * scale
+    return jacobian
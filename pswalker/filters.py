@@ -0,0 +1,311 @@
+"""
+Declarative filters for event documents and blocks of shots
+"""
+############
+# Standard #
+############
+import logging
+
+###############
+# Third Party #
+###############
+import numpy as np
+
+##########
+# Module #
+##########
+from .utils.argutils import isiterable
+
+logger = logging.getLogger(__name__)
+
+
+class Filter(object):
+    """
+    Base class for declarative filters
+
+    A filter is a callable that takes either a single reading or an array of
+    readings and returns whether each one passes. Because the comparison is
+    written with NumPy, a :class:`.FilterSpec` can evaluate it over an entire
+    column of shots with one vectorized operation. Filters can be combined
+    with ``&``.
+
+    Filters are drop-in replacements for the ``lambda`` functions accepted by
+    :func:`.apply_filters`, :func:`.measure` and :class:`.LiveBuild`.
+    """
+
+    def __call__(self, values):
+        with np.errstate(invalid="ignore"):
+            return self.evaluate(np.asarray(values, dtype=float))
+
+    def evaluate(self, values):
+        """
+        Evaluate the filter over a floating point array. Reimplemented by
+        subclasses
+        """
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return All(self, other)
+
+
+class Range(Filter):
+    """
+    Accept readings between two limits
+
+    Parameters
+    ----------
+    low : float, optional
+        Lower limit. Unbounded by default
+
+    high : float, optional
+        Upper limit. Unbounded by default
+
+    inclusive : bool, optional
+        Whether readings equal to a limit are accepted
+    """
+
+    def __init__(self, low=None, high=None, inclusive=True):
+        self.low = None if low is None else float(low)
+        self.high = None if high is None else float(high)
+        self.inclusive = inclusive
+
+    def evaluate(self, values):
+        passed = np.ones(values.shape, dtype=bool)
+        if self.low is not None:
+            passed &= values >= self.low if self.inclusive else values > self.low
+        if self.high is not None:
+            passed &= values <= self.high if self.inclusive else values < self.high
+        return passed
+
+    def __repr__(self):
+        return "{}(low={}, high={}, inclusive={})".format(
+            type(self).__name__, self.low, self.high, self.inclusive
+        )
+
+
+class Threshold(Range):
+    """
+    Accept readings strictly above, or below, a single value
+
+    Parameters
+    ----------
+    value : float
+        Threshold value
+
+    above : bool, optional
+        Accept readings above the threshold, otherwise accept those below
+
+    Example
+    -------
+    .. code::
+
+        # Equivalent to lambda x: x > 0
+        Threshold(0)
+    """
+
+    def __init__(self, value, above=True):
+        if above:
+            super().__init__(low=value, inclusive=False)
+        else:
+            super().__init__(high=value, inclusive=False)
+
+
+class Finite(Filter):
+    """
+    Accept every finite reading
+
+    NaN and Inf are rejected by :class:`.FilterSpec` whenever ``drop_missing``
+    is set. This filter rejects them regardless.
+    """
+
+    def evaluate(self, values):
+        return np.isfinite(values)
+
+    def __repr__(self):
+        return "Finite()"
+
+
+class All(Filter):
+    """
+    Accept readings that pass every one of several filters
+    """
+
+    def __init__(self, *filters):
+        self.filters = filters
+
+    def __call__(self, values):
+        values = np.asarray(values, dtype=float)
+        passed = np.ones(values.shape, dtype=bool)
+        for func in self.filters:
+            passed &= np.asarray(func(values), dtype=bool)
+        return passed
+
+    def __repr__(self):
+        return "All{}".format(self.filters)
+
+
+def _check_value(value, func, drop_missing=True):
+    """
+    Apply a single filter to a single reading
+
+    Missing, NaN and Inf readings, including those stored as strings or inside
+    arrays, pass only if ``drop_missing`` is False
+    """
+    if value is None:
+        return not drop_missing
+    # Check iterables for nan and inf
+    if isiterable(value):
+        if any(np.isnan(value)) or any(np.isinf(value)):
+            return not drop_missing
+    # Check string entries for nan and inf
+    elif isinstance(value, str):
+        if value.lower() in ("inf", "nan"):
+            return not drop_missing
+    # Handle all other types
+    elif np.isnan(value) or np.isinf(value):
+        return not drop_missing
+    passed = func(value)
+    # Declarative filters act elementwise on array readings
+    if isinstance(func, Filter):
+        return bool(np.all(passed))
+    return bool(passed)
+
+
+class FilterSpec(dict):
+    """
+    Compiled set of filters keyed by field name
+
+    This is a dictionary of field names mapped to filters, so it can be used
+    anywhere a dictionary of ``lambda`` functions was accepted. Values may be
+    instances of :class:`.Filter` or any single input callable that returns a
+    boolean. The specification can check a single event document with
+    :meth:`.passes`, or a whole block of shots at once with :meth:`.mask`.
+
+    Example
+    -------
+    .. code::
+
+        spec = FilterSpec({'centroid_x': Range(0, 480),
+                           'intensity': Threshold(10)})
+        spec.passes({'centroid_x': 200, 'intensity': 50})
+    """
+
+    @classmethod
+    def roi(cls, x_field, y_field, x_bounds, y_bounds):
+        """
+        Accept shots whose centroid lies within a region of interest
+
+        Parameters
+        ----------
+        x_field : str
+            Field reporting the horizontal centroid
+
+        y_field : str
+            Field reporting the vertical centroid
+
+        x_bounds : tuple
+            Inclusive ``(low, high)`` limits of the horizontal centroid
+
+        y_bounds : tuple
+            Inclusive ``(low, high)`` limits of the vertical centroid
+        """
+        return cls({x_field: Range(*x_bounds), y_field: Range(*y_bounds)})
+
+    def passes(self, doc, drop_missing=True):
+        """
+        Whether a single event passes every filter
+
+        Parameters
+        ----------
+        doc : dict
+            Field names mapped to readings, e.g. the data of an event document
+
+        drop_missing : bool, optional
+            Only accept events that report a finite value for every filtered
+            field
+
+        Returns
+        -------
+        resp : bool
+        """
+        for key, func in self.items():
+            try:
+                if not _check_value(doc[key], func, drop_missing):
+                    return False
+            # Handle missing information
+            except KeyError:
+                if drop_missing:
+                    return False
+            # Handle improper filter
+            except Exception as e:
+                logger.critical(
+                    "Filter associated with event_key {}"
+                    'reported exception "{}"'
+                    "".format(key, e)
+                )
+        return True
+
+    def mask(self, columns, size=None, drop_missing=True, constants=None):
+        """
+        Evaluate every filter over a block of shots
+
+        Declarative filters, and callables that happen to work on arrays, are
+        evaluated with one operation per field. Other callables and columns
+        that are not numeric fall back to checking each shot individually.
+
+        Parameters
+        ----------
+        columns : dict
+            Field names mapped to equal length arrays of readings
+
+        size : int, optional
+            Number of shots to evaluate from the start of each column. Uses the
+            length of the longest column by default
+
+        drop_missing : bool, optional
+            Reject shots that do not report a finite value for a filtered field
+
+        constants : dict, optional
+            Readings shared by every shot in the block
+
+        Returns
+        -------
+        mask : numpy.ndarray
+            Whether each shot passed all of the filters
+        """
+        if size is None:
+            size = max([len(col) for col in columns.values()] or [0])
+        constants = constants or dict()
+        mask = np.ones(size, dtype=bool)
+        for key, func in self.items():
+            col = columns.get(key)
+            if col is None:
+                value = constants.get(key)
+                mask &= _check_value(value, func, drop_missing)
+                continue
+            values = np.asarray(col)[:size]
+            try:
+                if values.dtype == object:
+                    raise TypeError("Column can not be filtered as an array")
+                with np.errstate(invalid="ignore"):
+                    passed = np.asarray(func(values), dtype=bool)
+                if passed.shape != values.shape:
+                    raise ValueError("Filter did not operate elementwise")
+            except Exception:
+                # Fall back to the per-shot implementation
+                mask &= [self._check_shot(key, v, func, drop_missing) for v in values]
+                continue
+            mask &= np.where(np.isfinite(values), passed, not drop_missing)
+        return mask
+
+    @staticmethod
+    def _check_shot(key, value, func, drop_missing):
+        try:
+            return _check_value(value, func, drop_missing)
+        except Exception as e:
+            logger.critical(
+                "Filter associated with event_key {}"
+                'reported exception "{}"'
+                "".format(key, e)
+            )
+            return True
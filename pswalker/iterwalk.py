@@ -5,17 +5,26 @@ import time
 import uuid
 from copy import copy
 
+import numpy as np
 from bluesky.plan_stubs import abs_set, checkpoint, mv
 from bluesky.plan_stubs import wait as plan_wait
 
-from .plan_stubs import prep_img_motors
+from .cache import GradientCache
+from .journal import WalkJournal
+from .plan_stubs import ImagerScheduler, interleave
 from .plans import measure_average, walk_to_pixel
+from .shots import AveragingPolicy
+from .timing import span, timed
 from .utils.argutils import as_list, field_prepend
 from .utils.exceptions import FilterCountError
 
 logger = logging.getLogger(__name__)
 
 
+@timed(
+    "iterwalk",
+    device=lambda args: args["motors"][0] if len(args["detectors"]) == 1 else None,
+)
 def iterwalk(
     detectors,
     motors,
@@ -34,6 +43,19 @@ def iterwalk(
     recovery_plan=None,
     filters=None,
     tol_scaling=None,
+    precisions=None,
+    project=False,
+    cache=None,
+    energy=None,
+    jacobian=None,
+    extrapolate=False,
+    imagers=None,
+    groups=None,
+    coupling=0.05,
+    journal=None,
+    resume=False,
+    policies=None,
+    mode="read",
 ):
     """
     Iteratively adjust a system of detectors and motors where each motor
@@ -137,6 +159,86 @@ def iterwalk(
         from the goal, tolerance for the walk is set at
         current_dist/tol_scaling instead of the set tolerance. Scaling ends
         when calculated tolerance < targeted tolerance.
+
+    precisions: list of floats or Nones, optional
+        For each detector, stop averaging once the standard error of the
+        centroid is below this fraction of the active tolerance. ``averages``
+        then becomes the maximum number of shots per measurement. Nones or
+        omitting this argument always takes the full number of shots.
+
+    project: bool, optional
+        If True, only the active detector and motor fields are read for every
+        shot. The rest of the system is read once per measurement.
+
+    cache: GradientCache or str, optional
+        Cache of the gradients found by previous walks, or the path to one.
+        Any ``gradients`` that are not provided are taken from fresh entries
+        for the same mirror, detector, field and beam energy, and every
+        successful walk updates the cache.
+
+    energy: float, optional
+        Beam energy, used to choose the cache entries.
+
+    jacobian: array, "probe" or "cache", optional
+        Sensitivity of every detector to every motor, with one row per
+        detector and one column per motor in units of detector/motor. When
+        provided, all of the motors are first moved together to the solution of
+        the linear system, which costs a single pass of the detectors, and the
+        usual walks only refine the result. ``"probe"`` measures the matrix by
+        stepping each motor by its ``first_steps`` while each detector is in.
+        ``"cache"`` builds the matrix from ``cache``, probing if any entry is
+        missing. Probed matrices are stored in ``cache``.
+
+    extrapolate: bool, optional
+        If True, the motor positions reached after each set of walks are
+        extrapolated towards their converged values with Aitken's method once
+        three sets are available. If the first detector then reads further
+        from its goal than before the jump, the motors are returned to the
+        positions from the plain iteration. Every set of walks uses the
+        detectors in the same order so that each is an iteration of the same
+        map.
+
+    imagers: ImagerScheduler, optional
+        Moves the detectors in and out, only commanding those that need to
+        change. By default every set of walks uses the detectors from the
+        source outwards. Pass a scheduler with ``serpentine=True`` to use them
+        back inwards on every other set, so the detector in use at the end of
+        a set stays in for the start of the next. This is turned off when
+        ``extrapolate`` is set.
+
+    groups: list of lists of ints, optional
+        Indices of detector/motor pairs that affect each other. Each group is
+        aligned by its own iterwalk, and the groups run concurrently so that
+        their moves and acquisitions overlap. Each group must have its own
+        detectors that do not block those of the other groups. If omitted,
+        groups are found from ``jacobian`` when it is an array, otherwise all
+        of the pairs are aligned together.
+
+    coupling: float, optional
+        Pairs whose cross sensitivity in ``jacobian`` is smaller than this
+        fraction of the direct sensitivity are treated as independent.
+
+    journal: WalkJournal or str, optional
+        Journal of the state of the alignment, or the path to one. The state
+        is recorded after each walk and the journal is removed once the
+        alignment finishes. Concurrent groups each keep a journal at the path
+        suffixed with the name of their first motor.
+
+    resume: bool, optional
+        If True, continue the alignment recorded in ``journal`` from the walk
+        after the last one that was recorded, keeping the gradients, flags and
+        counters it had learned. The motors are not moved to their ``starts``
+        or nominal positions first. If there is no usable record the
+        alignment starts from scratch.
+
+    policies: list of AveragingPolicy, optional
+        For each detector, chooses how many shots to average for every
+        measurement from the distance to the goal, in place of ``averages``.
+        A single policy is copied for each detector, as it remembers the last
+        error it was shown.
+
+    mode: {'read', 'monitor'}, optional
+        How shots are acquired, see :func:`.measure_average`
     """
     num = len(detectors)
 
@@ -152,12 +254,141 @@ def iterwalk(
     averages = as_list(averages, num)
     filters = as_list(filters, num)
     tol_scaling = as_list(tol_scaling, num)
+    precisions = as_list(precisions, num)
+    if isinstance(policies, AveragingPolicy):
+        policies = [copy(policies) for _ in range(num)]
+    policies = as_list(policies, num)
 
     logger.debug("iterwalk aligning %s to %s on %s", motors, goals, detectors)
 
+    if isinstance(cache, str):
+        cache = GradientCache(cache)
+    if isinstance(journal, str):
+        journal = WalkJournal(journal)
+
+    # Align independent groups of mirrors at the same time
+    if groups is None and jacobian is not None and not isinstance(jacobian, str):
+        groups = decoupled_groups(jacobian, coupling=coupling)
+    if groups is not None and len(groups) > 1:
+        logger.info("Aligning independent groups %s concurrently", groups)
+        plans = list()
+        for group in groups:
+
+            def subset(values):
+                return [values[i] for i in group]
+
+            plans.append(
+                iterwalk(
+                    subset(detectors),
+                    subset(motors),
+                    subset(goals),
+                    starts=subset(starts),
+                    first_steps=subset(first_steps),
+                    gradients=subset(gradients),
+                    detector_fields=subset(detector_fields),
+                    motor_fields=subset(motor_fields),
+                    tolerances=subset(tolerances),
+                    system=system,
+                    averages=subset(averages),
+                    overshoot=overshoot,
+                    max_walks=max_walks,
+                    timeout=timeout,
+                    recovery_plan=recovery_plan,
+                    filters=subset(filters),
+                    tol_scaling=subset(tol_scaling),
+                    precisions=subset(precisions),
+                    project=project,
+                    cache=cache,
+                    energy=energy,
+                    jacobian=_sub_jacobian(jacobian, group),
+                    extrapolate=extrapolate,
+                    journal=_sub_journal(journal, motors[group[0]]),
+                    resume=resume,
+                    policies=subset(policies),
+                    mode=mode,
+                )
+            )
+        yield from interleave(
+            *plans, suffixes=["_{}".format(motors[g[0]].name) for g in groups]
+        )
+        return
+
+    if imagers is None:
+        imagers = ImagerScheduler(detectors, timeout=15)
+    elif extrapolate and imagers.serpentine:
+        logger.warning("Extrapolation needs a fixed detector order, not serpentine")
+        imagers.serpentine = False
+
+    # Pick up an interrupted alignment
+    resumed = None
+    if journal is not None:
+        if resume:
+            resumed = journal.last()
+            if resumed is not None and (
+                resumed["detectors"] != [det.name for det in detectors]
+                or resumed["motors"] != [mot.name for mot in motors]
+                or resumed["goals"] != list(goals)
+            ):
+                logger.warning("Journal %s is for another alignment", journal.path)
+                resumed = None
+        if resumed is None:
+            journal.start()
+        else:
+            logger.info(
+                "Resuming alignment after walk %s of set %s",
+                resumed["step"],
+                resumed["n_steps"],
+            )
+            gradients = resumed["gradients"]
+            first_steps = resumed["first_steps"]
+            starts = [None] * num
+            jacobian = None
+
+    # Seed the gradients with the results of previous walks
+    if cache is not None:
+        for index, gradient in enumerate(gradients):
+            if gradient is not None:
+                continue
+            entry = cache.get(
+                motors[index].name,
+                detectors[index].name,
+                detector_fields[index],
+                energy=energy,
+            )
+            if entry is not None:
+                gradients[index] = entry["slope"]
+                logger.info(
+                    "Using cached gradient of %s for %s on %s",
+                    entry["slope"],
+                    motors[index].name,
+                    detectors[index].name,
+                )
+
     # Debug counters
     mirror_walks = 0
     yag_cycles = 0
+
+    # Move every motor at once using the sensitivity matrix
+    if jacobian is not None:
+        jacobian = yield from joint_step(
+            detectors,
+            motors,
+            goals,
+            jacobian,
+            first_steps=first_steps,
+            detector_fields=detector_fields,
+            system=system,
+            averages=averages,
+            filters=filters,
+            cache=cache,
+            energy=energy,
+            imagers=imagers,
+        )
+        yag_cycles += num
+        # The diagonal is the gradient each walk would otherwise probe for
+        for index, gradient in enumerate(gradients):
+            if gradient is None and index < len(motors) and jacobian[index, index]:
+                gradients[index] = jacobian[index, index]
     recoveries = 0
     # Set up end conditions
     n_steps = 0
@@ -166,10 +397,54 @@ def iterwalk(
     finished = [False] * num
     done_pos = [0] * num
     selected_tol = [None] * num
+    # Positions after each set of walks, for extrapolation
+    history = list()
+    jump_error = None
+    extrapolated_from = None
+
+    if resumed is not None:
+        n_steps = resumed["n_steps"]
+        start_time -= resumed["elapsed"]
+        finished = resumed["finished"]
+        done_pos = resumed["done_pos"]
+        selected_tol = resumed["selected_tol"]
+        history = resumed["history"]
+        jump_error = resumed["jump_error"]
+        extrapolated_from = resumed["extrapolated_from"]
+        mirror_walks = resumed["mirror_walks"]
+        yag_cycles = resumed["yag_cycles"]
+        recoveries = resumed["recoveries"]
+
+    def record():
+        if journal is None:
+            return
+        journal.record(
+            dict(
+                detectors=[det.name for det in detectors],
+                motors=[mot.name for mot in motors],
+                goals=list(goals),
+                order=order,
+                step=step,
+                n_steps=n_steps,
+                elapsed=time.time() - start_time,
+                gradients=gradients,
+                first_steps=first_steps,
+                finished=finished,
+                done_pos=done_pos,
+                selected_tol=selected_tol,
+                history=history,
+                jump_error=jump_error,
+                extrapolated_from=extrapolated_from,
+                mirror_walks=mirror_walks,
+                yag_cycles=yag_cycles,
+                recoveries=recoveries,
+                positions=[mot.position for mot in motors],
+            )
+        )
 
     moving_to_nominal = False
     group = str(uuid.uuid4())
-    for mot in motors:
+    for mot in motors if resumed is None else []:
         try:
             position = mot.nominal_position
         except AttributeError:
@@ -178,11 +453,19 @@ def iterwalk(
             yield from abs_set(mot, mot.nominal_position, group=group)
             moving_to_nominal = True
     if moving_to_nominal:
-        yield from plan_wait(group=group)
+        with span("move"):
+            yield from plan_wait(group=group)
 
     while True:
-        index = 0
-        while index < num:
+        order = imagers.order()
+        step = 0
+        if resumed is not None:
+            order, step = resumed["order"], resumed["step"]
+            if step > 0:
+                imagers.active = order[step - 1]
+            resumed = None
+        while step < num:
+            index = order[step]
             try:
                 # Before each walk, check the global timeout.
                 if timeout is not None and time.time() - start_time > timeout:
@@ -191,7 +474,7 @@ def iterwalk(
                     )
 
                 logger.debug("putting imager in")
-                ok = yield from prep_img_motors(index, detectors, timeout=15)
+                ok = yield from imagers.prep(index)
                 yag_cycles += 1
 
                 # Be loud if the yags fail to move! Operator should know!
@@ -231,16 +514,46 @@ def iterwalk(
                     motors[index],
                     full_system,
                 )
+                det_field = field_prepend(detector_fields[index], detectors[index])
+                mot_field = field_prepend(motor_fields[index], motors[index])
+                policy = policies[index]
+                if policy is None:
+                    shots = averages[index]
+                else:
+                    shots = policy.shots(tolerances[index])
                 avgs = yield from measure_average(
                     [detectors[index], motors[index]] + full_system,
-                    num=averages[index],
+                    num=shots,
                     filters=filters[index],
+                    target_field=det_field,
+                    tolerance=tolerances[index],
+                    precision=precisions[index],
+                    mode=mode,
+                    fields=[det_field, mot_field] if project else None,
                 )
 
-                pos = avgs[field_prepend(detector_fields[index], detectors[index])]
+                pos = avgs[det_field]
                 logger.debug(
                     "recieved %s from measure_average on %s", pos, detectors[index]
                 )
+                if policy is not None:
+                    policy.observe(pos - goals[index])
+
+                # Undo an extrapolation that made the alignment worse, judged
+                # by the first detector of the set as before the jump
+                if index == order[0] and extrapolated_from is not None:
+                    positions, extrapolated_from = extrapolated_from, None
+                    if abs(pos - goals[index]) > jump_error:
+                        logger.info(
+                            "Extrapolation increased the error on %s, "
+                            "returning to %s",
+                            detectors[index].name,
+                            positions,
+                        )
+                        yield from _move_all(motors, positions)
+                        history.clear()
+                        finished = [False] * num
+                        continue
 
                 if abs(pos - goals[index]) < tolerances[index]:
                     logger.info(
@@ -251,8 +564,9 @@ def iterwalk(
                     if all(finished):
                         logger.debug("beam aligned on all yags")
                         break
-                    # Increment index before restarting loop
-                    index += 1
+                    # Increment step before restarting loop
+                    step += 1
+                    record()
                     continue
                 else:
                     # If any of the detectors were wrong, reset finished flags
@@ -307,6 +621,10 @@ def iterwalk(
                     system=full_system,
                     average=averages[index],
                     max_steps=10,
+                    precision=precisions[index],
+                    project=project,
+                    policy=policy,
+                    mode=mode,
                 )
 
                 if models[index]:
@@ -322,6 +640,15 @@ def iterwalk(
                                 detectors[index].name,
                             )
                         )
+                        if cache is not None:
+                            cache.put(
+                                motors[index].name,
+                                detectors[index].name,
+                                detector_fields[index],
+                                models[index].result.values,
+                                energy=energy,
+                            )
+                            cache.save()
                     except Exception as e:
                         logger.warning(e)
                         logger.warning(
@@ -342,8 +669,9 @@ def iterwalk(
                 finished[index] = True
                 done_pos[index] = pos
 
-                # Increment index before restarting loop
-                index += 1
+                # Increment step before restarting loop
+                step += 1
+                record()
             except FilterCountError:
                 if recovery_plan is None:
                     logger.error("No recovery plan, not attempting to recover")
@@ -383,27 +711,29 @@ def iterwalk(
                         first_steps[index] = first_steps[index] / -2
                     continue
 
-                ok = yield from recovery_plan(
-                    detectors=detectors,
-                    motors=motors,
-                    goals=goals,
-                    starts=starts,
-                    first_steps=first_steps,
-                    gradients=gradients,
-                    detector_fields=detector_fields,
-                    motor_fields=motor_fields,
-                    tolerances=tolerances,
-                    system=system,
-                    averages=averages,
-                    overshoot=overshoot,
-                    max_walks=max_walks,
-                    timeout=timeout,
-                    filters=filters,
-                    index=index,
-                )
+                with span("recovery", motors[index]):
+                    ok = yield from recovery_plan(
+                        detectors=detectors,
+                        motors=motors,
+                        goals=goals,
+                        starts=starts,
+                        first_steps=first_steps,
+                        gradients=gradients,
+                        detector_fields=detector_fields,
+                        motor_fields=motor_fields,
+                        tolerances=tolerances,
+                        system=system,
+                        averages=averages,
+                        overshoot=overshoot,
+                        max_walks=max_walks,
+                        timeout=timeout,
+                        filters=filters,
+                        index=index,
+                    )
 
                 # Reset the finished tag because we moved something
                 finished = [False] * num
+                imagers.invalidate()
                 recoveries += 1
 
                 # If recovery failed, move to nominal and switch to next device
@@ -415,7 +745,7 @@ def iterwalk(
                         )
                     )
                     yield from mv(motors[index], fallback_pos)
-                    index += 1
+                    step += 1
                 # Try again
                 continue
 
@@ -427,8 +757,55 @@ def iterwalk(
         if max_walks is not None and n_steps > max_walks:
             logger.info("Iterwalk has reached the max_walks limit")
             break
-    txt = "Finished in %.2fs after %s mirror walks, %s yag cycles, and %s "
-    txt += "recoveries.\n"
+
+        # Jump towards the fixed point of the walk sequence
+        if extrapolate:
+            history.append([mot.position for mot in motors])
+            if len(history) >= 3:
+                target = aitken(history[-3:])
+                if target is not None:
+                    # Measure the first detector of the set where the jump
+                    # starts, to undo the jump if it does worse
+                    first = order[0]
+                    ok = yield from imagers.prep(first)
+                    if not ok:
+                        err = "Detector motion timed out!"
+                        logger.error(err)
+                        raise RuntimeError(err)
+                    full_system = [
+                        obj
+                        for obj in system
+                        if obj is not motors[first] and obj is not detectors[first]
+                    ]
+                    det_field = field_prepend(detector_fields[first], detectors[first])
+                    mot_field = field_prepend(motor_fields[first], motors[first])
+                    policy = policies[first]
+                    if policy is None:
+                        shots = averages[first]
+                    else:
+                        shots = policy.shots(tolerances[first])
+                    avgs = yield from measure_average(
+                        [detectors[first], motors[first]] + full_system,
+                        num=shots,
+                        filters=filters[first],
+                        target_field=det_field,
+                        tolerance=tolerances[first],
+                        precision=precisions[first],
+                        mode=mode,
+                        fields=[det_field, mot_field] if project else None,
+                    )
+                    jump_error = abs(avgs[det_field] - goals[first])
+                    logger.info(
+                        "Extrapolating motor positions from %s to %s",
+                        history[-1],
+                        target,
+                    )
+                    extrapolated_from = history[-1]
+                    yield from _move_all(motors, target)
+                    history.clear()
+                    finished = [False] * num
+    txt = "Finished in %.2fs after %s mirror walks, %s yag cycles, %s yag "
+    txt += "moves, and %s recoveries.\n"
     txt += "Aligned to %s\n"
     txt += "Goals were %s\n"
     txt += "Deltas are %s\n"
@@ -438,9 +815,266 @@ def iterwalk(
         time.time() - start_time,
         mirror_walks,
         yag_cycles,
+        imagers.transitions,
         recoveries,
         done_pos,
         goals,
         [d - g for g, d in zip(goals, done_pos)],
         [m.position for m in motors],
     )
+    if journal is not None:
+        journal.clear()
+
+
+def aitken(sequence, max_ratio=0.9):
+    """
+    Extrapolate a geometrically converging sequence of positions to its limit
+
+    Each axis is treated independently using Aitken's delta-squared method.
+    Axes that have stopped moving, or whose last two steps do not shrink by a
+    consistent ratio, keep their latest position.
+
+    Parameters
+    ----------
+    sequence: list of lists
+        The last three sets of positions, oldest first
+
+    max_ratio: float, optional
+        The largest magnitude of the ratio between successive steps that will
+        be extrapolated. This bounds each jump to ``max_ratio / (1 - max_ratio)``
+        times the latest step.
+
+    Returns
+    -------
+    positions: list or None
+        The extrapolated positions, or None if no axis could be extrapolated
+    """
+    x0, x1, x2 = (np.asarray(x, dtype=float) for x in sequence)
+    d1 = x1 - x0
+    d2 = x2 - x1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = d2 / d1
+    usable = np.isfinite(ratio) & (np.abs(ratio) <= max_ratio) & (d2 != 0)
+    if not np.any(usable):
+        return None
+    target = np.where(usable, x2 + d2 * ratio / (1 - ratio), x2)
+    return target.tolist()
+
+
+def decoupled_groups(jacobian, coupling=0.05):
+    """
+    Split a detector/motor system into groups that do not affect each other
+
+    Parameters
+    ----------
+    jacobian: array
+        Square sensitivity matrix with one row per detector and one column per
+        motor, where motor ``i`` primarily moves detector ``i``
+
+    coupling: float, optional
+        Cross sensitivities smaller than this fraction of the direct
+        sensitivity of the detector are ignored
+
+    Returns
+    -------
+    groups: list of lists of ints
+        Indices of each independent group, in order of their first member
+    """
+    jacobian = np.abs(np.array(jacobian, dtype=float, ndmin=2))
+    num = len(jacobian)
+    direct = np.diag(jacobian)[:, np.newaxis]
+    linked = jacobian > coupling * direct
+    linked = linked | linked.T
+    # Collect the connected components of the coupling graph
+    groups = list()
+    assigned = set()
+    for start in range(num):
+        if start in assigned:
+            continue
+        group = {start}
+        frontier = [start]
+        while frontier:
+            i = frontier.pop()
+            for j in np.flatnonzero(linked[i]):
+                if j not in group:
+                    group.add(int(j))
+                    frontier.append(int(j))
+        assigned |= group
+        groups.append(sorted(group))
+    return groups
+
+
+def _sub_jacobian(jacobian, group):
+    if jacobian is None or isinstance(jacobian, str):
+        return jacobian
+    return np.array(jacobian, dtype=float, ndmin=2)[np.ix_(group, group)]
+
+
+def _sub_journal(journal, motor):
+    if journal is None:
+        return None
+    return WalkJournal(
+        "{}.{}".format(journal.path, motor.name), sync_every=journal.sync_every
+    )
+
+
+def _move_all(motors, positions):
+    """
+    Move every motor to a position at the same time
+    """
+    group = str(uuid.uuid4())
+    with span("move"):
+        for mot, position in zip(motors, positions):
+            yield from abs_set(mot, position, group=group)
+        yield from plan_wait(group=group)
+
+
+def joint_step(
+    detectors,
+    motors,
+    goals,
+    jacobian,
+    first_steps=1,
+    detector_fields="centroid_x",
+    system=None,
+    averages=1,
+    filters=None,
+    cache=None,
+    energy=None,
+    imagers=None,
+):
+    """
+    Move every motor at once to the least squares solution of a linearized
+    detector/motor system.
+
+    Each detector is inserted in turn and measured, optionally stepping each
+    motor to probe the sensitivity matrix. The motor moves that bring every
+    detector to its goal are then solved for simultaneously. This is a Bluesky
+    plan without run decorators, see :func:`.iterwalk` for the description of
+    the shared arguments.
+
+    Parameters
+    ----------
+    jacobian: array, "probe" or "cache"
+        Sensitivity of every detector to every motor, with one row per detector
+        and one column per motor in units of detector/motor. ``"probe"``
+        measures the matrix and ``"cache"`` reads it from ``cache``, probing
+        if any entry is missing.
+
+    imagers: ImagerScheduler, optional
+        Moves the detectors in and out
+
+    Returns
+    -------
+    jacobian: numpy.ndarray
+        The sensitivity matrix that was used
+    """
+    num = len(detectors)
+    goals = as_list(goals, num)
+    first_steps = as_list(first_steps, len(motors), float)
+    detector_fields = as_list(detector_fields, num)
+    system = as_list(system)
+    averages = as_list(averages, num)
+    filters = as_list(filters, num)
+    if isinstance(cache, str):
+        cache = GradientCache(cache)
+    if imagers is None:
+        imagers = ImagerScheduler(detectors, timeout=15)
+
+    probe = False
+    if isinstance(jacobian, str):
+        if jacobian == "cache":
+            jacobian = _cached_jacobian(
+                detectors, motors, detector_fields, cache, energy
+            )
+            probe = jacobian is None
+        elif jacobian == "probe":
+            probe = True
+        else:
+            raise ValueError("Unknown jacobian source {!r}".format(jacobian))
+        if probe:
+            jacobian = np.zeros((num, len(motors)))
+    jacobian = np.array(jacobian, dtype=float, ndmin=2)
+    if jacobian.shape != (num, len(motors)):
+        raise ValueError(
+            "Jacobian must have one row per detector and one column "
+            "per motor, not shape {}".format(jacobian.shape)
+        )
+
+    # Measure each detector, probing each motor while it is inserted
+    readings = np.zeros(num)
+    for index in imagers.order():
+        det = detectors[index]
+        ok = yield from imagers.prep(index)
+        if not ok:
+            err = "Detector motion timed out!"
+            logger.error(err)
+            raise RuntimeError(err)
+        yield from checkpoint()
+        det_field = field_prepend(detector_fields[index], det)
+        # Read the same objects as the walks of iterwalk
+        readers = [det] + motors[index : index + 1]
+        readers += [obj for obj in system if obj not in readers]
+
+        def read():
+            avgs = yield from measure_average(
+                readers, num=averages[index], filters=filters[index]
+            )
+            return avgs[det_field]
+
+        readings[index] = yield from read()
+        if not probe:
+            continue
+        for col, mot in enumerate(motors):
+            start = mot.position
+            yield from mv(mot, start + first_steps[col])
+            stepped = yield from read()
+            yield from mv(mot, start)
+            jacobian[index, col] = (stepped - readings[index]) / first_steps[col]
+            if cache is not None:
+                cache.put(
+                    mot.name,
+                    det.name,
+                    detector_fields[index],
+                    {"slope": jacobian[index, col]},
+                    energy=energy,
+                )
+    if probe:
+        logger.info("Probed sensitivity matrix %s", jacobian.tolist())
+        if cache is not None:
+            cache.save()
+
+    # Solve for all of the motor moves together
+    errors = np.asarray(goals, dtype=float) - readings
+    steps = np.linalg.lstsq(jacobian, errors, rcond=None)[0]
+    if not np.all(np.isfinite(steps)) or not np.any(jacobian):
+        logger.warning("Unable to solve sensitivity matrix %s", jacobian.tolist())
+        return jacobian
+    logger.info(
+        "Moving %s by %s to correct errors of %s",
+        [mot.name for mot in motors],
+        steps.tolist(),
+        errors.tolist(),
+    )
+    yield from _move_all(
+        motors, [mot.position + step for mot, step in zip(motors, steps)]
+    )
+    return jacobian
+
+
+def _cached_jacobian(detectors, motors, detector_fields, cache, energy):
+    """
+    Build a sensitivity matrix from cached gradients, or None if any entry is
+    missing
+    """
+    if cache is None:
+        return None
+    jacobian = np.zeros((len(detectors), len(motors)))
+    for row, det in enumerate(detectors):
+        for col, mot in enumerate(motors):
+            entry = cache.get(mot.name, det.name, detector_fields[row], energy=energy)
+            if entry is None:
+                logger.info("No cached gradient for %s on %s", mot.name, det.name)
+                return None
+            jacobian[row, col] = entry["slope"]
+    return jacobian
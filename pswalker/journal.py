@@ -0,0 +1,146 @@
+"""
+Crash-safe journal of the progress of an alignment
+"""
+############
+# Standard #
+############
+import json
+import logging
+import os
+
+##########
+# Module #
+##########
+logger = logging.getLogger(__name__)
+
+
+class WalkJournal(object):
+    """
+    Append-only log of the state of :func:`.iterwalk` after each walk
+
+    Every call to :meth:`.record` appends a complete snapshot of the state as
+    a single line of JSON, so the latest snapshot can be recovered even if the
+    process dies while writing. Each line is flushed to the operating system
+    as it is written, which survives the process being killed, and the file is
+    synced to disk every ``sync_every`` records to bound the cost of
+    surviving a power loss.
+
+    The log is truncated when a fresh alignment starts and removed once it
+    finishes, so it only ever holds the records of a single alignment.
+
+    Parameters
+    ----------
+    path : str
+        Location of the journal file
+
+    sync_every : int, optional
+        Number of records between syncs to disk
+
+    Example
+    -------
+    .. code::
+
+        RE(iterwalk(yags, mirrors, goals, journal='~/.pswalker_journal'))
+        # After an interruption, pick up where the alignment left off
+        RE(iterwalk(yags, mirrors, goals, journal='~/.pswalker_journal',
+                    resume=True))
+    """
+
+    version = 1
+
+    def __init__(self, path, sync_every=5):
+        self.path = os.path.expanduser(path)
+        self.sync_every = sync_every
+        self._file = None
+        self._unsynced = 0
+
+    def last(self):
+        """
+        Find the most recent complete record
+
+        Returns
+        -------
+        state : dict or None
+            The last snapshot that was fully written, or None if there is no
+            readable record
+        """
+        try:
+            with open(self.path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Unable to read walk journal %s: %s", self.path, e)
+            return None
+        # A crash can leave a partial line at the end
+        for line in reversed(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("version") != self.version:
+                logger.warning("Ignoring walk journal record with unknown version")
+                return None
+            return record.get("state")
+        return None
+
+    def start(self):
+        """
+        Discard any previous records before a fresh alignment
+        """
+        self.close()
+        self._open("w")
+
+    def record(self, state):
+        """
+        Append a snapshot of the alignment
+
+        Parameters
+        ----------
+        state : dict
+            JSON serializable description of the alignment
+        """
+        if self._file is None:
+            self._open("a")
+        line = json.dumps({"version": self.version, "state": state}, default=float)
+        self._file.write(line + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self.sync_every is not None and self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """
+        Force the records written so far to disk
+        """
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        """
+        Sync and close the journal file
+        """
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        """
+        Remove the journal once the alignment no longer needs it
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _open(self, mode):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, mode)
+        self._unsynced = 0
+
+    def __repr__(self):
+        return "<WalkJournal at {}>".format(self.path)
@@ -10,15 +10,17 @@ from math import nan
 from bluesky.plan_stubs import abs_set
 from bluesky.plan_stubs import wait as plan_wait
 from bluesky.preprocessors import stage_wrapper
-from bluesky.utils import FailedStatus
+from bluesky.utils import FailedStatus, Msg
 
 from .plans import measure_average
+from .timing import timed
 from .utils.argutils import field_prepend
 from .utils.exceptions import BeamNotFoundError
 
 logger = logging.getLogger(__name__)
 
 
+@timed("imager", device=lambda args: args["img_motors"][args["n_mot"]])
 def prep_img_motors(n_mot, img_motors, prev_out=True, tail_in=True, timeout=None):
     """
     Plan to prepare image motors for taking data. Moves the correct imagers in
@@ -85,6 +87,271 @@ def prep_img_motors(n_mot, img_motors, prev_out=True, tail_in=True, timeout=None
     return ok
 
 
+class ImagerScheduler(object):
+    """
+    Prepare imagers for taking data, only moving those that need to change
+
+    This is a stateful replacement for :func:`.prep_img_motors`. The last
+    commanded and confirmed state of every imager is remembered, so each call
+    to :meth:`.prep` only issues the sets that change something. Imagers that
+    report their state through a ``position`` string are checked before a set
+    is skipped, so moves made outside of the scheduler are noticed.
+
+    Parameters
+    ----------
+    img_motors: list of OphydObject
+        Imagers to move in or out, ordered by increasing distance to the
+        source. See :func:`.prep_img_motors`
+
+    prev_out: bool, optional
+        Pull out imagers closer to the source than the one we need to use
+
+    tail_in: bool, optional
+        Put in imagers after the one we need to use, to be ready for later.
+        These are only waited on when they are needed
+
+    timeout: number, optional
+        Only wait for this many seconds before moving on
+
+    serpentine: bool, optional
+        If True, :meth:`.order` alternates direction each cycle so that the
+        imager in use at the end of a cycle is the first one used in the next.
+        By default every cycle runs from the source outwards
+
+    Attributes
+    ----------
+    transitions: int
+        Number of sets issued to the imagers
+    """
+
+    def __init__(
+        self, img_motors, prev_out=True, tail_in=True, timeout=None, serpentine=False
+    ):
+        self.img_motors = list(img_motors)
+        self.prev_out = prev_out
+        self.tail_in = tail_in
+        self.timeout = timeout
+        self.serpentine = serpentine
+        self.active = None
+        self.transitions = 0
+        self._tail_group = str(uuid.uuid4())
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forget the state of every imager, e.g. after they were moved by another
+        plan
+        """
+        self.commanded = [None] * len(self.img_motors)
+        self.confirmed = [None] * len(self.img_motors)
+
+    def targets(self, n_mot):
+        """
+        States each imager should be in to take data with imager ``n_mot``
+
+        Returns
+        -------
+        targets: dict
+            Index of each imager that should be moved mapped to its state
+        """
+        targets = dict()
+        for i in range(len(self.img_motors)):
+            if i < n_mot and self.prev_out:
+                targets[i] = "OUT"
+            elif i == n_mot:
+                targets[i] = "IN"
+            elif i > n_mot and self.tail_in:
+                targets[i] = "IN"
+        return targets
+
+    def order(self):
+        """
+        Order in which to use the imagers for the next cycle
+
+        With ``serpentine`` set, a cycle starts from whichever end of the beam
+        line was used last so that no imager moves between cycles
+        """
+        order = list(range(len(self.img_motors)))
+        if self.serpentine and self.active == len(order) - 1 and len(order) > 1:
+            order.reverse()
+        return order
+
+    def _reported(self, i):
+        position = getattr(self.img_motors[i], "position", None)
+        if position in ("IN", "OUT"):
+            return position
+        return None
+
+    @timed("imager", device=lambda args: args["self"].img_motors[args["n_mot"]])
+    def prep(self, n_mot):
+        """
+        Plan to move the imagers so that ``n_mot`` can take data
+
+        Parameters
+        ----------
+        n_mot: int
+            Index of the imager that we need to take data with
+
+        Returns
+        -------
+        ok: bool
+            True if the wait succeeded, False otherwise
+        """
+        start_time = time.time()
+        group = str(uuid.uuid4())
+        kwargs = dict() if self.timeout is None else dict(timeout=self.timeout)
+        waiting = list()
+        pending = list()
+        ok = True
+        try:
+            for i, state in self.targets(n_mot).items():
+                reported = self._reported(i)
+                # A tail move we have not waited for yet
+                if self.commanded[i] == state and self.confirmed[i] != state:
+                    if reported != state:
+                        pending.append(i)
+                        continue
+                # Already where it needs to be
+                if reported == state or (
+                    reported is None and self.confirmed[i] == state
+                ):
+                    self.commanded[i] = self.confirmed[i] = state
+                    continue
+                self.commanded[i] = state
+                self.confirmed[i] = None
+                self.transitions += 1
+                if i > n_mot:
+                    yield from abs_set(
+                        self.img_motors[i], state, group=self._tail_group, **kwargs
+                    )
+                else:
+                    yield from abs_set(self.img_motors[i], state, group=group, **kwargs)
+                    waiting.append(i)
+            if pending and n_mot in pending:
+                yield from plan_wait(group=self._tail_group)
+                for i in pending:
+                    self.confirmed[i] = self.commanded[i]
+            if waiting:
+                yield from plan_wait(group=group)
+                for i in waiting:
+                    self.confirmed[i] = self.commanded[i]
+        except FailedStatus:
+            ok = False
+            self.invalidate()
+
+        if ok and self.timeout is not None:
+            ok = time.time() - start_time < self.timeout
+
+        self.active = n_mot
+        logger.debug(
+            "Prepared imager %s after %s transitions", n_mot, self.transitions
+        )
+        return ok
+
+
+def interleave(*plans, suffixes=None):
+    """
+    Run several plans at the same time
+
+    Each plan runs until it needs to wait for motion or acquisition to finish,
+    or to sleep. The wait is held back while the other plans issue their own
+    moves and triggers, so the time spent waiting is set by the slowest plan
+    rather than the sum of all of them. Every plan is given its own names for
+    the groups it waits on, so that no plan waits on the moves of another, and
+    the sleeps of all plans are served by a single sleep once the held waits
+    are done. Plans may not wait inside of an event bundle.
+
+    Parameters
+    ----------
+    plans: generators
+        Plans to run concurrently. They should not open runs of their own
+
+    suffixes: list of str, optional
+        Appended to the names of the event streams created by each plan, so
+        that plans reading different devices do not share a stream
+
+    Returns
+    -------
+    results: list
+        Return value of each plan
+    """
+    plans = list(plans)
+    results = [None] * len(plans)
+    # Unique group names of each plan
+    groups = [dict() for plan in plans]
+
+    def rename(i, group):
+        if group is None:
+            return None
+        if group not in groups[i]:
+            groups[i][group] = "{}-{}".format(group, uuid.uuid4())
+        return groups[i][group]
+
+    # What to deliver to each plan when it next runs
+    deliver = {i: (False, None) for i in range(len(plans))}
+    try:
+        while deliver:
+            held = dict()
+            sleeps = dict()
+            for i, (throw, value) in deliver.items():
+                while True:
+                    try:
+                        if throw:
+                            msg = plans[i].throw(value)
+                        else:
+                            msg = plans[i].send(value)
+                    except StopIteration as stop:
+                        results[i] = stop.value
+                        break
+                    if msg.command == "sleep":
+                        sleeps[i] = time.monotonic() + msg.args[0]
+                        break
+                    if msg.command == "wait":
+                        if "group" in msg.kwargs:
+                            kwargs = dict(msg.kwargs)
+                            kwargs["group"] = rename(i, kwargs["group"])
+                            msg = msg._replace(kwargs=kwargs)
+                        elif msg.args:
+                            args = (rename(i, msg.args[0]),) + tuple(msg.args[1:])
+                            msg = msg._replace(args=args)
+                        held[i] = msg
+                        break
+                    if msg.kwargs.get("group") is not None:
+                        kwargs = dict(msg.kwargs)
+                        kwargs["group"] = rename(i, kwargs["group"])
+                        msg = msg._replace(kwargs=kwargs)
+                    if suffixes is not None and msg.command == "create":
+                        kwargs = dict(msg.kwargs)
+                        kwargs["name"] = "{}{}".format(
+                            kwargs.get("name") or "primary", suffixes[i]
+                        )
+                        msg = msg._replace(kwargs=kwargs)
+                    try:
+                        throw, value = False, (yield msg)
+                    except Exception as exc:
+                        throw, value = True, exc
+            # Every plan is waiting, sleeping or has finished
+            deliver = dict()
+            for i, msg in held.items():
+                try:
+                    deliver[i] = (False, (yield msg))
+                except Exception as exc:
+                    deliver[i] = (True, exc)
+            # Sleep until the last of the sleeping plans is due
+            if sleeps:
+                remaining = max(sleeps.values()) - time.monotonic()
+                if remaining > 0:
+                    try:
+                        yield Msg("sleep", None, remaining)
+                    except Exception as exc:
+                        deliver.update((i, (True, exc)) for i in sleeps)
+                deliver.update((i, (False, None)) for i in sleeps if i not in deliver)
+    finally:
+        for plan in plans:
+            plan.close()
+    return results
+
+
 def match_condition(
     signal, condition, mover, setpoint, timeout=None, sub_type=None, has_stop=True
 ):
@@ -3,10 +3,13 @@ Bluesky Plans for the Walker
 """
 import itertools
 import logging
+import threading
 ############
 # Standard #
 ############
 import time
+import uuid
+from collections import deque
 from collections.abc import Iterable
 
 ###############
@@ -14,23 +17,70 @@ from collections.abc import Iterable
 ###############
 import numpy as np
 import pandas as pd
-from bluesky.plan_stubs import mv, rel_set
+from bluesky.plan_stubs import abs_set, mv
+from bluesky.plan_stubs import read as plan_read
+from bluesky.plan_stubs import rel_set
+from bluesky.plan_stubs import wait as plan_wait
 from bluesky.utils import Msg
+from ophyd import Device, Signal
+from ophyd.areadetector.plugins import StatsPlugin
 
 ##########
 # Module #
 ##########
-from .callbacks import LinearFit, apply_filters, rank_models
+from .cache import NoiseCache
+from .callbacks import LinearFit, ModelSet
+from .filters import FilterSpec, Threshold
+from .shots import RunningStats, ShotBuffer, ShotScheduler, noise_statistics
+from .steps import TrustRegion
+from .timing import span, timed
 from .utils import field_prepend
-from .utils.exceptions import FilterCountError
+from .utils.exceptions import FilterCountError, MonitorTimeoutError
 
 logger = logging.getLogger(__name__)
 
 
-def measure_average(detectors, num=1, filters=None, delay=None, drop_missing=True):
+def _first_detector(args):
+    """
+    Device the timing span of a measurement is recorded against
+    """
+    return args["detectors"][0] if args["detectors"] else None
+
+
+def _shot_counts(data):
+    """
+    Shots and dropped shots of a measurement, for its timing span
+    """
+    return len(data), data.dropped
+
+
+def measure_average(
+    detectors,
+    num=1,
+    filters=None,
+    delay=None,
+    drop_missing=True,
+    target_field=None,
+    tolerance=None,
+    precision=None,
+    min_num=3,
+    mode="read",
+    fields=None,
+    depth=1,
+    overlap=None,
+    rate=None,
+    period=None,
+):
     """
     Gather a series of measurements from a list of detectors and return the
     average over the number of shots.
+
+    If a ``target_field``, ``tolerance`` and ``precision`` are all supplied
+    the measurement is sequential; a running mean and variance of the target
+    field is kept and acquisition stops as soon as the standard error of the
+    mean is below ``precision * tolerance``. In this mode ``num`` is the
+    maximum number of shots taken.
+
     Parameters
     ----------
     detectors : list
@@ -42,29 +92,138 @@ def measure_average(detectors, num=1, filters=None, delay=None, drop_missing=Tru
     delay : iterable or scalar, optional
         Time delay between successive readings
 
+    target_field : str, optional
+        Field to watch for a sequential measurement
+
+    tolerance : float, optional
+        Tolerance the target field is being compared against
+
+    precision : float, optional
+        Fraction of the tolerance the standard error of the mean must reach
+        before a sequential measurement stops
+
+    min_num : int, optional
+        Minimum number of shots for a sequential measurement
+
+    mode : {'read', 'monitor', 'timeseries'}, optional
+        How shots are acquired. ``'read'`` triggers and reads every detector
+        for each shot using :func:`.measure`, ``'monitor'`` collects the next
+        updates published by the detector signals using
+        :func:`.measure_monitor` and ``'timeseries'`` reads the centroids
+        accumulated by the areaDetector Stats plugin in bulk using
+        :func:`.measure_timeseries`. ``delay`` is ignored by the latter two.
+        Sequential measurements are not available for time series, and a
+        ``precision`` raises a ValueError. When monitoring, every update of
+        the ``target_field`` is a new shot
+
+    fields : list, optional
+        Only read these fields every shot, see :func:`.measure`
+
+    depth : int, optional
+        Number of shots to pipeline when reading, see :func:`.measure`
+
+    overlap : list, optional
+        Detectors that are safe to pipeline, see :func:`.measure`
+
+    rate : float or Signal, optional
+        Rate in Hz to schedule shots at when reading, see :func:`.measure`
+
+    period : float, optional
+        Time between scheduled shots when reading, see :func:`.measure`
+
     Returns
     -------
     average : dict
         A dictionary of all the measurements taken from the supplied detectors
-        averaged over `num` shots. In the event that a field is a string, or
-        can not be averaged the last shot is returned
+        averaged over `num` shots. Shots missing a field are ignored in its
+        average. In the event that a field is a string, or can not be averaged
+        the last shot is returned. Sequential measurements also report the
+        number of shots taken as ``<target_field>_shots`` and the standard
+        error of the mean as ``<target_field>_stderr``, as do time series with
+        a ``target_field``. Measurements taken on
+        a schedule report the ``schedule_requested_rate`` and
+        ``schedule_achieved_rate`` in Hz, and the number of slots that were
+        missed as ``schedule_missed``
 
     See Also
     --------
-    :func:`.measure`
+    :func:`.measure`, :meth:`.ShotBuffer.mean`
     """
+    sequential = None not in (target_field, tolerance, precision)
+    if sequential and mode == "timeseries":
+        raise ValueError("Sequential measurements are not available for time series")
+    if not sequential:
+        until = None
+    else:
+        stats = RunningStats()
+        threshold = precision * tolerance
+
+        def until(data):
+            stats.update(data.last().get(target_field, np.nan))
+            return stats.count >= min_num and stats.stderr <= threshold
+
     # Gather data
-    data = yield from measure(
-        detectors, num=num, delay=delay, filters=filters, drop_missing=drop_missing
-    )
+    if mode == "read":
+        data = yield from measure(
+            detectors,
+            num=num,
+            delay=delay,
+            filters=filters,
+            drop_missing=drop_missing,
+            until=until,
+            fields=fields,
+            depth=depth,
+            overlap=overlap,
+            rate=rate,
+            period=period,
+        )
+    elif mode == "monitor":
+        # A new shot arrives with every update of the watched field
+        trigger = None
+        if target_field is not None:
+            trigger = _field_signals(detectors, [target_field])[1][0]
+        data = yield from measure_monitor(
+            detectors,
+            num=num,
+            filters=filters,
+            drop_missing=drop_missing,
+            trigger=trigger,
+            until=until,
+            fields=fields,
+        )
+    elif mode == "timeseries":
+        data = yield from measure_timeseries(
+            detectors, num=num, filters=filters, drop_missing=drop_missing
+        )
+    else:
+        raise ValueError("Unknown measurement mode {!r}".format(mode))
 
-    # Gather keys
-    avg = dict.fromkeys(set([key for d in data for key in d.keys()]))
-    for key in avg.keys():
-        try:
-            avg[key] = np.mean([d[key] for d in data])
-        except TypeError:
-            avg[key] = data[-1][key]
+    # Reduce each column of the buffer
+    avg = data.mean()
+    if sequential:
+        avg[target_field + "_shots"] = stats.count
+        avg[target_field + "_stderr"] = stats.stderr
+        logger.debug(
+            "Sequential measurement of %s stopped after %s of %s shots "
+            "with a standard error of %s",
+            target_field,
+            stats.count,
+            num,
+            stats.stderr,
+        )
+    elif mode == "timeseries" and target_field in data.columns:
+        # Statistics of the whole series
+        values = np.asarray(data.column(target_field), dtype=float)
+        values = values[np.isfinite(values)]
+        avg[target_field + "_shots"] = values.size
+        avg[target_field + "_stderr"] = (
+            np.std(values, ddof=1) / np.sqrt(values.size) if values.size > 1 else np.nan
+        )
+    schedule = getattr(data, "schedule", None)
+    if schedule is not None:
+        avg["schedule_requested_rate"] = schedule.requested_rate
+        avg["schedule_achieved_rate"] = schedule.achieved_rate
+        avg["schedule_missed"] = schedule.missed
 
     logger.debug("Found the following averages: %s", avg)
     return avg
@@ -97,7 +256,7 @@ def measure_centroid(
     """
     logger.debug("Running measure_centroid.")
     # Use default filters
-    filters = filters or {field_prepend(target_field, det): lambda x: x > 0}
+    filters = filters or {field_prepend(target_field, det): Threshold(0)}
     # Take average measurement
     avgs = yield from measure_average(
         [det], num=average, delay=delay, filters=filters, drop_missing=drop_missing
@@ -105,6 +264,65 @@ def measure_centroid(
     return avgs[field_prepend(target_field, det)]
 
 
+def measure_noise(
+    det, target_field="centroid_x", num=120, filters=None, cache=None, rate=None
+):
+    """
+    Characterize the noise of a detector reading while nothing is moving
+
+    Parameters
+    ----------
+    det : :class:`.BeamDetector`
+        `readable` object, which should already be in the beam
+
+    target_field : str, optional
+        Name of the reading to characterize
+
+    num : int, optional
+        Number of shots to take. Enough shots are needed to see the
+        correlation between them, so this should be several times the
+        expected correlation time
+
+    filters : dict, optional
+        Shots to reject, see :func:`.measure`
+
+    cache : :class:`.NoiseCache` or str, optional
+        Cache of previous results, or the path to one. A fresh entry is
+        returned without taking any shots, otherwise the result is stored
+
+    rate : float or Signal, optional
+        Rate to take the shots at, see :func:`.measure`
+
+    Returns
+    -------
+    stats : dict
+        Statistics of the reading, see :func:`.noise_statistics`
+    """
+    field = field_prepend(target_field, det)
+    if isinstance(cache, str):
+        cache = NoiseCache(cache)
+    if cache is not None:
+        entry = cache.get(det.name, field)
+        if entry is not None:
+            logger.debug("Using cached noise of %s", field)
+            return entry
+    data = yield from measure(
+        [det], num=num, filters=filters, fields=[field], rate=rate
+    )
+    stats = noise_statistics(data.column(field))
+    logger.info(
+        "Noise of %s is %.3g with a correlation time of %.3g shots",
+        field,
+        stats["std"],
+        stats["tau"],
+    )
+    if cache is not None:
+        cache.put(det.name, field, stats)
+        cache.save()
+    return stats
+
+
+@timed("walk", device=lambda args: args["motor"])
 def walk_to_pixel(
     detector,
     motor,
@@ -121,6 +339,11 @@ def walk_to_pixel(
     delay=None,
     max_steps=None,
     drop_missing=True,
+    precision=None,
+    project=False,
+    policy=None,
+    controller=None,
+    mode="read",
 ):
     """
     Step a motor until a specific threshold is reached on the detector
@@ -186,6 +409,25 @@ def walk_to_pixel(
 
     max_steps : int, optional
         Limit the number of steps the walk will take before exiting
+
+    precision : float, optional
+        Stop averaging once the standard error of the centroid is below this
+        fraction of the tolerance, see :func:`.measure_average`
+
+    project : bool, optional
+        Only read the centroid and motor fields every shot. The rest of the
+        ``system`` is read once per measurement
+
+    policy : :class:`.AveragingPolicy`, optional
+        Choose the number of images for each step from the distance to the
+        target, taking the place of ``average``
+
+    controller : :class:`.TrustRegion`, optional
+        Step controller passed to :func:`.fitwalk`. Without a ``gradient``,
+        its probe and secant steps replace the fixed ``first_step``
+
+    mode : {'read', 'monitor'}, optional
+        How shots are acquired, see :func:`.measure_average`
     """
     # Prepend field names
     target_fields = [
@@ -194,6 +436,8 @@ def walk_to_pixel(
 
     system = system or list()
     average = average or 1
+    if policy is not None:
+        average = policy.maximum
     # Travel to starting position
     if start:
         yield from mv(motor, start)
@@ -213,12 +457,29 @@ def walk_to_pixel(
             avgs = yield from measure_average(
                 [detector, motor] + system,
                 filters=filters,
-                num=average,
+                num=average if policy is None else policy.shots(tolerance),
                 delay=delay,
                 drop_missing=drop_missing,
+                target_field=target_fields[0],
+                tolerance=tolerance,
+                precision=precision,
+                mode=mode,
+                fields=target_fields if project else None,
             )
+            # Close out any partial averages so each measurement is its own point
+            for model in [fit] + models:
+                model.flush()
+            if precision is not None:
+                logger.debug(
+                    "Gradient step measured %s with %s shots, stderr=%s",
+                    target_fields[0],
+                    avgs[target_fields[0] + "_shots"],
+                    avgs[target_fields[0] + "_stderr"],
+                )
             # Extract centroid and position
             center, pos = avgs[target_fields[0]], avgs[target_fields[1]]
+            if policy is not None:
+                policy.observe(target - center)
             # Calculate corresponding intercept
             intercept = center - gradient * pos
             # Calculate best step on first guess of line
@@ -233,9 +494,14 @@ def walk_to_pixel(
         naive_step = gradient_step
     else:
         init_guess = dict()
+        if controller is None:
 
-        def naive_step():
-            return (yield from rel_set(motor, first_step, wait=True))
+            def naive_step():
+                return (yield from rel_set(motor, first_step, wait=True))
+
+        else:
+            # Let the controller probe the response
+            naive_step = None
 
     # Create fitting callback
     fit = LinearFit(
@@ -259,6 +525,11 @@ def walk_to_pixel(
         delay=delay,
         drop_missing=drop_missing,
         max_steps=max_steps,
+        precision=precision,
+        project=project,
+        policy=policy,
+        controller=controller,
+        mode=mode,
     )
 
     # Report if we did not need a model
@@ -268,8 +539,21 @@ def walk_to_pixel(
     return last_shot, accurate_model
 
 
+@timed("measure", device=_first_detector, counts=_shot_counts)
 def measure(
-    detectors, num=1, delay=None, filters=None, drop_missing=True, max_dropped=50
+    detectors,
+    num=1,
+    delay=None,
+    filters=None,
+    drop_missing=True,
+    max_dropped=50,
+    until=None,
+    fields=None,
+    stream=None,
+    depth=1,
+    overlap=None,
+    rate=None,
+    period=None,
 ):
     """
     Gather a fixed number of measurements from a group of detectors
@@ -296,10 +580,56 @@ def measure(
     max_dropped : int, optional
         Maximum number of events to drop before raising a ValueError
 
+    until : callable, optional
+        Called with the :class:`.ShotBuffer` after every shot that passes the
+        filters. If it returns True the measurement ends early, making ``num``
+        a ceiling rather than a fixed count
+
+    fields : list, optional
+        Only read these fields every shot. Any field used by ``filters`` is
+        included automatically. Only the detectors that report these fields
+        are triggered, and every detector is read once at the start of the
+        measurement so the rest of the system is still reported in
+        :attr:`.ShotBuffer.constants`. By default, every detector is
+        triggered and read in full for every shot
+
+    stream : str, optional
+        Name of the event stream the shots are saved in. This defaults to
+        ``'primary'``, or a name derived from the fields if they are given, as
+        the set of objects read in a stream can not change
+
+    depth : int, optional
+        Number of shots that may be in flight at once. With a depth greater
+        than one, the next shots are triggered as soon as the current shot has
+        finished acquiring, so the detectors expose while the current shot is
+        read. Shots are still read, saved and filtered in order. Pipelining is
+        disabled when a ``delay`` is requested
+
+    overlap : list, optional
+        Detectors that may be triggered before the previous shot has been
+        read, along with any detector that sets a ``pipeline_safe`` attribute
+        to True. Every other detector is triggered shot by shot, as devices
+        whose reading changes as soon as they are triggered would otherwise
+        report the value of a later shot
+
+    rate : float or Signal, optional
+        Take shots at this rate in Hz, e.g. the beam rate. A signal reporting
+        the rate is read once at the start of the measurement. Every shot,
+        whether or not it passes the filters, is given an absolute deadline on
+        a monotonic clock so latency does not accumulate. Slots that are
+        missed entirely are skipped. Pipelining is disabled on a schedule
+
+    period : float, optional
+        Time between shots in seconds, an alternative to ``rate``
+
     Returns
     -------
-    data : list
-        List of mock-event documents
+    data : :class:`.ShotBuffer`
+        Columnar record of every shot taken. Iterating over the buffer yields
+        a mock-event document for each shot that passed the filters, while
+        :meth:`.ShotBuffer.to_array` provides the raw shots as a structured
+        array. The :class:`.ShotScheduler` used for a ``rate`` or ``period``
+        is kept as :attr:`.ShotBuffer.schedule`
     """
     # Log setup
     logger.debug("Running measure")
@@ -309,6 +639,28 @@ def measure(
         "".format([d.name for d in detectors], num, delay, drop_missing)
     )
 
+    # Read the rate from a signal
+    if isinstance(rate, Signal):
+        reading = yield Msg("read", rate)
+        rate = reading[rate.name]["value"]
+    # Pace the shots on a fixed grid of deadlines
+    if rate is not None and period is not None:
+        raise ValueError("Only one of rate and period can be supplied")
+    elif rate is not None and rate > 0:
+        schedule = ShotScheduler.from_rate(rate)
+    elif rate is not None:
+        logger.warning("Reported rate of %s Hz can not be scheduled", rate)
+        schedule = None
+    elif period is not None:
+        schedule = ShotScheduler(period)
+    else:
+        schedule = None
+
+    # Overlapping shots would defeat the requested spacing between them
+    if depth > 1 and (delay is not None or schedule is not None):
+        logger.debug("Shot spacing requested, acquiring shots serially")
+        depth = 1
+
     # If scalable, repeat forever
     if not isinstance(delay, Iterable):
         delay = itertools.repeat(delay)
@@ -340,41 +692,95 @@ def measure(
     logger.debug("Gathering shots..")
     shots = 0
     dropped = 0
-    data = list()
-    filters = filters or dict()
+    # Preallocate for the worst case before FilterCountError is raised
+    data = ShotBuffer(capacity=num + max_dropped + 1)
+    data.schedule = schedule
+    filters = FilterSpec(filters or dict())
+
+    # Choose what to trigger and read for each shot
+    if fields is None:
+        triggered = readers = detectors
+        stream = stream or "primary"
+    else:
+        fields = list(fields) + [key for key in filters if key not in fields]
+        owners, readers = _field_signals(detectors, fields)
+        triggered = list()
+        for det in owners:
+            if det not in triggered:
+                triggered.append(det)
+        stream = stream or "-".join(sorted(fields))
+        # Snapshot the rest of the system once
+        for det in detectors:
+            cur_det = yield Msg("read", det)
+            data.constants.update(dict([(k, v["value"]) for k, v in cur_det.items()]))
+        logger.debug("Reading only %s each shot", fields)
+
+    # Choose which detectors can acquire the next shot during the reads
+    overlapped = list()
+    if depth > 1:
+        overlapped = [det for det in triggered if _can_overlap(det, overlap)]
+        logger.debug(
+            "Pipelining %s shots on %s", depth, [det.name for det in overlapped]
+        )
+    # Groups of shots that have been triggered ahead, with their timestamps
+    in_flight = deque()
+    ahead = ("B-{}-{}".format(uuid.uuid4(), i) for i in itertools.count())
+
     # Gather fixed number of shots
     while shots < num:
-        # Timestamp earliest possible moment
-        now = time.time()
+        # Wait for the next slot in the schedule
+        if schedule is not None:
+            wait = schedule.wait()
+            if wait > 0:
+                yield Msg("sleep", None, wait)
+            schedule.mark()
+        started = time.monotonic()
+
+        # Trigger detector, unless it was already triggered ahead
+        if in_flight:
+            group, now = in_flight.popleft()
+            to_trigger = [det for det in triggered if det not in overlapped]
+        else:
+            # Timestamp earliest possible moment
+            group, now = "B-{}".format(uuid.uuid4()), time.time()
+            to_trigger = triggered
+        for det in to_trigger:
+            yield Msg("trigger", det, group=group)
 
-        # Trigger detector and wait for completion
-        for det in detectors:
-            yield Msg("trigger", det, group="B")
+        # Wait for completion
+        yield Msg("wait", None, group)
 
-        # Wait for completion and start bundling
-        yield Msg("wait", None, "B")
-        yield Msg("create", None, name="primary")
+        # Start acquiring the next shots while this one is read
+        while overlapped and len(in_flight) < depth - 1:
+            in_flight.append((next(ahead), time.time()))
+            for det in overlapped:
+                yield Msg("trigger", det, group=in_flight[-1][0])
+
+        # Start bundling
+        yield Msg("create", None, name=stream)
 
         # Mock-event document
         det_reads = dict()
 
         # Gather shots
-        for det in detectors:
+        for det in readers:
             cur_det = yield Msg("read", det)
             det_reads.update(dict([(k, v["value"]) for k, v in cur_det.items()]))
         # Emit Event doc to callbacks
         yield Msg("save")
 
         # Apply filters
-        unfiltered = apply_filters(
-            det_reads, filters=filters, drop_missing=drop_missing
-        )
+        unfiltered = filters.passes(det_reads, drop_missing=drop_missing)
+        # Record the shot, keeping track of whether it passed
+        data.append(det_reads, accepted=unfiltered, timestamp=now)
         # Increment shots if filters are passed
         shots += int(unfiltered)
         # Do not delay if we have not passed filter
         if unfiltered:
-            # Append recent read to data list
-            data.append(det_reads)
+            # Stop early if we have gathered enough information
+            if until is not None and until(data):
+                logger.debug("Measurement ended early after %s shots", shots)
+                break
 
             # Gather next delay
             try:
@@ -395,7 +801,7 @@ def measure(
 
             # If we have a delay, sleep
             if d is not None:
-                d = d - (time.time() - now)
+                d = d - (time.monotonic() - started)
                 if d > 0:
                     yield Msg("sleep", None, d)
 
@@ -417,16 +823,424 @@ def measure(
                 dropped_dict,
             )
             raise FilterCountError
+    # Let any shots that were triggered ahead finish before moving on
+    for group, _ in in_flight:
+        yield Msg("wait", None, group)
     # Report finished
     logger.debug(
         "Finished taking {} measurements, "
         "filters removed {} events"
         "".format(len(data), dropped)
     )
+    if schedule is not None:
+        logger.debug(
+            "Requested %.3g Hz and achieved %.3g Hz, missing %s slots",
+            schedule.requested_rate,
+            schedule.achieved_rate,
+            schedule.missed,
+        )
 
     return data
 
 
+def _can_overlap(det, overlap=None):
+    """
+    Whether a detector can be triggered before its last shot has been read
+    """
+    if det in (overlap or list()):
+        return True
+    return getattr(det, "pipeline_safe", False)
+
+
+def _read_signals(obj):
+    """
+    Signals that make up the reading of an object
+    """
+    if not isinstance(obj, Device):
+        return [obj]
+    keys = obj.describe().keys()
+    return [walk.item for walk in obj.walk_signals() if walk.item.name in keys]
+
+
+class _MonitoredShot(object):
+    """
+    Readable stand-in for the shot :func:`.measure_monitor` is saving, so the
+    values received from the monitors can be emitted as an Event. Stand-ins
+    for the same stream and keys are equal, as the objects read into a stream
+    can not change
+    """
+
+    def __init__(self, name, description):
+        self.name = name
+        self.parent = None
+        self.description = description
+        self.values = dict()
+        self.timestamp = None
+
+    def describe(self):
+        return self.description
+
+    def read(self):
+        return dict(
+            (key, {"value": value, "timestamp": self.timestamp})
+            for key, value in self.values.items()
+        )
+
+    def describe_configuration(self):
+        return dict()
+
+    def read_configuration(self):
+        return dict()
+
+    def _key(self):
+        return (self.name, tuple(sorted(self.description)))
+
+    def __eq__(self, other):
+        return isinstance(other, _MonitoredShot) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+
+def _field_signals(detectors, fields):
+    """
+    Find the signal that reports each field, along with the detector it
+    belongs to
+    """
+    signals = dict()
+    owners = dict()
+    for det in detectors:
+        for sig in _read_signals(det):
+            if sig.name in fields and sig.name not in signals:
+                signals[sig.name] = sig
+                owners[sig.name] = det
+    missing = [field for field in fields if field not in signals]
+    if missing:
+        raise ValueError("No detector reports the fields {}".format(missing))
+    return [owners[field] for field in fields], [signals[field] for field in fields]
+
+
+@timed("monitor", device=_first_detector, counts=_shot_counts)
+def measure_monitor(
+    detectors,
+    num=1,
+    filters=None,
+    drop_missing=True,
+    max_dropped=50,
+    trigger=None,
+    until=None,
+    timeout=None,
+    poll=0.01,
+    fields=None,
+    stream=None,
+):
+    """
+    Gather a fixed number of measurements from the monitor updates of a group
+    of detectors
+
+    Instead of triggering and reading each detector for every shot, each
+    signal that makes up the detectors' readings is subscribed to. Every
+    update of the ``trigger`` signal is a new shot, combined with the most
+    recent values of every other signal. The values of every signal are read
+    once at the start so that each shot is complete even if only the trigger
+    signal updates. Shots are recorded directly into a :class:`.ShotBuffer`
+    by the subscription callback. Each shot that passes the filters is also
+    saved as an Event with the values of the monitored signals, so callbacks
+    such as the models of :func:`.fitwalk` receive it.
+
+    Parameters
+    ----------
+    detectors : list
+        Signals or devices to monitor
+
+    num : int
+        Number of measurements that pass filters
+
+    filters : dict, optional
+        Key, callable pairs of event keys and single input functions that
+        evaluate to True or False. For more infromation see
+        :meth:`.apply_filters`
+
+    drop_missing : bool, optional
+        Choice to include events where event keys are missing
+
+    max_dropped : int, optional
+        Maximum number of events to drop before raising a FilterCountError
+
+    trigger : ophyd.Signal, optional
+        Signal whose updates define a new shot. By default, the first signal
+        of the first detector, e.g. ``stats2.centroid.x`` when passed directly
+
+    until : callable, optional
+        Called with the :class:`.ShotBuffer` after every shot that passes the
+        filters. If it returns True the measurement ends early
+
+    timeout : float, optional
+        Maximum time to wait for the shots before raising a
+        :class:`.MonitorTimeoutError`
+
+    poll : float, optional
+        Interval at which the plan checks whether the shots have arrived
+
+    fields : list, optional
+        Only subscribe to the signals reporting these fields. Any field used
+        by ``filters`` is included automatically. The first field is the
+        default ``trigger``
+
+    stream : str, optional
+        Name of the event stream the accepted shots are saved in. This
+        defaults to ``'monitor'``, or a name derived from the fields if they
+        are given
+
+    Returns
+    -------
+    data : :class:`.ShotBuffer`
+        Columnar record of every shot received
+    """
+    logger.debug("Running measure_monitor")
+    filters = FilterSpec(filters or dict())
+    if fields is None:
+        signals = [sig for det in detectors for sig in _read_signals(det)]
+        stream = stream or "monitor"
+    else:
+        fields = list(fields) + [key for key in filters if key not in fields]
+        _, signals = _field_signals(detectors, fields)
+        stream = stream or "-".join(["monitor"] + sorted(fields))
+    trigger = trigger or signals[0]
+    data = ShotBuffer(capacity=num + max_dropped + 1)
+    # Each accepted shot is saved with the values of the monitored signals
+    description = dict()
+    for sig in signals:
+        description.update(sig.describe())
+    shot = _MonitoredShot(stream, description)
+    accepted_shots = deque()
+    # Snapshot the current state of the detectors
+    latest = dict()
+    for det in detectors:
+        cur_det = yield Msg("read", det)
+        latest.update(dict([(k, v["value"]) for k, v in cur_det.items()]))
+
+    lock = threading.Lock()
+    done = threading.Event()
+    shots = 0
+    dropped = 0
+
+    def update(*args, obj, value, timestamp=None, **kwargs):
+        nonlocal shots, dropped
+        with lock:
+            if done.is_set():
+                return
+            latest[obj.name] = value
+            if obj is not trigger:
+                return
+            accepted = filters.passes(latest, drop_missing=drop_missing)
+            data.append(latest, accepted=accepted, timestamp=timestamp)
+            if accepted:
+                values = dict((key, latest.get(key)) for key in description)
+                accepted_shots.append((values, timestamp or time.time()))
+                shots += 1
+                if shots >= num or (until is not None and until(data)):
+                    done.set()
+            else:
+                dropped += 1
+                if dropped > max_dropped:
+                    done.set()
+
+    def save_shots():
+        while accepted_shots:
+            shot.values, shot.timestamp = accepted_shots.popleft()
+            yield Msg("create", None, name=stream)
+            yield Msg("read", shot)
+            yield Msg("save")
+
+    # Collect the updates
+    for sig in signals:
+        sig.subscribe(update, run=False)
+    start = time.time()
+    try:
+        while not done.is_set():
+            if timeout is not None and time.time() - start > timeout:
+                raise MonitorTimeoutError(
+                    "Only received {} of {} shots after {} s"
+                    "".format(shots, num, timeout)
+                )
+            yield from save_shots()
+            yield Msg("sleep", None, poll)
+    finally:
+        for sig in signals:
+            sig.clear_sub(update)
+    yield from save_shots()
+
+    if dropped > max_dropped:
+        logger.debug(
+            "Dropped too many monitor updates, raising exception. Latest "
+            "bad values were %s",
+            dict((key, latest.get(key)) for key in filters.keys()),
+        )
+        raise FilterCountError
+    logger.debug(
+        "Finished monitoring {} measurements, filters removed {} updates"
+        "".format(shots, dropped)
+    )
+    return data
+
+
+def _stats_plugin(obj, stats="detector.stats2"):
+    """
+    Find the Stats plugin associated with an object, if there is one
+    """
+    if isinstance(obj, StatsPlugin):
+        return obj
+    for attr in stats.split("."):
+        obj = getattr(obj, attr, None)
+    if isinstance(obj, StatsPlugin):
+        return obj
+    return None
+
+
+@timed("timeseries", device=_first_detector, counts=_shot_counts)
+def measure_timeseries(
+    detectors,
+    num=1,
+    filters=None,
+    drop_missing=True,
+    max_dropped=50,
+    stats="detector.stats2",
+    timeout=None,
+    poll=0.01,
+):
+    """
+    Gather a fixed number of centroid measurements using the time series
+    acquisition of the areaDetector Stats plugin
+
+    The Stats plugin of each detector is told to acquire the centroids of the
+    next ``num`` frames on the IOC. Once they have been acquired, the whole
+    time series is read back as a single waveform and recorded in a
+    :class:`.ShotBuffer`. Time series centroids are reported under the same
+    field names as the regular centroid readings, e.g.
+    ``<name>_detector_stats2_centroid_x``, so filters and averages work as if
+    the shots were read one at a time. Filters are evaluated over the entire
+    time series at once, and if any shots are dropped, another time series is
+    acquired for the missing shots. Detectors without a Stats plugin, such as
+    motors, are read once and their values are used for every shot.
+
+    The IOC does not report when each frame was taken, so the shots of each
+    time series are given timestamps evenly spaced between the start of the
+    acquisition and the moment it was seen to be complete.
+
+    Parameters
+    ----------
+    detectors : list
+        Detectors or Stats plugins to acquire from, along with any other
+        readable objects
+
+    num : int
+        Number of measurements that pass filters
+
+    filters : dict, optional
+        Key, callable pairs of event keys and single input functions that
+        evaluate to True or False. For more infromation see
+        :meth:`.ShotBuffer.apply_filters`
+
+    drop_missing : bool, optional
+        Choice to include events where event keys are missing
+
+    max_dropped : int, optional
+        Maximum number of events to drop before raising a FilterCountError
+
+    stats : str, optional
+        Attribute path from each detector to its Stats plugin
+
+    timeout : float, optional
+        Maximum time to wait for each time series before raising a
+        :class:`.MonitorTimeoutError`
+
+    poll : float, optional
+        Interval at which the plan checks the progress of the acquisition
+
+    Returns
+    -------
+    data : :class:`.ShotBuffer`
+        Columnar record of every shot acquired
+    """
+    logger.debug("Running measure_timeseries")
+    plugins = list()
+    snapshot = dict()
+    for det in detectors:
+        plugin = _stats_plugin(det, stats=stats)
+        if plugin is not None:
+            plugins.append(plugin)
+        else:
+            cur_det = yield Msg("read", det)
+            snapshot.update(dict([(k, v["value"]) for k, v in cur_det.items()]))
+    if not plugins:
+        raise ValueError("No Stats plugins found to acquire a time series from")
+
+    shots = 0
+    data = ShotBuffer(capacity=num + max_dropped + 1)
+    while shots < num:
+        needed = num - shots
+        # Configure and start the acquisition
+        group = str(uuid.uuid4())
+        for plugin in plugins:
+            yield from abs_set(plugin.ts_num_points, needed, group=group)
+        yield from plan_wait(group=group)
+        start = time.time()
+        for plugin in plugins:
+            yield from abs_set(plugin.ts_control, "Erase/Start", group=group)
+        yield from plan_wait(group=group)
+        # Wait for the IOC to acquire the frames
+        while True:
+            finished = time.time()
+            acquired = True
+            for plugin in plugins:
+                reading = yield from plan_read(plugin.ts_current_point)
+                # Nothing to wait for without a reading, e.g. in simulation
+                if reading is None:
+                    continue
+                reading = reading[plugin.ts_current_point.name]
+                finished = reading.get("timestamp", finished)
+                acquired &= reading["value"] >= needed
+            if acquired:
+                break
+            if timeout is not None and time.time() - start > timeout:
+                raise MonitorTimeoutError(
+                    "Time series did not acquire {} points after {} s"
+                    "".format(needed, timeout)
+                )
+            yield Msg("sleep", None, poll)
+        # Read back the entire time series
+        columns = dict(snapshot)
+        for plugin in plugins:
+            yield from abs_set(plugin.ts_control, "Read", wait=True)
+            cur_ts = yield Msg("read", plugin.ts_centroid)
+            for ts_sig, sig in zip(
+                (plugin.ts_centroid.x, plugin.ts_centroid.y),
+                (plugin.centroid.x, plugin.centroid.y),
+            ):
+                values = np.asarray(cur_ts[ts_sig.name]["value"], dtype=float)
+                columns[sig.name] = values[:needed]
+        # Trim to the shortest series we received
+        length = min(np.size(v) for v in columns.values() if np.ndim(v) > 0)
+        if not length:
+            raise MonitorTimeoutError("Time series did not return any points")
+        data.extend(
+            dict((k, v[:length] if np.ndim(v) > 0 else v) for k, v in columns.items()),
+            timestamps=np.linspace(start, max(finished, start), length),
+        )
+        # Filter every shot at once
+        shots = int(np.count_nonzero(data.apply_filters(filters, drop_missing)))
+        if data.dropped > max_dropped:
+            logger.debug("Dropped too many time series points, raising exception")
+            raise FilterCountError
+    logger.debug(
+        "Finished acquiring {} time series points, filters removed {}"
+        "".format(shots, data.dropped)
+    )
+    return data
+
+
+@timed("fitwalk", device=lambda args: args["motor"])
 def fitwalk(
     detectors,
     motor,
@@ -439,6 +1253,11 @@ def fitwalk(
     tolerance=10,
     delay=None,
     max_steps=10,
+    precision=None,
+    project=False,
+    policy=None,
+    controller=None,
+    mode="read",
 ):
     """
     Parameters
@@ -459,7 +1278,8 @@ def fitwalk(
 
     naive_step : bluesky.plan, optional
         Plan to execute when there is not an accurate enough model available.
-        By default this is ``mv(0.01)``
+        By default the ``controller`` probes the detector with a small step,
+        then takes secant steps through the last two measurements
 
     average : int, optional
         Number of readings to take and average at each event. Models are
@@ -487,7 +1307,33 @@ def fitwalk(
         Maximum number of steps the scan will attempt before faulting.
         There is a max of 10 by default, but you may disable this by setting
         this option to None. Note that this may cause the walk to run indefinitely.
+
+    precision : float, optional
+        If provided, each measurement stops as soon as the standard error of
+        the target field is below ``precision * tolerance``, with ``average``
+        as the maximum number of shots. See :func:`.measure_average`
+
+    project : bool, optional
+        Only read the fields used by the models every shot. The rest of the
+        detectors are read once per measurement. See :func:`.measure`
+
+    policy : :class:`.AveragingPolicy`, optional
+        Choose the number of readings for each measurement from the distance
+        to the target, up to ``average``. The policy is told the error after
+        every measurement, along with the shot noise if ``precision`` is used
+
+    controller : :class:`.TrustRegion`, optional
+        Limits every move to a trust region that adapts to how well the
+        previous steps matched their predictions, as well as to the limits
+        of the motor. By default steps are only limited once a prediction
+        fails
+
+    mode : {'read', 'monitor'}, optional
+        How shots are acquired, see :func:`.measure_average`. Time series
+        emit no events for the models to fit, so they can not drive a walk
     """
+    if mode == "timeseries":
+        raise ValueError("Time series measurements can not drive a walk")
     # Check all models are fitting the same key
     if len(set([model.y for model in models])) > 1:
         raise RuntimeError(
@@ -518,36 +1364,80 @@ def fitwalk(
         set(var for model in models for var in model.independent_vars.values())
     )
     motors = dict((key, motor) for key in field_names if key in motor.read_attrs)
+    # Fields to read each shot
+    if project:
+        shot_fields = [target_field] + sorted(field_names)
+    else:
+        shot_fields = None
 
     # Initialize variables
     steps = 0
+    candidates = ModelSet(models)
+    if controller is None:
+        controller = TrustRegion()
+
     if not naive_step:
 
         def naive_step():
-            return (yield from rel_set(motor, 0.01, wait=True))
+            setpoint = None
+            if steps:
+                setpoint = controller.secant(motor.position)
+            if setpoint is None:
+                setpoint = controller.probe(motor.position)
+            return (yield from mv(motor, setpoint))
 
     # Measurement method
     def model_measure():
+        if policy is None:
+            num = average
+        else:
+            num = min(policy.shots(tolerance), average)
         # Take average measurement
         avg = yield from measure_average(
             detectors,
-            num=average,
+            num=num,
             delay=delay,
             drop_missing=drop_missing,
             filters=filters,
+            target_field=target_field,
+            tolerance=tolerance,
+            precision=precision,
+            mode=mode,
+            fields=shot_fields,
         )
+        # Close out any partial averages so each measurement is its own point
+        for model in models:
+            model.flush()
+        # Report the achieved precision
+        noise = None
+        if precision is not None:
+            shots = avg.pop(target_field + "_shots")
+            stderr = avg.pop(target_field + "_stderr")
+            logger.debug(
+                "Measured {} with {} shots and a standard error of {}"
+                "".format(target_field, shots, stderr)
+            )
+            noise = stderr * np.sqrt(shots)
         # Save current target position
         last_shot = avg.pop(target_field)
+        if policy is not None:
+            policy.observe(target - last_shot, noise=noise)
         logger.debug(
             "Averaged data yielded {} is at {}" "".format(target_field, last_shot)
         )
 
         # Rank models based on accuracy of fit
-        model_ranking = rank_models(models, last_shot, **avg)
+        with span("fit", motor):
+            model_ranking = candidates.rank(last_shot, **avg)
 
         # Determine if any models are accurate enough
         if len(model_ranking):
-            model = model_ranking[0]
+            best = model_ranking[0]
+            model = best.model
+            logger.debug(
+                "Model {} predicted {} +/- {}"
+                "".format(model.name, best.estimate, best.uncertainty)
+            )
 
         else:
             model = None
@@ -556,6 +1446,7 @@ def fitwalk(
 
     # Make first measurements
     averaged_data, last_shot, accurate_model = yield from model_measure()
+    controller.start(motor.position, last_shot, target, limits=_motor_limits(motor))
     # Begin walk
     while not np.isclose(last_shot, target, atol=tolerance):
         # Log error
@@ -578,7 +1469,8 @@ def fitwalk(
         # or we have not made a step yet
         if not accurate_model or steps == 0:
             logger.debug("No model yielded accurate prediction, " "using naive plan")
-            yield from naive_step()
+            with span("move", motor):
+                yield from naive_step()
         else:
             logger.debug(
                 "Using model {} to determine next step." "".format(accurate_model.name)
@@ -592,7 +1484,8 @@ def fitwalk(
 
             # Try and step off model prediction
             try:
-                estimates = accurate_model.backsolve(target, **fixed_motors)
+                with span("fit", motor):
+                    estimates = accurate_model.backsolve(target, **fixed_motors)
 
             # Report model faults
             except Exception as e:
@@ -604,7 +1497,8 @@ def fitwalk(
 
                 # Reuse naive step
                 logger.debug("Reusing naive step due to lack of accurate model")
-                yield from naive_step()
+                with span("move", motor):
+                    yield from naive_step()
             else:
                 # Move system to match estimate
                 for param, pos in estimates.items():
@@ -617,7 +1511,9 @@ def fitwalk(
                             "Adjusting motor {} to position {:.1f}"
                             "".format(motor.name, pos)
                         )
-                        yield from mv(motor, pos)
+                        pos = controller.constrain(motor.position, pos)
+                        with span("move", motor):
+                            yield from mv(motor, pos)
 
                     except KeyboardInterrupt as e:
                         logger.debug(
@@ -629,6 +1525,7 @@ def fitwalk(
         # Take a new measurement
         logger.debug("Resampling after successfull move")
         averaged_data, last_shot, accurate_model = yield from model_measure()
+        controller.observe(motor.position, last_shot)
 
     # Report a succesfull run
     logger.info(
@@ -637,3 +1534,16 @@ def fitwalk(
     )
 
     return last_shot, accurate_model
+
+
+def _motor_limits(motor):
+    """
+    Lowest and highest position of a motor, or None if it has no limits
+    """
+    try:
+        low, high = motor.limits
+    except Exception:
+        return None
+    if low is None or high is None or not low < high:
+        return None
+    return low, high
@@ -0,0 +1,742 @@
+"""
+Containers for shot-by-shot acquisition
+"""
+############
+# Standard #
+############
+import logging
+import math
+import numbers
+import time
+
+###############
+# Third Party #
+###############
+import numpy as np
+from scipy.stats import norm
+
+##########
+# Module #
+##########
+from .filters import FilterSpec
+
+logger = logging.getLogger(__name__)
+
+
+def _is_scalar_number(value):
+    """
+    Whether a reading can be stored in a floating point column
+    """
+    return isinstance(value, (numbers.Real, np.bool_)) and not isinstance(
+        value, str
+    )
+
+
+class ShotBuffer(object):
+    """
+    Preallocated, columnar record of shots taken by :func:`.measure`
+
+    Each field in the readings is stored in its own NumPy array. Scalar
+    numeric readings are kept in ``float64`` columns padded with NaN, every
+    other type of reading (strings, arrays, etc.) is kept in an ``object``
+    column. Which shots reported each field is tracked separately, so a shot
+    that reads NaN is told apart from one that did not report the field.
+    Shots that were rejected by filters are still recorded, but are
+    masked out of every view of the data.
+
+    The buffer behaves like the list of dictionaries :func:`.measure` used to
+    return; iterating, indexing and ``len`` all act on the accepted shots.
+
+    Values that are only recorded once per measurement, for instance a
+    snapshot of devices that are not read every shot, can be stored in
+    :attr:`.constants`. These are included in every shot and average, but are
+    not part of :meth:`.to_array`.
+
+    If the shots were paced by a :class:`.ShotScheduler` it is kept as
+    :attr:`.schedule`, reporting the requested and achieved shot rates.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of shots to preallocate space for. The buffer grows if this is
+        exceeded
+
+    Example
+    -------
+    .. code::
+
+        buf = ShotBuffer(10)
+        buf.append({'a': 1, 'b': 'string'})
+        buf.mean()
+    """
+
+    def __init__(self, capacity=1):
+        self.capacity = max(int(capacity), 1)
+        self.size = 0
+        self.columns = dict()
+        self.reported = dict()
+        self.constants = dict()
+        self.timestamps = np.full(self.capacity, np.nan)
+        self.accepted = np.zeros(self.capacity, dtype=bool)
+        self.schedule = None
+
+    @property
+    def fields(self):
+        """
+        Names of all the fields recorded in the buffer
+        """
+        return list(self.columns.keys())
+
+    @property
+    def mask(self):
+        """
+        Boolean mask of the accepted shots among all recorded shots
+        """
+        return self.accepted[: self.size]
+
+    @property
+    def dropped(self):
+        """
+        Number of recorded shots that were rejected
+        """
+        return int(self.size - np.count_nonzero(self.mask))
+
+    def _grow(self, capacity):
+        """
+        Extend every column to hold at least ``capacity`` shots
+        """
+        capacity = max(capacity, 2 * self.capacity)
+        logger.debug("Growing ShotBuffer from %s to %s shots", self.capacity, capacity)
+        for key, col in self.columns.items():
+            new = self._empty(col.dtype, capacity)
+            new[: self.size] = col[: self.size]
+            self.columns[key] = new
+            reported = np.zeros(capacity, dtype=bool)
+            reported[: self.size] = self.reported[key][: self.size]
+            self.reported[key] = reported
+        timestamps = np.full(capacity, np.nan)
+        timestamps[: self.size] = self.timestamps[: self.size]
+        accepted = np.zeros(capacity, dtype=bool)
+        accepted[: self.size] = self.accepted[: self.size]
+        self.timestamps, self.accepted = timestamps, accepted
+        self.capacity = capacity
+
+    @staticmethod
+    def _empty(dtype, capacity):
+        if dtype == object:
+            return np.full(capacity, None, dtype=object)
+        return np.full(capacity, np.nan)
+
+    def _column(self, key, value):
+        """
+        Find or create the column for a field, promoting it to an ``object``
+        column if it can not hold ``value``
+        """
+        col = self.columns.get(key)
+        numeric = _is_scalar_number(value)
+        if col is None:
+            col = self._empty(float if numeric else object, self.capacity)
+            self.columns[key] = col
+            self.reported[key] = np.zeros(self.capacity, dtype=bool)
+        elif not numeric and col.dtype != object:
+            promoted = col.astype(object)
+            promoted[~self.reported[key]] = None
+            self.columns[key] = col = promoted
+        return col
+
+    def append(self, reads, accepted=True, timestamp=None):
+        """
+        Record a single shot
+
+        Parameters
+        ----------
+        reads : dict
+            Field names mapped to the values of this shot
+
+        accepted : bool, optional
+            Whether the shot passed the filters
+
+        timestamp : float, optional
+            Time associated with the shot
+        """
+        if self.size >= self.capacity:
+            self._grow(self.size + 1)
+        for key, value in reads.items():
+            self._column(key, value)[self.size] = value
+            self.reported[key][self.size] = True
+        if timestamp is not None:
+            self.timestamps[self.size] = timestamp
+        self.accepted[self.size] = bool(accepted)
+        self.size += 1
+
+    def extend(self, columns, accepted=None, timestamps=None):
+        """
+        Record a block of shots at once
+
+        Parameters
+        ----------
+        columns : dict
+            Field names mapped to equal length arrays of values. Scalars are
+            broadcast across the block
+
+        accepted : array-like of bool, optional
+            Whether each shot passed the filters. All are accepted by default
+
+        timestamps : array-like, optional
+            Time associated with each shot
+        """
+        length = max(
+            [np.size(v) for v in columns.values() if np.ndim(v) > 0] or [1]
+        )
+        if self.size + length > self.capacity:
+            self._grow(self.size + length)
+        block = slice(self.size, self.size + length)
+        for key, values in columns.items():
+            values = np.asarray(values)
+            sample = values.flat[0] if values.size else np.nan
+            col = self._column(key, sample if values.dtype != object else None)
+            col[block] = values
+            self.reported[key][block] = True
+        if timestamps is not None:
+            self.timestamps[block] = timestamps
+        self.accepted[block] = True if accepted is None else accepted
+        self.size += length
+
+    def apply_filters(self, filters=None, drop_missing=True):
+        """
+        Evaluate filters over every recorded shot at once
+
+        See :meth:`.FilterSpec.mask` for how each filter is evaluated. Missing
+        and non-finite values are handled as in :func:`.apply_filters`.
+
+        Parameters
+        ----------
+        filters : dict or FilterSpec, optional
+            Field names mapped to filters or single input functions that return
+            a boolean
+
+        drop_missing : bool, optional
+            Reject shots that do not report a value for a filtered field
+
+        Returns
+        -------
+        mask : numpy.ndarray
+            Whether each recorded shot passed the filters. This is also saved
+            as the new set of accepted shots
+        """
+        if not isinstance(filters, FilterSpec):
+            filters = FilterSpec(filters or dict())
+        mask = filters.mask(
+            self.columns,
+            size=self.size,
+            drop_missing=drop_missing,
+            constants=self.constants,
+        )
+        self.accepted[: self.size] = mask
+        return mask
+
+    def column(self, key, accepted_only=True):
+        """
+        View of the values recorded for a single field
+
+        Parameters
+        ----------
+        key : str
+            Field name
+
+        accepted_only : bool, optional
+            Only include shots that passed the filters
+        """
+        col = self.columns[key][: self.size]
+        if accepted_only:
+            return col[self.mask]
+        return col
+
+    def last(self, accepted_only=True):
+        """
+        The most recent shot as a dictionary
+        """
+        indices = np.flatnonzero(self.mask) if accepted_only else range(self.size)
+        if not len(indices):
+            raise IndexError("No shots have been recorded")
+        return self._row(indices[-1])
+
+    def _row(self, index):
+        row = dict(self.constants)
+        for key, col in self.columns.items():
+            # Fields missing from this shot are left out of the row
+            if self.reported[key][index]:
+                row[key] = col[index]
+        return row
+
+    def mean(self):
+        """
+        Average every field over the accepted shots
+
+        Shots that did not report a field do not affect its average, while a
+        shot that reported NaN makes the average NaN, as it did when the shots
+        were kept as a list of dictionaries. Fields that can not be averaged
+        report the value from the last accepted shot.
+
+        Returns
+        -------
+        average : dict
+            Field names mapped to their averages
+        """
+        avg = dict(self.constants)
+        mask = self.mask
+        for key, col in self.columns.items():
+            col = col[: self.size][mask & self.reported[key][: self.size]]
+            if col.dtype != object:
+                avg[key] = np.mean(col) if col.size else np.nan
+                continue
+            values = list(col)
+            try:
+                avg[key] = np.mean(values)
+            except (TypeError, ValueError):
+                avg[key] = values[-1] if values else None
+        return avg
+
+    def to_array(self, accepted_only=True):
+        """
+        Structured array of the recorded shots
+
+        Parameters
+        ----------
+        accepted_only : bool, optional
+            Only include shots that passed the filters
+
+        Returns
+        -------
+        shots : numpy.ndarray
+            One record per shot with a ``time`` field followed by one field per
+            column in the buffer
+        """
+        keys = self.fields
+        dtype = [("time", float)] + [(key, self.columns[key].dtype) for key in keys]
+        rows = self.mask if accepted_only else slice(None)
+        shots = np.empty(
+            np.count_nonzero(self.mask) if accepted_only else self.size, dtype=dtype
+        )
+        shots["time"] = self.timestamps[: self.size][rows]
+        for key in keys:
+            shots[key] = self.columns[key][: self.size][rows]
+        return shots
+
+    def __len__(self):
+        return int(np.count_nonzero(self.mask))
+
+    def __iter__(self):
+        for index in np.flatnonzero(self.mask):
+            yield self._row(index)
+
+    def __getitem__(self, item):
+        indices = np.flatnonzero(self.mask)
+        if isinstance(item, slice):
+            return [self._row(i) for i in indices[item]]
+        return self._row(indices[item])
+
+    def __repr__(self):
+        return "<ShotBuffer: {} accepted, {} dropped, fields={}>".format(
+            len(self), self.dropped, self.fields
+        )
+
+
+class RunningStats(object):
+    """
+    Online mean and variance of a stream of values
+
+    Uses Welford's algorithm so every update is constant time and memory, and
+    the result is numerically stable for values with a large offset, e.g.
+    centroids far from zero.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = np.nan
+        self._m2 = 0.0
+
+    def update(self, value):
+        """
+        Add a value to the running statistics. Non-finite values are ignored
+        """
+        value = float(value)
+        if not np.isfinite(value):
+            return
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        """
+        Unbiased sample variance, NaN until two values have been seen
+        """
+        if self.count < 2:
+            return np.nan
+        return self._m2 / (self.count - 1)
+
+    @property
+    def stderr(self):
+        """
+        Standard error of the mean, NaN until two values have been seen
+        """
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self.variance / self.count)
+
+
+class ShotScheduler(object):
+    """
+    Absolute deadlines for shots taken at a fixed rate
+
+    Every shot is assigned a slot on a fixed grid of deadlines measured from
+    the first shot with a monotonic clock, so latency in one shot does not
+    delay the rest, and changes to the system time do not affect the cadence.
+    If a shot is late by more than a whole period, the missed slots are
+    skipped and coalesced into a single shot taken immediately.
+
+    Parameters
+    ----------
+    period : float
+        Time between shots in seconds
+
+    clock : callable, optional
+        Monotonic clock returning the time in seconds
+
+    Example
+    -------
+    .. code::
+
+        schedule = ShotScheduler(1 / 120.)
+        time.sleep(schedule.wait())
+        schedule.mark()
+    """
+
+    def __init__(self, period, clock=time.monotonic):
+        if period <= 0:
+            raise ValueError("Shot period must be positive, not {}".format(period))
+        self.period = float(period)
+        self.clock = clock
+        self.start = None
+        self.slot = 0
+        self.missed = 0
+        self.shots = 0
+        self._first = None
+        self._last = None
+
+    @classmethod
+    def from_rate(cls, rate, **kwargs):
+        """
+        Schedule shots at a rate given in Hz
+        """
+        if rate <= 0:
+            raise ValueError("Shot rate must be positive, not {}".format(rate))
+        return cls(1.0 / rate, **kwargs)
+
+    @property
+    def requested_rate(self):
+        """
+        Rate the shots were scheduled at in Hz
+        """
+        return 1.0 / self.period
+
+    @property
+    def achieved_rate(self):
+        """
+        Average rate the shots were taken at in Hz, NaN until two shots have
+        been taken
+        """
+        if self.shots < 2 or self._last <= self._first:
+            return np.nan
+        return (self.shots - 1) / (self._last - self._first)
+
+    def wait(self):
+        """
+        Claim the next slot
+
+        Returns
+        -------
+        wait : float
+            Time in seconds until the deadline of the claimed slot, zero if it
+            should be taken immediately
+        """
+        now = self.clock()
+        if self.start is None:
+            self.start = now
+        deadline = self.start + self.slot * self.period
+        # Skip every slot that has been missed entirely
+        late = int((now - deadline) // self.period)
+        if late > 0:
+            logger.debug("Shot schedule missed %s slots", late)
+            self.missed += late
+            self.slot += late
+            deadline += late * self.period
+        self.slot += 1
+        return max(deadline - now, 0.0)
+
+    def mark(self):
+        """
+        Record that a shot has been taken
+        """
+        now = self.clock()
+        if self._first is None:
+            self._first = now
+        self._last = now
+        self.shots += 1
+
+    def stats(self):
+        """
+        Summary of the schedule
+
+        Returns
+        -------
+        stats : dict
+            The ``requested_rate`` and ``achieved_rate`` in Hz, the number of
+            ``shots`` taken and the number of slots ``missed``
+        """
+        return {
+            "requested_rate": self.requested_rate,
+            "achieved_rate": self.achieved_rate,
+            "shots": self.shots,
+            "missed": self.missed,
+        }
+
+    def __repr__(self):
+        return "<ShotScheduler: {:.3g} Hz requested, {:.3g} Hz achieved>".format(
+            self.requested_rate, self.achieved_rate
+        )
+
+
+class AveragingPolicy(object):
+    """
+    Number of shots to average for a measurement, chosen from the distance to
+    the goal
+
+    Far from the goal a noisy reading is still good enough to pick the next
+    step, so few shots are taken. Close to the goal the reading decides
+    whether the walk is finished, so up to ``maximum`` shots are taken.
+
+    If the shot-to-shot ``noise`` of the reading is known the count is the
+    fewest shots whose standard error is below ``precision`` times the larger
+    of the error and the tolerance. Otherwise the count falls geometrically
+    from ``maximum`` within ``near`` tolerances of the goal to ``minimum``
+    beyond ``far`` tolerances.
+
+    Each detector should have its own policy, as the latest error and noise
+    seen by :meth:`.observe` are kept to choose the next count.
+
+    Parameters
+    ----------
+    minimum : int, optional
+        Fewest shots to take
+
+    maximum : int, optional
+        Most shots to take, also used when the error is not known yet
+
+    near : float, optional
+        Errors within this many tolerances take the ``maximum``
+
+    far : float, optional
+        Errors beyond this many tolerances take the ``minimum``
+
+    precision : float, optional
+        Fraction of the distance to the goal the standard error of the mean
+        should reach when the noise is known
+
+    noise : float, optional
+        Standard deviation of a single shot, if known in advance
+
+    Example
+    -------
+    .. code::
+
+        policy = AveragingPolicy(minimum=2, maximum=20)
+        RE(walk_to_pixel(yag, mirror, 240, policy=policy))
+    """
+
+    def __init__(
+        self, minimum=1, maximum=20, near=2.0, far=20.0, precision=0.3, noise=None
+    ):
+        if not 1 <= minimum <= maximum:
+            raise ValueError(
+                "Shot counts must satisfy 1 <= minimum <= maximum, "
+                "not {} and {}".format(minimum, maximum)
+            )
+        if not 0 < near < far:
+            raise ValueError("Need 0 < near < far, not {} and {}".format(near, far))
+        self.minimum = int(minimum)
+        self.maximum = int(maximum)
+        self.near = near
+        self.far = far
+        self.precision = precision
+        self.noise = noise
+        self.error = None
+
+    def observe(self, error, noise=None):
+        """
+        Record the latest distance from the goal, and optionally the
+        shot-to-shot noise that was measured with it
+        """
+        self.error = abs(float(error))
+        if noise is not None and np.isfinite(noise):
+            self.noise = float(noise)
+
+    def shots(self, tolerance, error=None, noise=None):
+        """
+        Number of shots to take for the next measurement
+
+        Parameters
+        ----------
+        tolerance : float
+            Tolerance the reading is being compared against
+
+        error : float, optional
+            Distance from the goal, by default the last observed error
+
+        noise : float, optional
+            Standard deviation of a single shot, by default the last observed
+            or configured noise
+
+        Returns
+        -------
+        num : int
+        """
+        error = self.error if error is None else abs(error)
+        noise = self.noise if noise is None else noise
+        if error is None or not tolerance:
+            return self.maximum
+        if noise is not None:
+            distance = self.precision * max(error, tolerance)
+            num = np.ceil((noise / distance) ** 2)
+        else:
+            ratio = error / tolerance
+            if ratio <= self.near:
+                num = self.maximum
+            elif ratio >= self.far:
+                num = self.minimum
+            else:
+                fraction = np.log(ratio / self.near) / np.log(self.far / self.near)
+                num = round(self.maximum * (self.minimum / self.maximum) ** fraction)
+        return int(min(max(num, self.minimum), self.maximum))
+
+    def __repr__(self):
+        return "<AveragingPolicy: {} to {} shots>".format(self.minimum, self.maximum)
+
+
+def noise_statistics(values):
+    """
+    Noise of a series of readings taken at rest
+
+    Consecutive shots of a drifting or jittering beam are not independent, so
+    the standard error of a mean falls slower than ``1 / sqrt(n)``. The
+    integrated autocorrelation time ``tau`` counts how many shots make up one
+    independent sample. It is summed over the lags of the normalized
+    autocorrelation until it turns negative, or the lag is five times the
+    running estimate, to keep the noise of the long lags out.
+
+    Parameters
+    ----------
+    values : array-like
+        Readings in the order they were taken. Non-finite values are ignored
+
+    Returns
+    -------
+    stats : dict
+        The ``mean`` and standard deviation ``std`` of the readings, the
+        autocorrelation time ``tau`` in shots, the number of ``shots`` and
+        the number of ``effective`` independent samples
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    count = len(values)
+    if count < 2:
+        return {
+            "mean": float(np.mean(values)) if count else np.nan,
+            "std": np.nan,
+            "tau": 1.0,
+            "shots": count,
+            "effective": float(count),
+        }
+    mean = values.mean()
+    std = values.std(ddof=1)
+    tau = 1.0
+    if std > 0:
+        # Autocovariance of every lag at once, padded to avoid wrapping
+        spectrum = np.fft.rfft(values - mean, 2 * count)
+        acf = np.fft.irfft(spectrum * np.conj(spectrum))[:count]
+        acf /= acf[0]
+        for lag in range(1, count // 2):
+            if acf[lag] <= 0 or lag >= 5 * tau:
+                break
+            tau += 2 * acf[lag]
+    return {
+        "mean": float(mean),
+        "std": float(std),
+        "tau": float(tau),
+        "shots": count,
+        "effective": count / tau,
+    }
+
+
+def _z_score(confidence):
+    """
+    Half width of a two-sided normal interval with the given confidence, in
+    standard deviations
+    """
+    return norm.ppf(0.5 + confidence / 2)
+
+
+def required_averages(stats, tolerance, confidence=0.95, margin=0.5, maximum=None):
+    """
+    Fewest shots whose average is within a fraction of a tolerance of the true
+    value with a given confidence
+
+    Parameters
+    ----------
+    stats : dict
+        Noise of the reading, with the ``std`` and ``tau`` found by
+        :func:`.noise_statistics`
+
+    tolerance : float
+        Tolerance the average is compared against
+
+    confidence : float, optional
+        Probability that the error of the average is within the margin
+
+    margin : float, optional
+        Fraction of the tolerance the error of the average may use up. The
+        rest is left for the position of the beam
+
+    maximum : int, optional
+        Cap on the number of shots
+
+    Returns
+    -------
+    num : int
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("Confidence must be in (0, 1), not {}".format(confidence))
+    std, tau = stats["std"], stats.get("tau", 1.0)
+    if not np.isfinite(std) or std <= 0:
+        num = 1
+    else:
+        ratio = _z_score(confidence) * std / (margin * tolerance)
+        num = max(int(math.ceil(tau * ratio**2)), 1)
+    if maximum is not None:
+        num = min(num, int(maximum))
+    return num
+
+
+def achievable_tolerance(stats, num, confidence=0.95, margin=0.5):
+    """
+    Smallest tolerance :func:`.required_averages` can meet with ``num`` shots
+    """
+    std, tau = stats["std"], stats.get("tau", 1.0)
+    if not np.isfinite(std):
+        return 0.0
+    return _z_score(confidence) * std * math.sqrt(tau / num) / margin
@@ -72,6 +72,11 @@ class StatsPlugin(PluginBase, plugins.StatsPlugin):
         _get_readback_centroid_y - Centroid y
 
     This will guarantee that returned centroid will always be an int.
+
+    The time series signals are simulated as well. Setting ``ts_control`` to
+    ``"Erase/Start"`` or ``"Start"`` immediately acquires ``ts_num_points``
+    frames worth of centroids, noise included, into the ``ts_centroid``
+    arrays.
     """
 
     plugin_type = Component(FakeSignal, value="NDPluginStats")
@@ -130,7 +135,7 @@ class StatsPlugin(PluginBase, plugins.StatsPlugin):
     ts_centroid = DynamicDeviceComponent(
         ad_group(FakeSignal, (("x"), ("y")), value=0), doc="Time series centroid in XY"
     )
-    ts_control = Component(FakeSignal, value=0)
+    ts_control = Component(FakeSignal, value="Stop", use_string=True)
     ts_current_point = Component(FakeSignal, value=0)
     ts_max_value = Component(FakeSignal, value=0)
     ts_max = DynamicDeviceComponent(
@@ -189,6 +194,32 @@ class StatsPlugin(PluginBase, plugins.StatsPlugin):
         self.centroid.y._get_readback = lambda **kwargs: int(
             np.round(self._get_readback_centroid_y())
         )
+        # Simulate the time series acquisition
+        self._ts_x = list()
+        self._ts_y = list()
+        self.ts_centroid.x._get_readback = lambda **kwargs: np.asarray(
+            self._ts_x, dtype=float
+        )
+        self.ts_centroid.y._get_readback = lambda **kwargs: np.asarray(
+            self._ts_y, dtype=float
+        )
+        self.ts_current_point._get_readback = lambda **kwargs: len(self._ts_x)
+        self.ts_control.subscribe(self._ts_control_changed, run=False)
+
+    def _ts_control_changed(self, *args, value, **kwargs):
+        """
+        Acquire a time series of centroids when the acquisition is started
+        """
+        if value not in ("Erase/Start", "Start"):
+            return
+        if value == "Erase/Start":
+            self._ts_x.clear()
+            self._ts_y.clear()
+        self.ts_acquiring.put(1)
+        for i in range(int(self.ts_num_points.get())):
+            self._ts_x.append(self.centroid.x.get())
+            self._ts_y.append(self.centroid.y.get())
+        self.ts_acquiring.put(0)
 
     def _get_readback_centroid_x(self, **kwargs):
         return self.centroid.x._raw_readback
@@ -5,8 +5,13 @@ import logging
 from bluesky import RunEngine
 from bluesky.preprocessors import run_decorator, stage_decorator
 
+from .cache import NoiseCache
+from .filters import FilterSpec, Threshold
 from .iterwalk import iterwalk
+from .plan_stubs import ImagerScheduler
+from .plans import measure_noise
 from .recovery import homs_recovery, sim_recovery
+from .shots import achievable_tolerance, required_averages
 from .suspenders import BeamEnergySuspendFloor, BeamRateSuspendFloor
 from .utils import field_prepend
 from .utils.argutils import as_list
@@ -50,9 +55,27 @@ def skywalker(
     md=None,
     tol_scaling=None,
     extra_stage=None,
+    cache=None,
+    energy=None,
+    journal=None,
+    resume=False,
+    noise=None,
+    confidence=0.95,
 ):
     """
     Iterwalk as a base, with recovery plans, filters, and bonus staging.
+
+    A gradient ``cache`` and the beam ``energy`` are passed to
+    :func:`.iterwalk` to warm-start the walks. With a ``journal`` the
+    alignment can be continued after an interruption by passing ``resume``.
+
+    If ``noise`` is given, a :class:`.NoiseCache`, the path to one, or True
+    to measure without caching, the noise of each detector is characterized
+    with :func:`.measure_noise` before the walk. Each detector then averages
+    the fewest shots, up to ``averages``, that meet its tolerance with the
+    given ``confidence``. Tolerances that can not be met with ``averages``
+    shots are widened to what can be, rather than leaving the walk to thrash.
+    Detectors whose noise could not be measured keep the given settings.
     """
     _md = {
         "goals": goals,
@@ -77,7 +100,7 @@ def skywalker(
     if use_filters:
         filters = []
         for det, fld in zip(detectors, det_fields):
-            filters.append({field_prepend(fld, det): lambda x: x > 0})
+            filters.append(FilterSpec({field_prepend(fld, det): Threshold(0)}))
     else:
         # Don't filter on sims unless testing recovery
         filters = None
@@ -96,6 +119,22 @@ def skywalker(
     @run_decorator(md=_md)
     @stage_decorator(to_stage)
     def letsgo():
+        nonlocal averages, tolerances
+        if noise is not None:
+            averages, tolerances, missing = yield from noise_settings(
+                detectors,
+                det_fields,
+                tolerances,
+                averages,
+                noise,
+                confidence=confidence,
+                filters=filters,
+            )
+            if missing:
+                logger.warning(
+                    "Using the requested averages and tolerances for %s",
+                    ", ".join(missing),
+                )
         walk = iterwalk(
             detectors,
             motors,
@@ -111,7 +150,80 @@ def skywalker(
             recovery_plan=recovery_plan,
             filters=filters,
             tol_scaling=tol_scaling,
+            cache=cache,
+            energy=energy,
+            journal=journal,
+            resume=resume,
         )
         return (yield from walk)
 
     return (yield from letsgo())
+
+
+def noise_settings(
+    detectors, det_fields, tolerances, averages, noise, confidence=0.95, filters=None
+):
+    """
+    Choose the averages and tolerances of each detector from its noise
+
+    Detectors without a fresh entry in the ``noise`` cache are put in the
+    beam one at a time and characterized with :func:`.measure_noise`.
+
+    Parameters
+    ----------
+    noise : :class:`.NoiseCache`, str or True
+        Cache of noise measurements, the path to one, or True to always
+        measure without caching
+
+    Returns
+    -------
+    averages : list of int
+        Fewest shots that meet each tolerance, at most the given ``averages``
+
+    tolerances : list of float
+        Tolerances, widened where ``averages`` shots can not meet them
+
+    missing : list of str
+        Names of the detectors that could not be put in the beam to measure
+        their noise, these keep the given averages and tolerances
+    """
+    num = len(detectors)
+    det_fields = as_list(det_fields, num)
+    tolerances = as_list(tolerances, num)
+    averages = as_list(averages, num)
+    filters = as_list(filters, num)
+    if noise is True:
+        noise = None
+    elif isinstance(noise, str):
+        noise = NoiseCache(noise)
+    imagers = ImagerScheduler(detectors, timeout=15)
+    missing = list()
+    for index, det in enumerate(detectors):
+        stats = None
+        if noise is not None:
+            stats = noise.get(det.name, field_prepend(det_fields[index], det))
+        if stats is None:
+            ok = yield from imagers.prep(index)
+            if not ok:
+                logger.warning("Unable to insert %s to measure its noise", det.name)
+                missing.append(det.name)
+                continue
+            stats = yield from measure_noise(
+                det, det_fields[index], filters=filters[index], cache=noise
+            )
+        shots = required_averages(
+            stats, tolerances[index], confidence=confidence, maximum=averages[index]
+        )
+        achievable = achievable_tolerance(stats, shots, confidence=confidence)
+        if achievable > tolerances[index]:
+            logger.warning(
+                "Tolerance of %s on %s can not be met with %s shots, using %.3g",
+                tolerances[index],
+                det.name,
+                shots,
+                achievable,
+            )
+            tolerances[index] = achievable
+        logger.info("Averaging %s shots on %s", shots, det.name)
+        averages[index] = shots
+    return averages, tolerances, missing
@@ -0,0 +1,258 @@
+"""
+Step control for walks of a single motor
+"""
+############
+# Standard #
+############
+import logging
+import math
+
+##########
+# Module #
+##########
+logger = logging.getLogger(__name__)
+
+
+class TrustRegion(object):
+    """
+    Limit the steps of a walk to a region where the model can be trusted
+
+    Every proposed step is limited to a length of ``radius``, and moves are
+    kept within the motor ``limits`` and ``max_travel`` from the start of the
+    walk. A step is only ever shortened, never lengthened. Once the step has
+    been measured, the improvement it made towards the target is compared to
+    the improvement that was predicted. Steps that fall short of ``accept`` of
+    the prediction, or make things worse, are rejected and shrink the radius
+    to ``shrink`` times their length. A step back towards the last accepted
+    position may cover the distance to it on top of the radius, so the move
+    that undoes a rejected step is not clipped. Steps that reach ``good`` of
+    the prediction while limited by the radius grow it by ``grow``.
+
+    Without an initial ``radius`` steps are only limited once a prediction
+    has failed, so walks with a reliable model are not slowed down.
+
+    When there is no model to step from, :meth:`.secant` proposes a Newton
+    step along the line through the last two measurements, and
+    :meth:`.probe` a fixed step of ``first_step`` before there are two.
+
+    Parameters
+    ----------
+    radius : float, optional
+        Initial largest step
+
+    first_step : float, optional
+        Size of the step used to probe the response of the detector
+
+    grow : float, optional
+        Factor to grow the radius by after a good step at its edge
+
+    shrink : float, optional
+        Fraction of the failed step the radius shrinks to
+
+    accept : float, optional
+        Fraction of the predicted improvement a step must make to be trusted
+
+    good : float, optional
+        Fraction of the predicted improvement that grows the radius
+
+    min_radius : float, optional
+        Smallest the radius may shrink to
+
+    max_radius : float, optional
+        Largest the radius may grow to
+
+    limits : tuple, optional
+        Lowest and highest position to move to. By default the limits of the
+        motor are used
+
+    max_travel : float, optional
+        Furthest distance to move from the position at the start of the walk
+    """
+
+    def __init__(
+        self,
+        radius=None,
+        first_step=0.01,
+        grow=2.0,
+        shrink=0.25,
+        accept=0.25,
+        good=0.75,
+        min_radius=None,
+        max_radius=None,
+        limits=None,
+        max_travel=None,
+    ):
+        if not 0 < shrink < 1 < grow:
+            raise ValueError("Need 0 < shrink < 1 < grow")
+        self.radius = radius
+        self.first_step = first_step
+        self.grow = grow
+        self.shrink = shrink
+        self.accept = accept
+        self.good = good
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.limits = limits
+        self.max_travel = max_travel
+        self.origin = None
+        self.target = None
+        self.points = list()
+        self.accepted = None
+        self.failures = 0
+        self._bounds = None
+        self._pending = None
+
+    def start(self, position, reading, target, limits=None):
+        """
+        Begin a walk
+
+        Parameters
+        ----------
+        position : float
+            Position of the motor
+
+        reading : float
+            Measurement at that position
+
+        target : float
+            Reading the walk is aiming for
+
+        limits : tuple, optional
+            Limits of the motor, used unless :attr:`.limits` was given
+        """
+        self.origin = position
+        self.target = target
+        self.points = [(position, reading)]
+        self.accepted = (position, reading)
+        self._pending = None
+        low, high = -math.inf, math.inf
+        limits = self.limits or limits
+        if limits is not None and limits[0] < limits[1]:
+            low, high = limits
+        if self.max_travel is not None:
+            low = max(low, position - self.max_travel)
+            high = min(high, position + self.max_travel)
+        self._bounds = (low, high)
+
+    def constrain(self, position, setpoint):
+        """
+        Clip a move to the trust region and the limits
+
+        Parameters
+        ----------
+        position : float
+            Current position of the motor
+
+        setpoint : float
+            Position the model asks for
+
+        Returns
+        -------
+        setpoint : float
+            Position to move to
+        """
+        full = setpoint - position
+        step = full
+        if self.radius is not None:
+            limit = self.radius
+            # Allow a step back to the last accepted position
+            if self.accepted is not None:
+                back = self.accepted[0] - position
+                if back * step > 0:
+                    limit += abs(back)
+            if abs(step) > limit:
+                step = math.copysign(limit, step)
+        if self._bounds is not None:
+            # Never move further outside of limits the motor is already past
+            low = min(self._bounds[0], position)
+            high = max(self._bounds[1], position)
+            step = min(max(position + step, low), high) - position
+        if step != full:
+            logger.debug("Clipped step from %s to %s", full, step)
+        # Remember what was expected of the step
+        error = self.target - self.points[-1][1] if self.points else None
+        fraction = step / full if full else 1.0
+        edge = self.radius is not None and abs(step) >= 0.999 * self.radius
+        self._pending = (error, step, fraction, edge)
+        return position + step
+
+    def observe(self, position, reading):
+        """
+        Record a measurement, judging the step that led to it
+
+        Parameters
+        ----------
+        position : float
+            Position of the motor
+
+        reading : float
+            Measurement at that position
+        """
+        self.points.append((position, reading))
+        pending, self._pending = self._pending, None
+        if self.target is None:
+            return
+        # Only move the centre of the region to positions that are no worse
+        better = self.accepted is None or (
+            abs(self.target - reading) <= abs(self.target - self.accepted[1])
+        )
+        if pending is None or pending[0] is None:
+            if better:
+                self.accepted = (position, reading)
+            return
+        error, step, fraction, edge = pending
+        predicted = abs(error) * fraction
+        actual = abs(error) - abs(self.target - reading)
+        if not predicted or not step:
+            if better:
+                self.accepted = (position, reading)
+            return
+        ratio = actual / predicted
+        if ratio < self.accept:
+            self.failures += 1
+            radius = self.shrink * abs(step)
+            if self.min_radius is not None:
+                radius = max(radius, self.min_radius)
+            logger.debug(
+                "Step made %.2g of the predicted improvement, "
+                "shrinking the trust region to %s",
+                ratio,
+                radius,
+            )
+            self.radius = radius
+            return
+        if not better:
+            return
+        self.accepted = (position, reading)
+        if ratio >= self.good and edge:
+            radius = self.grow * self.radius
+            if self.max_radius is not None:
+                radius = min(radius, self.max_radius)
+            logger.debug("Growing the trust region to %s", radius)
+            self.radius = radius
+
+    def probe(self, position):
+        """
+        Position for a step of ``first_step``, used before the response of
+        the detector is known
+        """
+        setpoint = self.constrain(position, position + self.first_step)
+        # A probe makes no prediction to judge
+        self._pending = None
+        return setpoint
+
+    def secant(self, position):
+        """
+        Position for a Newton step on the line through the last two
+        measurements, or None if they do not define a slope
+        """
+        if len(self.points) < 2:
+            return None
+        (x0, y0), (x1, y1) = self.points[-2:]
+        if x1 == x0 or y1 == y0:
+            return None
+        slope = (y1 - y0) / (x1 - x0)
+        return self.constrain(position, x1 + (self.target - y1) / slope)
+
+    def __repr__(self):
+        return "<TrustRegion: radius {}>".format(self.radius)
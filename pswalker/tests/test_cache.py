@@ -0,0 +1,65 @@
+############
+# Standard #
+############
+import json
+import logging
+import time
+
+##########
+# Module #
+##########
+from pswalker.cache import GradientCache, NoiseCache
+
+logger = logging.getLogger(__name__)
+
+
+def test_gradient_cache_roundtrip(tmp_path):
+    path = str(tmp_path / "cache" / "gradients.json")
+    cache = GradientCache(path)
+    assert len(cache) == 0
+    cache.put("m1", "y1", "centroid_x", {"slope": 2.0, "intercept": 3.0}, energy=9.52)
+    cache.save()
+    # Energies in the same bucket share an entry
+    cache = GradientCache(path)
+    entry = cache.get("m1", "y1", "centroid_x", energy=9.49)
+    assert entry["slope"] == 2.0
+    assert entry["intercept"] == 3.0
+    assert cache.get("m1", "y1", "centroid_x", energy=8.0) is None
+    assert cache.get("m1", "y1", "centroid_x") is None
+
+
+def test_gradient_cache_eviction(tmp_path):
+    path = str(tmp_path / "gradients.json")
+    cache = GradientCache(path, max_age=10, max_entries=2)
+    for i in range(3):
+        cache.put("m{}".format(i), "y1", "centroid_x", {"slope": i})
+        cache.entries[cache.key("m{}".format(i), "y1", "centroid_x")][
+            "timestamp"
+        ] -= 3 - i
+    # Size bound drops the oldest entries
+    assert len(cache) == 2
+    assert cache.get("m0", "y1", "centroid_x") is None
+    # Stale entries are dropped
+    cache.entries[cache.key("m1", "y1", "centroid_x")]["timestamp"] = time.time() - 20
+    assert cache.get("m1", "y1", "centroid_x") is None
+    assert cache.get("m2", "y1", "centroid_x")["slope"] == 2
+
+
+def test_gradient_cache_bad_file(tmp_path):
+    path = tmp_path / "gradients.json"
+    path.write_text("not json")
+    assert len(GradientCache(str(path))) == 0
+    path.write_text(json.dumps({"version": -1, "entries": {"a": {}}}))
+    assert len(GradientCache(str(path))) == 0
+
+
+def test_noise_cache(tmp_path):
+    path = str(tmp_path / "noise.json")
+    cache = NoiseCache(path, max_age=10)
+    cache.put("y1", "y1_centroid_x", {"mean": 1.0, "std": 2.0, "tau": 3.0})
+    cache.save()
+    entry = NoiseCache(path).get("y1", "y1_centroid_x")
+    assert entry["std"] == 2.0
+    assert entry["tau"] == 3.0
+    cache.entries[cache.key("y1", "y1_centroid_x")]["timestamp"] -= 20
+    assert cache.get("y1", "y1_centroid_x") is None
@@ -1,13 +1,17 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 from bluesky import RunEngine
 from bluesky.plans import outer_product_scan, scan
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from ophyd.sim import SynAxis, SynSignal
 
-from pswalker.callbacks import (LinearFit, MultiPitchFit, apply_filters,
-                                rank_models)
+from pswalker.callbacks import (LinearFit, LivePlotWithGoal, ModelSet,
+                                MultiPitchFit, RunningLeastSquares,
+                                apply_filters, rank_models)
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +42,120 @@ def test_linear_fit():
     assert np.allclose(cb.backsolve(52)["x"], 10, atol=1e-5)
 
 
+def test_linear_fit_backends():
+    RE = RunEngine()
+    motor = SynAxis(name="motor")
+    rng = np.random.default_rng(0)
+    det = SynSignal(
+        name="centroid",
+        func=lambda: 5 * motor.read()["motor"]["value"] + 2 + rng.normal(),
+    )
+    sums = LinearFit("centroid", "motor", update_every=1)
+    lm = LinearFit("centroid", "motor", update_every=None, backend="lmfit")
+    RE(scan([det], motor, 1e3 - 1, 1e3 + 1, 50), [sums, lm])
+    # Both backends find the same line and uncertainty
+    for k in ("slope", "intercept"):
+        assert np.isclose(sums.result.values[k], lm.result.values[k])
+        assert np.isclose(
+            sums.result.errors[k], lm.result.params[k].stderr, rtol=1e-3
+        )
+    assert np.isclose(sums.eval(x=1e3), lm.eval(x=1e3))
+    assert "slope" in sums.result.fit_report()
+    # Only the running sums are kept
+    assert len(sums.ydata) == len(lm.ydata) == 50
+    assert not list(sums.ydata)
+
+
+def test_live_build_average():
+    cb = LinearFit("centroid", "motor", update_every=None, average=3, backend="lmfit")
+    docs = [
+        {
+            "time": i,
+            "seq_num": i + 1,
+            "data": {"centroid": 2 * i, "motor": i, "other": "a"},
+        }
+        for i in range(7)
+    ]
+    for doc in docs:
+        cb.event(doc)
+    # Each point is the average of three events
+    assert list(cb.ydata) == [2.0, 8.0]
+    assert list(cb.independent_vars_data["x"]) == [1.0, 4.0]
+    # Partial averages can be flushed
+    cb.flush()
+    assert list(cb.ydata) == [2.0, 8.0, 12.0]
+    # Incoming events are left untouched
+    assert docs[2]["data"] == {"centroid": 4, "motor": 2, "other": "a"}
+    # Events without the fields of the model are ignored
+    cb.event({"time": 8, "seq_num": 8, "data": {"motor": 1}})
+    cb.flush()
+    assert len(cb.ydata) == 3
+    # Changing the average starts a fresh buffer
+    cb.event(docs[0])
+    cb.average = 2
+    cb.flush()
+    assert len(cb.ydata) == 3
+
+
+def test_live_build_executor():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        cb = LinearFit("centroid", "motor", backend="lmfit", executor=executor)
+        for i in range(20):
+            cb.event(
+                {"time": i, "seq_num": i + 1, "data": {"centroid": 3 * i + 1, "motor": i}}
+            )
+        # Reading the result waits for the fits to catch up with the data
+        assert np.isclose(cb.result.values["slope"], 3)
+        assert cb.result.ndata == 20
+        assert np.isclose(cb.eval(x=2), 7)
+        assert np.isclose(cb.backsolve(10)["x"], 3)
+        # Fits from before a reset are discarded
+        cb._reset()
+        assert cb.result is None
+
+
+def test_running_least_squares():
+    # Unconstrained parameters stay at the initial guess
+    rls = RunningLeastSquares(1)
+    for _ in range(3):
+        rls.update([2.0], 7.0)
+    assert not rls.update([np.nan], 1.0)
+    assert rls.degenerate
+    params, covar, chisqr = rls.fit(guess=[0, 3])
+    assert np.allclose(params, [1, 3])
+    assert rls.count == 3
+    # A constant feature is held at its guess while the others are fit
+    rls = RunningLeastSquares(2)
+    for x in range(5):
+        rls.update([x, 2.0], 1 + 3 * x + 5 * 2.0)
+    assert not rls.degenerate
+    params, covar, chisqr = rls.fit(guess=[0, 0, 5])
+    assert np.allclose(params, [1, 3, 5])
+    # Forgetting old points follows a change in the line
+    rls = RunningLeastSquares(1, forget=0.5)
+    for x in range(20):
+        rls.update([x], 2 * x + 1)
+    for x in range(20):
+        rls.update([x], -x + 4)
+    params, covar, chisqr = rls.fit()
+    assert np.allclose(params, [4, -1], atol=1e-3)
+    # Match a batch fit
+    features = np.random.uniform(-1, 1, size=(50, 2))
+    y = 3 + features.dot([2, -1]) + np.random.normal(scale=0.1, size=50)
+    rls = RunningLeastSquares(2)
+    for row, value in zip(features, y):
+        rls.update(row, value)
+    design = np.column_stack((np.ones(50), features))
+    expected = np.linalg.lstsq(design, y, rcond=None)[0]
+    params, covar, chisqr = rls.fit()
+    assert not rls.degenerate
+    assert np.allclose(params, expected)
+    assert np.isclose(chisqr, np.sum((design.dot(expected) - y) ** 2))
+    assert np.allclose(
+        covar, np.linalg.inv(design.T.dot(design)) * chisqr / (50 - 3)
+    )
+
+
 def test_multi_fit():
     RE = RunEngine()
 
@@ -127,6 +245,56 @@ def test_apply_filters_correctness():
     assert apply_filters(mock_doc, filters={"c": lambda x: True}, drop_missing=False)
 
 
+def test_multi_fit_backends():
+    RE = RunEngine()
+    m1 = SynAxis(name="m1")
+    m2 = SynAxis(name="m2")
+    det = SynSignal(
+        name="centroid",
+        func=lambda: (
+            5
+            + 4 * m1.read()["m1"]["value"]
+            + 3 * m2.read()["m2"]["value"]
+            + np.random.normal(scale=0.1)
+        ),
+    )
+    rls = MultiPitchFit("centroid", ("m1", "m2"))
+    lm = MultiPitchFit("centroid", ("m1", "m2"), update_every=None, backend="lmfit")
+    RE(outer_product_scan([det], m1, -1, 1, 5, m2, -1, 1, 5, False), [rls, lm])
+    for k in ("x0", "x1", "x2"):
+        assert np.isclose(rls.result.values[k], lm.result.values[k])
+    # Uncertainty of the solution agrees between backends
+    err = rls.backsolve_error(55, a1=10)["a0"]
+    assert err > 0
+    assert np.isclose(err, lm.backsolve_error(55, a1=10)["a0"], rtol=1e-3)
+    assert np.isclose(rls.backsolve(55, a1=10)["a0"], lm.backsolve(55, a1=10)["a0"])
+
+
+def test_multi_fit_forget():
+    RE = RunEngine()
+    m1 = SynAxis(name="m1")
+    m2 = SynAxis(name="m2")
+    calls = 0
+
+    def centroid():
+        nonlocal calls
+        calls += 1
+        # The coupling drifts part way through the scan
+        coupling = 4 if calls <= 25 else 6
+        return 5 + coupling * m1.read()["m1"]["value"] + 3 * m2.read()["m2"]["value"]
+
+    det = SynSignal(name="centroid", func=centroid)
+    forget = MultiPitchFit("centroid", ("m1", "m2"), forget=0.8)
+    remember = MultiPitchFit("centroid", ("m1", "m2"))
+    RE(
+        outer_product_scan([det], m1, -1, 1, 10, m2, -1, 1, 10, False),
+        [forget, remember],
+    )
+    # Old points are forgotten
+    assert np.isclose(forget.result.values["x1"], 6, atol=1e-3)
+    assert not np.isclose(remember.result.values["x1"], 6, atol=1e-1)
+
+
 def test_rank_models():
     RE = RunEngine()
 
@@ -157,3 +325,69 @@ def test_rank_models():
     assert ranking[0] == fit1
     assert ranking[1] == fit3
     assert ranking[2] == fit2
+
+
+def test_model_set():
+    fits = list()
+    for slope in (25, 5, 12):
+        fit = LinearFit("centroid", "motor", update_every=None)
+        for i in range(5):
+            fit.event(
+                {
+                    "time": i,
+                    "seq_num": i + 1,
+                    "data": {"centroid": slope * i + 2, "motor": i},
+                }
+            )
+        fit.update_fit()
+        fits.append(fit)
+    # A model without a fit is left out of the ranking
+    fits.append(LinearFit("centroid", "motor", update_every=None))
+    models = ModelSet(fits)
+    ranking = models.rank(22, motor=4)
+    assert [ranked.model for ranked in ranking] == [fits[1], fits[2], fits[0]]
+    assert np.allclose([ranked.estimate for ranked in ranking], [22, 50, 102])
+    assert np.allclose([ranked.error for ranked in ranking], [0, 28, 80])
+    # Perfect fits have no uncertainty
+    assert np.allclose([ranked.uncertainty for ranked in ranking], 0, atol=1e-3)
+    # The ranking is the same through rank_models
+    assert rank_models(models, 22, x=4) == [fits[1], fits[2], fits[0]]
+    # Predictions are reused until the fit changes
+    version = fits[1].fit_version
+    assert models.rank(22, motor=4)[0].estimate == ranking[0].estimate
+    fits[1].event({"time": 5, "seq_num": 6, "data": {"centroid": 100, "motor": 5}})
+    fits[1].update_fit()
+    assert fits[1].fit_version != version
+    assert not np.isclose(models.predict(motor=4)[0][1], 22)
+
+
+def test_live_plot_with_goal():
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    plot = LivePlotWithGoal(
+        "centroid",
+        "seq_num",
+        goal=5,
+        tolerance=1,
+        window=50,
+        history=20,
+        interval=3600,
+        ax=ax,
+    )
+    plot.start({"time": 0, "uid": "start", "scan_id": 1})
+    for i in range(500):
+        plot.event({"time": i, "seq_num": i + 1, "data": {"centroid": i % 10}})
+    # Only one band is drawn and the history is bounded
+    assert len(ax.patches) == 1
+    assert len(plot.x_data) <= 70
+    assert plot.x_data[-50:] == list(range(451, 501))
+    # Only the first point was drawn, the rest wait for the end of the run
+    assert len(plot.current_line.get_xdata()) == 1
+    plot.stop(
+        {"time": 500, "uid": "stop", "run_start": "start", "exit_status": "success"}
+    )
+    assert len(plot.current_line.get_xdata()) == len(plot.x_data)
+    assert plot.band.get_x() == 1
+    assert plot.band.get_width() == 499
+    assert plot.band.get_y() == 4
@@ -1,10 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+###############
+# Third Party #
+###############
+import numpy as np
+
 ##########
 # Module #
 ##########
 from pswalker.examples import (_calc_cent_x, _m1_calc_cent_x,
-                               _m1_m2_calc_cent_x, patch_pims)
+                               _m1_m2_calc_cent_x, patch_pims, sim_jacobian)
 from pswalker.sim import pim
 
 
@@ -55,3 +60,21 @@ def test_pim_set_and_read(one_bounce_system):
     assert pim.sim_x.get() == set_x
     assert pim.sim_z.get() == set_z
     assert pim.detector.stats2.centroid.x.get() == _m1_calc_cent_x(s, mot, pim)
+
+
+def test_sim_jacobian(lcls_two_bounce_system):
+    s, m1, m2, y1, y2 = lcls_two_bounce_system
+    jacobian = sim_jacobian(s, [m1, m2], [y1, y2])
+    assert jacobian.shape == (2, 2)
+    step = 50
+    for col, mirror in enumerate((m1, m2)):
+        before = [y.detector.stats2.centroid.x.get() for y in (y1, y2)]
+        mirror.set(mirror.position + step)
+        after = [y.detector.stats2.centroid.x.get() for y in (y1, y2)]
+        for row in range(2):
+            assert np.isclose(after[row] - before[row],
+                              jacobian[row, col] * step, atol=1)
+    # Nothing upstream of a mirror depends on its pitch
+    early = pim.PIM("test_pim", name="early", z=95)
+    patch_pims(early, [m1, m2], source=s)
+    assert sim_jacobian(s, [m1, m2], early)[0, 1] == 0
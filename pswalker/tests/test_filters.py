@@ -0,0 +1,70 @@
+############
+# Standard #
+############
+import logging
+
+###############
+# Third Party #
+###############
+import numpy as np
+
+##########
+# Module #
+##########
+from pswalker.callbacks import apply_filters
+from pswalker.filters import Finite, FilterSpec, Range, Threshold
+
+logger = logging.getLogger(__name__)
+
+
+def test_declarative_filters():
+    values = np.array([-1.0, 0.0, 2.0, 5.0, np.inf])
+    np.testing.assert_array_equal(Threshold(0)(values), values > 0)
+    np.testing.assert_array_equal(Threshold(0, above=False)(values), values < 0)
+    np.testing.assert_array_equal(
+        Range(0, 5)(values), [False, True, True, True, False]
+    )
+    np.testing.assert_array_equal(
+        (Range(0, 5) & Range(high=3, inclusive=False))(values),
+        [False, True, True, False, False],
+    )
+    assert not Finite()(np.nan)
+    # Scalars behave like the lambda functions they replace
+    assert Threshold(0)(4)
+    assert not Threshold(0)(-4)
+
+
+def test_filter_spec_passes():
+    spec = FilterSpec({"a": Threshold(0), "b": lambda x: x == "on"})
+    assert spec.passes({"a": 4, "b": "on"})
+    assert not spec.passes({"a": -4, "b": "on"})
+    assert not spec.passes({"a": 4})
+    assert spec.passes({"a": 4}, drop_missing=False)
+    assert not spec.passes({"a": np.nan, "b": "on"})
+    # Array readings must pass in every element
+    assert not spec.passes({"a": [1, -1], "b": "on"})
+    # Declarative filters are interchangeable with callables
+    assert apply_filters({"a": 4}, {"a": Threshold(0)})
+    assert not apply_filters({"a": 4}, spec)
+
+
+def test_filter_spec_mask():
+    columns = {
+        "x": np.array([10.0, 200.0, np.nan, 500.0]),
+        "y": np.array([100.0, 100.0, 100.0, 100.0]),
+        "state": np.array(["IN", "IN", "OUT", "IN"], dtype=object),
+    }
+    spec = FilterSpec.roi("x", "y", (0, 480), (0, 640))
+    np.testing.assert_array_equal(spec.mask(columns), [True, True, False, False])
+    np.testing.assert_array_equal(
+        spec.mask(columns, drop_missing=False), [True, True, True, False]
+    )
+    # Only part of the columns
+    np.testing.assert_array_equal(spec.mask(columns, size=2), [True, True])
+    # Object columns and non-vectorized callables fall back to each shot
+    spec = FilterSpec({"state": lambda x: x == "IN", "x": lambda x: 5 < x < 300})
+    np.testing.assert_array_equal(spec.mask(columns), [True, True, False, False])
+    # Constants apply to every shot
+    spec = FilterSpec({"z": Threshold(0)})
+    assert spec.mask(columns, constants={"z": 1}).all()
+    assert not spec.mask(columns).any()
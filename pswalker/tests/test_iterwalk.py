@@ -14,7 +14,12 @@ from ophyd.status import Status
 ##########
 # Module #
 ##########
-from pswalker.iterwalk import iterwalk
+from pswalker.cache import GradientCache
+from pswalker.examples import patch_pims, sim_jacobian
+from pswalker.iterwalk import aitken, decoupled_groups, iterwalk
+from pswalker.journal import WalkJournal
+from pswalker.plan_stubs import ImagerScheduler
+from pswalker.sim import mirror, pim, source
 
 TOL = 5
 logger = logging.getLogger(__name__)
@@ -114,6 +119,284 @@ def test_iterwalk(
     assert all(map(lambda x: x == saves, [m1_reads, m2_reads, y1_reads, y2_reads]))
 
 
+@pytest.mark.timeout(tmo)
+@pytest.mark.parametrize("precisions", [None, 0.1])
+def test_iterwalk_project(RE, lcls_two_bounce_system, precisions):
+    s, m1, m2, y1, y2 = lcls_two_bounce_system
+    goal = [y1.size[0] / 2 + 300, y2.size[0] / 2 - 300]
+    plan = run_wrapper(
+        iterwalk(
+            [y1, y2],
+            [m1, m2],
+            goal,
+            first_steps=1e-4,
+            detector_fields="detector_stats2_centroid_x",
+            motor_fields="sim_alpha",
+            tolerances=3,
+            system=[m1, m2, y1, y2],
+            averages=5,
+            max_walks=5,
+            project=True,
+            precisions=precisions,
+        )
+    )
+    RE(plan)
+    for yag, target in zip((y1, y2), goal):
+        centroid = yag.read()[yag.name + "_detector_stats2_centroid_x"]["value"]
+        assert np.isclose(centroid, target, atol=3)
+    # Each shot only reads the centroid and pitch signals
+    reads = [msg for msg in RE.msg_hook.msgs if msg.command == "read"]
+    shot_reads = [msg for msg in reads if msg.obj not in (m1, m2, y1, y2)]
+    saves = [msg for msg in RE.msg_hook.msgs if msg.command == "save"]
+    assert len(shot_reads) == 2 * len(saves)
+
+
+@pytest.mark.timeout(tmo)
+def test_iterwalk_cache(RE, lcls_two_bounce_system, tmp_path):
+    s, m1, m2, y1, y2 = lcls_two_bounce_system
+    path = str(tmp_path / "gradients.json")
+    field = "detector_stats2_centroid_x"
+
+    def walk(goal):
+        RE.msg_hook.msgs.clear()
+        RE(
+            run_wrapper(
+                iterwalk(
+                    [y1, y2],
+                    [m1, m2],
+                    goal,
+                    first_steps=1e-4,
+                    detector_fields=field,
+                    motor_fields="sim_alpha",
+                    tolerances=3,
+                    system=[m1, m2, y1, y2],
+                    max_walks=5,
+                    cache=path,
+                    energy=9.5,
+                )
+            )
+        )
+        for yag, target in zip((y1, y2), goal):
+            centroid = yag.read()[yag.name + "_" + field]["value"]
+            assert np.isclose(centroid, target, atol=3)
+        return len([msg for msg in RE.msg_hook.msgs if msg.command == "set"])
+
+    cold = walk([y1.size[0] / 2 + 300, y2.size[0] / 2 - 300])
+    cache = GradientCache(path)
+    assert len(cache) == 2
+    assert cache.get(m1.name, y1.name, field, energy=9.5)["slope"] != 0
+    # A warm start needs fewer moves
+    warm = walk([y1.size[0] / 2 - 300, y2.size[0] / 2 + 300])
+    assert warm < cold
+
+
+@pytest.mark.timeout(tmo)
+@pytest.mark.parametrize("jacobian", ["sim", "probe"])
+def test_iterwalk_jacobian(RE, lcls_two_bounce_system, jacobian):
+    s, m1, m2, y1, y2 = lcls_two_bounce_system
+    field = "detector_stats2_centroid_x"
+    if jacobian == "sim":
+        jacobian = sim_jacobian(s, [m1, m2], [y1, y2])
+
+    def walk(goal, jacobian):
+        RE.msg_hook.msgs.clear()
+        RE(
+            run_wrapper(
+                iterwalk(
+                    [y1, y2],
+                    [m1, m2],
+                    goal,
+                    first_steps=10,
+                    detector_fields=field,
+                    motor_fields="sim_alpha",
+                    tolerances=3,
+                    system=[m1, m2, y1, y2],
+                    max_walks=5,
+                    jacobian=jacobian,
+                )
+            )
+        )
+        for yag, target in zip((y1, y2), goal):
+            centroid = yag.read()[yag.name + "_" + field]["value"]
+            assert np.isclose(centroid, target, atol=3)
+        # Count the times an imager was inserted
+        return len(
+            [
+                msg
+                for msg in RE.msg_hook.msgs
+                if msg.command == "set" and msg.args == ("IN",)
+            ]
+        )
+
+    serial = walk([y1.size[0] / 2 + 300, y2.size[0] / 2 - 300], None)
+    joint = walk([y1.size[0] / 2 - 300, y2.size[0] / 2 + 300], jacobian)
+    assert joint < serial
+
+
+def test_aitken():
+    # Geometric sequences extrapolate to their limit
+    sequence = [[10 - 8 * 0.5**n, 5 + 4 * (-0.25) ** n] for n in range(3)]
+    assert np.allclose(aitken(sequence), [10, 5])
+    # Stationary axes keep their position
+    assert np.allclose(aitken([[1, 0], [2, 0], [2.5, 0]]), [3, 0])
+    # Diverging or stalled sequences are not extrapolated
+    assert aitken([[0, 0], [1, 0], [3, 0]]) is None
+    assert aitken([[1, 1], [1, 1], [1, 1]]) is None
+
+
+@pytest.mark.timeout(tmo)
+@pytest.mark.parametrize("bad", [False, True])
+def test_iterwalk_extrapolate(RE, lcls_two_bounce_system, monkeypatch, bad):
+    s, m1, m2, y1, y2 = lcls_two_bounce_system
+    field = "detector_stats2_centroid_x"
+    goal = [y1.size[0] / 2 + 300, y2.size[0] / 2 - 300]
+    jumps = list()
+
+    def record(sequence):
+        target = aitken(sequence)
+        if bad:
+            # Overshoot far past the fixed point
+            target = [x + 100 for x in sequence[-1]]
+        jumps.append((sequence[-1], target))
+        return target
+
+    monkeypatch.setattr("pswalker.iterwalk.aitken", record)
+    # Serpentine ordering would alternate the map being extrapolated
+    imagers = ImagerScheduler([y1, y2], timeout=15, serpentine=True)
+    RE(
+        run_wrapper(
+            iterwalk(
+                [y1, y2],
+                [m1, m2],
+                goal,
+                first_steps=10,
+                detector_fields=field,
+                motor_fields="sim_alpha",
+                tolerances=1,
+                system=[m1, m2, y1, y2],
+                max_walks=10,
+                extrapolate=True,
+                imagers=imagers,
+            )
+        )
+    )
+    for yag, target in zip((y1, y2), goal):
+        centroid = yag.read()[yag.name + "_" + field]["value"]
+        assert np.isclose(centroid, target, atol=1)
+    assert jumps
+    assert not imagers.serpentine
+    sets = [msg.args[0] for msg in RE.msg_hook.msgs if msg.command == "set" and msg.obj is m1]
+    if bad:
+        # The failed jump was undone
+        origin, target = jumps[0]
+        assert sets[sets.index(target[0]) + 1] == origin[0]
+
+
+def test_decoupled_groups():
+    jacobian = [[2, 0, 0.5], [0, 1, 0.01], [0.1, 0, -3]]
+    assert decoupled_groups(jacobian) == [[0, 2], [1]]
+    assert decoupled_groups(jacobian, coupling=0.001) == [[0, 1, 2]]
+    assert decoupled_groups(np.eye(3)) == [[0], [1], [2]]
+
+
+@pytest.mark.timeout(tmo)
+@pytest.mark.parametrize("hint", ["groups", "jacobian"])
+def test_iterwalk_concurrent(RE, hint):
+    # Two mirrors on separate branches, each with its own imager
+    branches = list()
+    for name in ("a", "b"):
+        s = source.Undulator("und_" + name, name="und_" + name)
+        m = mirror.OffsetMirror("m_" + name, "m_" + name + "_xy", name="m_" + name, z=50)
+        y = pim.PIM("yag_" + name, name="yag_" + name, z=60, size=(500, 500))
+        patch_pims(y, m, source=s)
+        branches.append((m, y, sim_jacobian(s, m, y)[0, 0]))
+    (m1, y1, j1), (m2, y2, j2) = branches
+    field = "detector_stats2_centroid_x"
+    goal = [y1.size[0] / 2 + 50, y2.size[0] / 2 - 50]
+    if hint == "groups":
+        kwargs = dict(groups=[[0], [1]])
+    else:
+        kwargs = dict(jacobian=np.diag([j1, j2]))
+    RE(
+        run_wrapper(
+            iterwalk(
+                [y1, y2],
+                [m1, m2],
+                goal,
+                first_steps=10,
+                detector_fields=field,
+                motor_fields="sim_alpha",
+                tolerances=3,
+                max_walks=5,
+                **kwargs
+            )
+        )
+    )
+    for yag, target in zip((y1, y2), goal):
+        centroid = yag.read()[yag.name + "_" + field]["value"]
+        assert np.isclose(centroid, target, atol=3)
+    # Both mirrors were moved before waiting for either
+    moves = [
+        msg.obj
+        for msg in RE.msg_hook.msgs
+        if msg.command == "wait" or (msg.command == "set" and msg.obj in (m1, m2))
+    ]
+    assert any(
+        (first, second) in ((m1, m2), (m2, m1))
+        for first, second in zip(moves, moves[1:])
+    )
+
+
+@pytest.mark.timeout(tmo)
+def test_iterwalk_resume(RE, lcls_two_bounce_system, monkeypatch, tmp_path):
+    s, m1, m2, y1, y2 = lcls_two_bounce_system
+    field = "detector_stats2_centroid_x"
+    goal = [y1.size[0] / 2 + 300, y2.size[0] / 2 - 300]
+    path = str(tmp_path / "journal")
+    original = WalkJournal.record
+
+    def interrupt(self, state):
+        original(self, state)
+        raise RuntimeError("Interrupted")
+
+    def walk(resume):
+        return run_wrapper(
+            iterwalk(
+                [y1, y2],
+                [m1, m2],
+                goal,
+                first_steps=1e-4,
+                detector_fields=field,
+                motor_fields="sim_alpha",
+                tolerances=3,
+                system=[m1, m2, y1, y2],
+                max_walks=5,
+                journal=path,
+                resume=resume,
+            )
+        )
+
+    # Die right after the first walk
+    monkeypatch.setattr(WalkJournal, "record", interrupt)
+    with pytest.raises(RuntimeError):
+        RE(walk(False))
+    state = WalkJournal(path).last()
+    assert state["step"] == 1
+    assert state["finished"][0]
+    assert state["gradients"][0] is not None
+    monkeypatch.undo()
+    # Pick up with the second walk
+    RE.msg_hook.msgs.clear()
+    RE(walk(True))
+    sets = [msg.args[0] for msg in RE.msg_hook.msgs if msg.command == "set" and msg.obj is y1]
+    assert sets[0] == "OUT"
+    for yag, target in zip((y1, y2), goal):
+        centroid = yag.read()[yag.name + "_" + field]["value"]
+        assert np.isclose(centroid, target, atol=3)
+    # Finished alignments leave no journal behind
+    assert WalkJournal(path).last() is None
+
+
 @pytest.mark.timeout(tmo)
 def test_iterwalk_raises_RuntimeError_on_motion_timeout(RE, lcls_two_bounce_system):
     logger.debug("test_iterwalk_raises_RuntimeError_on_motion_timeout")
@@ -0,0 +1,40 @@
+############
+# Standard #
+############
+import logging
+
+##########
+# Module #
+##########
+from pswalker.journal import WalkJournal
+
+logger = logging.getLogger(__name__)
+
+
+def test_walk_journal_roundtrip(tmp_path):
+    path = str(tmp_path / "walks" / "journal")
+    journal = WalkJournal(path, sync_every=2)
+    assert journal.last() is None
+    journal.start()
+    for step in range(3):
+        journal.record({"step": step, "gradients": [1.5, None]})
+    journal.close()
+    state = WalkJournal(path).last()
+    assert state == {"step": 2, "gradients": [1.5, None]}
+    # A fresh start discards the old records
+    journal.start()
+    assert journal.last() is None
+    journal.record({"step": 0})
+    journal.clear()
+    assert WalkJournal(path).last() is None
+
+
+def test_walk_journal_partial_record(tmp_path):
+    path = tmp_path / "journal"
+    journal = WalkJournal(str(path))
+    journal.record({"step": 1})
+    journal.close()
+    # Simulate a crash in the middle of a write
+    with open(str(path), "a") as f:
+        f.write('{"version": 1, "state": {"st')
+    assert WalkJournal(str(path)).last() == {"step": 1}
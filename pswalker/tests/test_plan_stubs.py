@@ -6,11 +6,12 @@ import pytest
 from bluesky.preprocessors import run_wrapper
 from ophyd.device import Component as Cmp
 from ophyd.device import Device
+from bluesky.utils import Msg
 from ophyd.sim import NullStatus, SynAxis, SynSignal
 
-from ..plan_stubs import (fiducialize, homs_fiducialize, match_condition,
-                          prep_img_motors, slit_scan_area_comp,
-                          slit_scan_fiducialize)
+from ..plan_stubs import (ImagerScheduler, fiducialize, homs_fiducialize,
+                          interleave, match_condition, prep_img_motors,
+                          slit_scan_area_comp, slit_scan_fiducialize)
 from ..sim.pim import PIM
 from ..utils.argutils import as_list
 from ..utils.exceptions import BeamNotFoundError
@@ -42,6 +43,66 @@ def test_prep_img_motors(RE, fake_yags):
                         )
 
 
+def test_imager_scheduler(RE, fake_yags):
+    yags = fake_yags[0]
+    scheduler = ImagerScheduler(yags, serpentine=True)
+
+    def sets(n_mot):
+        RE.msg_hook.msgs.clear()
+        assert RE(scheduler.prep(n_mot)) is not None
+        assert yags[n_mot].blocking, "Desired yag not moved in"
+        assert not any(yag.blocking for yag in yags[:n_mot])
+        assert all(yag.blocking for yag in yags[n_mot:])
+        return [msg for msg in RE.msg_hook.msgs if msg.command == "set"]
+
+    # Yags start out, so the first prep inserts every one
+    assert len(sets(0)) == len(yags)
+    # Nothing changes when the same yag is requested again
+    assert not sets(0)
+    # Moving down the line only pulls out the previous yag
+    for i in range(1, len(yags)):
+        moves = sets(i)
+        assert [(msg.obj, msg.args) for msg in moves] == [(yags[i - 1], ("OUT",))]
+    # The next cycle starts from the end of the line
+    assert scheduler.order() == list(reversed(range(len(yags))))
+    assert len(sets(len(yags) - 2)) == 1
+    # Moves made behind the scheduler's back are noticed
+    yags[0].set("IN")
+    assert len(sets(len(yags) - 2)) == 1
+    assert scheduler.transitions == 2 * len(yags) + 1
+
+
+def test_interleave():
+    def plan(det, pause):
+        yield Msg("trigger", det, group="B")
+        yield Msg("wait", None, "B")
+        yield Msg("sleep", None, pause)
+        return pause
+
+    gen = interleave(plan("a", 0.2), plan("b", 0.3))
+    msgs = list()
+    try:
+        while True:
+            msgs.append(gen.send(None))
+    except StopIteration as stop:
+        results = stop.value
+    assert results == [0.2, 0.3]
+    # Both detectors are triggered before either wait
+    assert [msg.command for msg in msgs] == [
+        "trigger",
+        "trigger",
+        "wait",
+        "wait",
+        "sleep",
+    ]
+    # Each plan waits on its own group
+    groups = [msg.kwargs["group"] for msg in msgs[:2]]
+    assert groups[0] != groups[1]
+    assert [msg.args[0] for msg in msgs[2:4]] == groups
+    # A single sleep covers both plans
+    assert 0 < msgs[4].args[0] <= 0.3
+
+
 def test_as_list():
     assert as_list(None) == []
     assert as_list(5) == [5]
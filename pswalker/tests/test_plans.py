@@ -2,6 +2,9 @@
 # Standard #
 ############
 import logging
+import threading
+import time
+from queue import Queue
 
 ###############
 # Third Party #
@@ -10,6 +13,7 @@ import lmfit
 import numpy as np
 import pytest
 from bluesky.preprocessors import run_wrapper
+from ophyd import Signal
 from ophyd.sim import SynAxis, SynSignal, det, motor
 
 from pswalker.callbacks import LinearFit, LiveBuild
@@ -17,10 +21,13 @@ from pswalker.callbacks import LinearFit, LiveBuild
 # Module #
 ##########
 from pswalker.plans import (fitwalk, measure, measure_average,
-                            measure_centroid, walk_to_pixel)
-from pswalker.utils.exceptions import FilterCountError
+                            measure_centroid, measure_monitor, measure_noise,
+                            measure_timeseries, walk_to_pixel)
+from pswalker.shots import AveragingPolicy
+from pswalker.steps import TrustRegion
+from pswalker.utils.exceptions import FilterCountError, MonitorTimeoutError
 
-from .utils import collector
+from .utils import collector, plan_stash
 
 logger = logging.getLogger(__name__)
 
@@ -134,6 +141,157 @@ def test_measure_average_system(RE, lcls_two_bounce_system):
     assert all(map(lambda x: x == saves, [m1_reads, m2_reads, y1_reads, y2_reads]))
 
 
+def test_measure_average_sequential(RE):
+    # A steady signal stops as soon as the minimum number of shots is taken
+    queue = Queue()
+    RE(
+        run_wrapper(
+            plan_stash(
+                measure_average,
+                queue,
+                [det],
+                num=50,
+                target_field="det",
+                tolerance=1,
+                precision=0.1,
+                min_num=4,
+            )
+        )
+    )
+    avg = queue.get()
+    assert avg["det_shots"] == 4
+    assert avg["det_stderr"] == 0.0
+
+    # A noisy signal uses the full number of shots
+    noisy = SynSignal(name="noisy", func=lambda: np.random.normal(0, 10))
+    RE(
+        run_wrapper(
+            plan_stash(
+                measure_average,
+                queue,
+                [noisy],
+                num=10,
+                target_field="noisy",
+                tolerance=1,
+                precision=0.1,
+            )
+        )
+    )
+    avg = queue.get()
+    assert avg["noisy_shots"] == 10
+    assert avg["noisy_stderr"] > 0.1
+
+
+def test_measure_pipelined(RE):
+    # Overlap the next trigger with the reads of the current shot
+    shots = list()
+    RE(
+        run_wrapper(measure([det, motor], num=5, depth=2, overlap=[det])),
+        {"event": collector("det", shots)},
+    )
+    assert shots == [1.0] * 5
+    msgs = [msg for msg in RE.msg_hook.msgs if msg.obj is det]
+    triggers = [i for i, msg in enumerate(msgs) if msg.command == "trigger"]
+    reads = [i for i, msg in enumerate(msgs) if msg.command == "read"]
+    # The second shot is triggered before the first is read, and the last shot
+    # triggered ahead is waited on but never read
+    assert triggers[1] < reads[0]
+    assert len(triggers) == 6
+    assert len(reads) == 5
+    waits = [msg for msg in RE.msg_hook.msgs if msg.command == "wait"]
+    assert len(waits) == 6
+
+    # Devices are acquired serially unless they are known to be safe
+    index = -1
+
+    def count():
+        nonlocal index
+        index += 1
+        return index
+
+    counter = SynSignal(name="intensity", func=count)
+    for kwargs in ({}, {"delay": 0.0, "overlap": [counter]}):
+        index = -1
+        shots = list()
+        RE(
+            run_wrapper(
+                measure(
+                    [counter, det],
+                    filters={"intensity": lambda x: x > 2},
+                    num=3,
+                    depth=3,
+                    **kwargs
+                )
+            ),
+            {"event": collector("intensity", shots)},
+        )
+        assert shots == [0, 1, 2, 3, 4, 5]
+    # Devices can declare themselves safe to pipeline
+    safe = SynSignal(name="safe", func=lambda: 1.0)
+    safe.pipeline_safe = True
+    RE.msg_hook.msgs.clear()
+    RE(run_wrapper(measure([safe], num=3, depth=2)))
+    triggers = [msg for msg in RE.msg_hook.msgs if msg.command == "trigger"]
+    assert len(triggers) == 4
+
+
+def test_measure_scheduled(RE):
+    queue = Queue()
+    RE(run_wrapper(plan_stash(measure, queue, [det, motor], num=5, rate=50)))
+    data = queue.get()
+    assert len(data) == 5
+    stats = data.schedule.stats()
+    assert stats["requested_rate"] == 50
+    assert stats["shots"] == 5
+    assert stats["achieved_rate"] <= 50 * 1.05
+    sleeps = [msg for msg in RE.msg_hook.msgs if msg.command == "sleep"]
+    assert 0 < len(sleeps) <= 4
+    # Rate from a signal
+    beam_rate = Signal(name="beam_rate", value=100)
+    RE(run_wrapper(plan_stash(measure, queue, [det], num=2, rate=beam_rate)))
+    assert queue.get().schedule.requested_rate == 100
+    with pytest.raises(ValueError):
+        RE(run_wrapper(measure([det], rate=10, period=0.1)))
+    # The schedule is reported with the averages
+    RE(run_wrapper(plan_stash(measure_average, queue, [det], num=3, rate=50)))
+    avg = queue.get()
+    assert avg["schedule_requested_rate"] == 50
+    assert avg["schedule_achieved_rate"] <= 50 * 1.05
+    assert avg["schedule_missed"] >= 0
+
+
+def test_measure_average_fields(RE, lcls_two_bounce_system):
+    _, m1, m2, y1, y2 = lcls_two_bounce_system
+    centroid = y1.name + "_detector_stats2_centroid_x"
+    pitch = m1.name + "_sim_alpha"
+    queue = Queue()
+    RE(
+        run_wrapper(
+            plan_stash(
+                measure_average,
+                queue,
+                [y1, m1, y2, m2],
+                num=5,
+                fields=[centroid, pitch],
+            )
+        )
+    )
+    avg = queue.get()
+    assert avg[centroid] == y1.detector._get_readback_centroid_x()
+    assert avg[pitch] == m1.position
+    # The rest of the system is still reported
+    assert avg[m2.name + "_sim_alpha"] == m2.position
+    # Only the projected fields are read each shot
+    reads = [msg.obj for msg in RE.msg_hook.msgs if msg.command == "read"]
+    saves = [msg for msg in RE.msg_hook.msgs if msg.command == "save"]
+    assert len(saves) == 5
+    assert reads[:4] == [y1, m1, y2, m2]
+    assert reads[4:] == [y1.detector.stats2.centroid.x, m1.sim_alpha] * 5
+
+    with pytest.raises(ValueError):
+        RE(run_wrapper(measure([y1, m1], fields=["not_a_field"])))
+
+
 def test_measure_centroid(RE, one_bounce_system):
     logger.debug("test_measure_centroid")
 
@@ -242,6 +400,77 @@ def test_walk_to_pixel(RE, one_bounce_system):
     assert np.isclose(det.read()[det.name + "_" + cent]["value"], 200, atol=10)
 
 
+def test_measure_noise(RE, tmp_path):
+    rng = np.random.RandomState(0)
+    noisy = SynSignal(name="centroid", func=lambda: rng.normal(100, 3))
+    path = str(tmp_path / "noise.json")
+    queue = Queue()
+    RE(run_wrapper(plan_stash(measure_noise, queue, noisy, num=200, cache=path)))
+    stats = queue.get()
+    assert np.isclose(stats["mean"], 100, atol=1)
+    assert np.isclose(stats["std"], 3, rtol=0.2)
+    assert stats["shots"] == 200
+    # The cached result is used without taking more shots
+    RE.msg_hook.msgs.clear()
+    RE(run_wrapper(plan_stash(measure_noise, queue, noisy, num=200, cache=path)))
+    assert queue.get()["std"] == stats["std"]
+    assert not [msg for msg in RE.msg_hook.msgs if msg.command == "trigger"]
+
+
+def test_walk_to_pixel_policy(RE):
+    simple_motor = SynAxis(name="motor")
+    simple_det = SynSignal(
+        name="det", func=lambda: 5 * simple_motor.read()["motor"]["value"] + 2
+    )
+    policy = AveragingPolicy(minimum=1, maximum=10)
+    policy.observe(198)
+    plan = run_wrapper(
+        walk_to_pixel(
+            simple_det,
+            simple_motor,
+            200,
+            0,
+            gradient=5,
+            tolerance=1,
+            target_fields=["det", "motor"],
+            max_steps=3,
+            policy=policy,
+        )
+    )
+    RE(plan)
+    assert np.isclose(simple_det.read()["det"]["value"], 200, atol=1)
+    # Single shots far from the goal, the full average once it is reached
+    saves = [msg for msg in RE.msg_hook.msgs if msg.command == "save"]
+    assert len(saves) == 3
+    assert policy.shots(1) == 10
+
+
+def test_walk_to_pixel_controller(RE):
+    simple_motor = SynAxis(name="motor")
+    simple_det = SynSignal(
+        name="det", func=lambda: 5 * simple_motor.read()["motor"]["value"] + 2
+    )
+    plan = run_wrapper(
+        walk_to_pixel(
+            simple_det,
+            simple_motor,
+            200,
+            0,
+            first_step=1e-6,
+            tolerance=1,
+            average=None,
+            target_fields=["det", "motor"],
+            max_steps=3,
+            controller=TrustRegion(first_step=1.0),
+        )
+    )
+    RE(plan)
+    assert np.isclose(simple_det.read()["det"]["value"], 200, atol=1)
+    # The controller probes instead of the fixed first step
+    sets = [msg.args[0] for msg in RE.msg_hook.msgs if msg.command == "set"]
+    assert sets[0] == 1.0
+
+
 def test_measure(RE):
     # Simplest implementation
     plan = run_wrapper(measure([det, motor], num=5, delay=0.01))
@@ -276,6 +505,20 @@ def test_measure(RE):
     RE(plan, {"event": cb})
     assert shots == [1, 2, 3, 4, 5, 6, 7]
 
+    # Rejected shots are recorded, but masked from the data
+    index = -1
+    queue = Queue()
+    plan = run_wrapper(
+        plan_stash(
+            measure, queue, [counter], filters={"intensity": lambda x: x > 2}, num=2
+        )
+    )
+    RE(plan)
+    data = queue.get()
+    assert [shot["intensity"] for shot in data] == [3, 4]
+    assert data.dropped == 3
+    np.testing.assert_array_equal(data.to_array()["intensity"], [3, 4])
+
     # Make sure an exception is raised when we fail too many filter checks
     plan = run_wrapper(
         measure([counter], filters={"intensity": lambda x: False}, num=500)
@@ -284,6 +527,161 @@ def test_measure(RE):
         RE(plan)
 
 
+def test_measure_timeseries(RE, one_bounce_system):
+    _, mot, det = one_bounce_system
+    key = det.name + "_detector_stats2_centroid_x"
+    queue = Queue()
+    # Compare to the standard readings
+    RE(
+        run_wrapper(
+            plan_stash(
+                measure_average,
+                queue,
+                [det, mot],
+                num=10,
+                mode="timeseries",
+                target_field=key,
+            )
+        )
+    )
+    avg = queue.get()
+    assert avg[key] == 250.0
+    assert avg[mot.name + "_sim_alpha"] == 0.0
+    # The statistics of the series are reported
+    assert avg[key + "_shots"] == 10
+    assert avg[key + "_stderr"] == 0.0
+    # A single readback of the time series, besides the progress checks
+    progress = det.detector.stats2.ts_current_point
+    reads = [
+        msg
+        for msg in RE.msg_hook.msgs
+        if msg.command == "read" and msg.obj is not progress
+    ]
+    assert len(reads) == 2
+    assert [msg for msg in RE.msg_hook.msgs if msg.obj is progress]
+    # Time series can not stop once precise enough
+    with pytest.raises(ValueError):
+        RE(
+            run_wrapper(
+                measure_average(
+                    [det, mot],
+                    num=10,
+                    mode="timeseries",
+                    target_field=key,
+                    tolerance=1,
+                    precision=0.1,
+                )
+            )
+        )
+
+    # Dropped shots are reacquired
+    det.centroid_noise = True
+    det.detector.stats2.centroid.x.noise_args = (-10, 10)
+    RE(
+        run_wrapper(
+            plan_stash(
+                measure_timeseries,
+                queue,
+                [det, mot],
+                num=20,
+                filters={key: lambda x: x > 250},
+                max_dropped=200,
+            )
+        )
+    )
+    data = queue.get()
+    assert len(data) == 20
+    assert np.all(data.column(key) > 250)
+    assert data.size > 20
+    # Every shot has a time
+    assert np.all(np.isfinite(data.to_array()["time"]))
+
+
+def publish(sig, values, period=0.005):
+    """Put a sequence of values to a signal from a background thread"""
+
+    def run():
+        for value in values:
+            time.sleep(period)
+            sig.put(value)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_measure_monitor(RE):
+    centroid = Signal(name="centroid", value=0)
+    pitch = Signal(name="pitch", value=5)
+    queue = Queue()
+    centroids = list()
+    thread = publish(centroid, range(1, 20))
+    RE(
+        run_wrapper(
+            plan_stash(
+                measure_monitor,
+                queue,
+                [centroid, pitch],
+                num=5,
+                filters={"centroid": lambda x: x % 2 == 0},
+                timeout=5,
+            )
+        ),
+        {"event": collector("centroid", centroids)},
+    )
+    data = queue.get()
+    # Only the next published values are used
+    assert [shot["centroid"] for shot in data] == [2, 4, 6, 8, 10]
+    # Each accepted shot is saved as an event
+    assert centroids == [2, 4, 6, 8, 10]
+    assert all(shot["pitch"] == 5 for shot in data)
+    assert data.dropped == 5
+    assert not np.any(np.isnan(data.to_array()["time"]))
+    # Subscriptions are cleaned up
+    assert not centroid._callbacks[centroid.SUB_VALUE]
+
+    # Averaging through the monitor
+    thread.join()
+    thread = publish(centroid, [10, 20, 30])
+    RE(
+        run_wrapper(
+            plan_stash(measure_average, queue, [centroid, pitch], num=3, mode="monitor")
+        )
+    )
+    assert queue.get() == {"centroid": 20.0, "pitch": 5.0}
+
+    # Fields used by the filters are monitored as well
+    thread.join()
+    thread = publish(centroid, [1, 2, 3])
+    pitches = list()
+    RE(
+        run_wrapper(
+            measure_monitor(
+                [centroid, pitch],
+                num=3,
+                fields=["centroid"],
+                filters={"pitch": lambda x: x == 5},
+                timeout=5,
+            )
+        ),
+        {"event": collector("pitch", pitches)},
+    )
+    assert pitches == [5, 5, 5]
+
+    # Failures
+    thread.join()
+    thread = publish(centroid, range(200), period=0.001)
+    with pytest.raises(FilterCountError):
+        RE(
+            run_wrapper(
+                measure_monitor([centroid], num=2, filters={"centroid": lambda x: x < 0})
+            )
+        )
+    thread.join()
+    with pytest.raises(MonitorTimeoutError):
+        RE(run_wrapper(measure_monitor([centroid], num=2, timeout=0.1)))
+
+
 def test_fitwalk(RE):
     # Create simulated devices
     motor = SynAxis(name="motor")
@@ -297,3 +695,33 @@ def test_fitwalk(RE):
     RE(run_wrapper(walk))
 
     assert np.isclose(det.read()["centroid"]["value"], 89.4, 0.5)
+
+    # Sequential averaging stops early on a steady signal
+    motor.set(0.0)
+    linear = LinearFit("centroid", "motor", average=1)
+    walk = fitwalk(
+        [det], motor, [linear], 89.4, average=20, tolerance=0.5, precision=0.1
+    )
+    RE(run_wrapper(walk))
+    assert np.isclose(det.read()["centroid"]["value"], 89.4, 0.5)
+    saves = [msg for msg in RE.msg_hook.msgs if msg.command == "save"]
+    assert len(saves) < 20
+
+
+def test_fitwalk_trust_region(RE):
+    motor = SynAxis(name="motor")
+    det = SynSignal(
+        name="centroid", func=lambda: 5 * motor.read()["motor"]["value"] + 2
+    )
+    linear = LinearFit("centroid", "motor", average=1)
+    region = TrustRegion(first_step=1.0, radius=4.0)
+    walk = fitwalk(
+        [det], motor, [linear], 89.4, average=1, tolerance=0.5, controller=region
+    )
+    RE(run_wrapper(walk))
+    assert np.isclose(det.read()["centroid"]["value"], 89.4, 0.5)
+    sets = [msg.args[0] for msg in RE.msg_hook.msgs if msg.command == "set"]
+    # A probe, then model steps limited by a region that grows as the
+    # predictions come true
+    assert np.allclose(sets, [1.0, 5.0, 13.0, (89.4 - 2) / 5])
+    assert region.radius == 16.0
@@ -0,0 +1,199 @@
+############
+# Standard #
+############
+import logging
+
+###############
+# Third Party #
+###############
+import numpy as np
+
+##########
+# Module #
+##########
+from pswalker.shots import (AveragingPolicy, RunningStats, ShotBuffer,
+                            ShotScheduler, achievable_tolerance,
+                            noise_statistics, required_averages)
+
+logger = logging.getLogger(__name__)
+
+
+def test_shot_buffer_mean():
+    buf = ShotBuffer(capacity=2)
+    buf.append({"a": 1, "b": "one", "c": np.arange(3)})
+    buf.append({"a": 3, "b": "two", "c": np.arange(3)})
+    # Rejected shots do not contribute
+    buf.append({"a": 100, "b": "three"}, accepted=False)
+    # Missing fields are ignored
+    buf.append({"b": "four", "c": np.arange(3)})
+    assert buf.capacity >= 4
+    assert len(buf) == 3
+    assert buf.dropped == 1
+    avg = buf.mean()
+    assert avg["a"] == 2.0
+    assert avg["b"] == "four"
+    assert avg["c"] == 1.0
+
+
+def test_shot_buffer_reported_nan():
+    buf = ShotBuffer(capacity=3)
+    buf.append({"a": 1.0, "b": 2.0})
+    buf.append({"a": np.nan})
+    # A reported NaN spoils the average, a missing field does not
+    avg = buf.mean()
+    assert np.isnan(avg["a"])
+    assert avg["b"] == 2.0
+    assert np.isnan(buf[-1]["a"])
+    assert "b" not in buf[-1]
+
+
+def test_shot_buffer_list_interface():
+    buf = ShotBuffer(capacity=5)
+    for i in range(5):
+        buf.append({"a": i}, accepted=bool(i % 2), timestamp=float(i))
+    assert [shot["a"] for shot in buf] == [1.0, 3.0]
+    assert buf[-1] == {"a": 3.0}
+    assert buf.last(accepted_only=False) == {"a": 4.0}
+    np.testing.assert_array_equal(buf.column("a"), [1.0, 3.0])
+
+
+def test_shot_buffer_promotion_and_records():
+    buf = ShotBuffer(capacity=3)
+    buf.append({"a": 1.0}, timestamp=1.0)
+    buf.append({"a": "nan"}, timestamp=2.0)
+    assert buf.columns["a"].dtype == object
+    shots = buf.to_array()
+    assert shots.dtype.names == ("time", "a")
+    np.testing.assert_array_equal(shots["time"], [1.0, 2.0])
+
+
+def test_shot_buffer_extend():
+    buf = ShotBuffer(capacity=2)
+    buf.extend(
+        {"a": np.arange(4.0), "b": 5.0}, accepted=[True, True, False, True]
+    )
+    assert len(buf) == 3
+    np.testing.assert_array_equal(buf.column("b"), [5.0, 5.0, 5.0])
+    assert buf.mean()["a"] == np.mean([0.0, 1.0, 3.0])
+
+
+def test_running_stats():
+    values = np.random.normal(1e3, 2.0, size=50)
+    stats = RunningStats()
+    assert np.isnan(stats.stderr)
+    for value in values:
+        stats.update(value)
+    stats.update(np.nan)
+    assert stats.count == 50
+    assert np.isclose(stats.mean, np.mean(values))
+    assert np.isclose(stats.variance, np.var(values, ddof=1))
+    assert np.isclose(stats.stderr, np.std(values, ddof=1) / np.sqrt(50))
+
+
+def test_shot_buffer_apply_filters():
+    buf = ShotBuffer(capacity=5)
+    buf.extend({"a": [1.0, -1.0, np.nan, 5.0, 4.5], "b": ["x", "y", "z", "w", "v"]})
+    # Vectorized filter
+    mask = buf.apply_filters({"a": lambda x: x > 0})
+    np.testing.assert_array_equal(mask, [True, False, False, True, True])
+    # Filters that only work on scalars, and missing data
+    mask = buf.apply_filters({"a": lambda x: 4 < x < 6}, drop_missing=False)
+    np.testing.assert_array_equal(mask, [False, False, True, True, True])
+    mask = buf.apply_filters({"b": lambda x: x in "xyz"})
+    np.testing.assert_array_equal(mask, [True, True, True, False, False])
+    assert len(buf) == 3
+    assert not buf.apply_filters({"c": lambda x: True}).any()
+
+
+def test_shot_buffer_constants():
+    buf = ShotBuffer(capacity=2)
+    buf.constants["c"] = 4.0
+    buf.append({"a": 1.0})
+    buf.append({"a": 3.0})
+    assert buf[0] == {"a": 1.0, "c": 4.0}
+    assert buf.mean() == {"a": 2.0, "c": 4.0}
+    assert buf.to_array().dtype.names == ("time", "a")
+    # Filters on constants apply to every shot
+    assert not buf.apply_filters({"c": lambda x: x < 0}).any()
+
+
+def test_shot_scheduler():
+    now = 100.0
+
+    def clock():
+        return now
+
+    schedule = ShotScheduler.from_rate(10, clock=clock)
+    assert schedule.requested_rate == 10
+    # First shot is immediate
+    assert schedule.wait() == 0
+    schedule.mark()
+    # Latency does not accumulate
+    now += 0.03
+    assert np.isclose(schedule.wait(), 0.07)
+    now += 0.07
+    schedule.mark()
+    # Late, but within the slot
+    now += 0.12
+    assert schedule.wait() == 0
+    schedule.mark()
+    # Missed slots are skipped and the grid is kept
+    now += 0.35
+    assert schedule.wait() == 0
+    schedule.mark()
+    assert schedule.missed == 2
+    assert np.isclose(schedule.wait(), 0.03)
+    now += 0.03
+    schedule.mark()
+    stats = schedule.stats()
+    assert stats["shots"] == 5
+    assert np.isclose(stats["achieved_rate"], 4 / 0.6)
+
+
+def test_averaging_policy():
+    policy = AveragingPolicy(minimum=2, maximum=20, near=2, far=20)
+    # Nothing is known about the error yet
+    assert policy.shots(5) == 20
+    assert policy.shots(5, error=5) == 20
+    assert policy.shots(5, error=200) == 2
+    assert 2 < policy.shots(5, error=30) < 20
+    # Counts never grow as the error grows
+    counts = [policy.shots(5, error=e) for e in range(0, 200, 5)]
+    assert counts == sorted(counts, reverse=True)
+    # The latest error is remembered
+    policy.observe(-200)
+    assert policy.shots(5) == 2
+    # With a known noise, enough shots to resolve the error
+    policy.observe(10, noise=6)
+    assert policy.shots(5) == 4
+    assert policy.shots(5, error=1) == 16
+
+
+def test_noise_statistics():
+    rng = np.random.RandomState(0)
+    white = rng.normal(10, 2, 2000)
+    stats = noise_statistics(white)
+    assert np.isclose(stats["mean"], 10, atol=0.2)
+    assert np.isclose(stats["std"], 2, rtol=0.1)
+    assert stats["tau"] < 1.5
+    # Strongly correlated shots count for less
+    drift = np.zeros(2000)
+    for i in range(1, len(drift)):
+        drift[i] = 0.9 * drift[i - 1] + rng.normal()
+    stats = noise_statistics(drift)
+    assert 10 < stats["tau"] < 30
+    assert stats["effective"] < 200
+    # Not enough data
+    assert np.isnan(noise_statistics([1.0])["std"])
+
+
+def test_required_averages():
+    stats = {"std": 1.0, "tau": 1.0}
+    num = required_averages(stats, 1, confidence=0.95, margin=0.5)
+    assert num == 16
+    assert achievable_tolerance(stats, num) <= 1
+    assert achievable_tolerance(stats, num - 1) > 1
+    # Correlated shots need proportionally more
+    assert required_averages({"std": 1.0, "tau": 3.0}, 1) == 47
+    assert required_averages(stats, 1, maximum=10) == 10
+    assert required_averages({"std": 0.0, "tau": 1.0}, 1) == 1
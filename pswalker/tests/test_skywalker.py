@@ -5,7 +5,8 @@ import logging
 import numpy as np
 import pytest
 
-from pswalker.skywalker import skywalker
+from pswalker.cache import NoiseCache
+from pswalker.skywalker import noise_settings, skywalker
 
 logger = logging.getLogger(__name__)
 
@@ -50,3 +51,21 @@ def test_skywalker(RE, slow_lcls_two_bounce_system):
     y2.move_in()
     assert np.isclose(y1.detector.centroid_x, 480 - goal1, atol=2)
     assert np.isclose(y2.detector.centroid_x, 480 - goal2, atol=2)
+
+
+def test_noise_settings(lcls_two_bounce_system, tmp_path):
+    s, m1, m2, y1, y2 = lcls_two_bounce_system
+    field = "detector_stats2_centroid_x"
+    cache = NoiseCache(str(tmp_path / "noise.json"))
+    cache.put(y1.name, y1.name + "_" + field, {"std": 4.0, "tau": 2.0})
+    cache.put(y2.name, y2.name + "_" + field, {"std": 0.1, "tau": 1.0})
+    # Everything is cached, so nothing needs to be measured
+    plan = noise_settings([y1, y2], field, 1, 20, cache)
+    with pytest.raises(StopIteration) as info:
+        next(plan)
+    averages, tolerances, missing = info.value.value
+    # The noisy detector uses every shot and loosens its tolerance
+    assert averages == [20, 1]
+    assert np.isclose(tolerances[0], 1.96 * 4 * np.sqrt(2 / 20) / 0.5, rtol=1e-3)
+    assert tolerances[1] == 1
+    assert missing == []
@@ -0,0 +1,67 @@
+############
+# Standard #
+############
+import logging
+
+##########
+# Module #
+##########
+from pswalker.steps import TrustRegion
+
+logger = logging.getLogger(__name__)
+
+
+def test_trust_region_adapts():
+    region = TrustRegion(radius=1.0)
+    region.start(0.0, 0.0, 10.0)
+    # Unlimited steps are clipped to the radius
+    assert region.constrain(0.0, 5.0) == 1.0
+    # The step did as well as predicted, so the region grows
+    region.observe(1.0, 2.0)
+    assert region.radius == 2.0
+    # A step that made things worse shrinks the region
+    assert region.constrain(1.0, 2.5) == 2.5
+    region.observe(2.5, -1.0)
+    assert region.radius == 0.25 * 1.5
+    assert region.failures == 1
+
+
+def test_trust_region_rejects():
+    region = TrustRegion()
+    region.start(0.0, 0.0, 10.0)
+    # A model step that overshoots badly is rejected
+    assert region.constrain(0.0, 100.0) == 100.0
+    region.observe(100.0, 50.0)
+    assert region.radius == 25.0
+    assert region.accepted == (0.0, 0.0)
+    # Steps further away are clipped, steps back to the accepted point are not
+    assert region.constrain(100.0, 150.0) == 125.0
+    # Steps are never lengthened
+    assert region.constrain(100.0, 60.0) == 60.0
+    assert region.constrain(100.0, 2.0) == 2.0
+    region.observe(2.0, 4.0)
+    assert region.accepted == (2.0, 4.0)
+    assert region.failures == 1
+
+
+def test_trust_region_limits():
+    region = TrustRegion(max_travel=2.0)
+    region.start(1.0, 0.0, 10.0, limits=(-5.0, 2.5))
+    assert region.constrain(1.0, 10.0) == 2.5
+    assert region.constrain(1.0, -10.0) == -1.0
+    # Limits that are not set are ignored
+    region = TrustRegion()
+    region.start(0.0, 0.0, 10.0, limits=(0, 0))
+    assert region.constrain(0.0, 100.0) == 100.0
+
+
+def test_trust_region_secant():
+    region = TrustRegion(first_step=0.5)
+    region.start(0.0, 2.0, 12.0)
+    assert region.secant(0.0) is None
+    # Probes are not judged
+    assert region.probe(0.0) == 0.5
+    region.observe(0.5, 3.0)
+    assert region.radius is None
+    # Newton step along the line through both points
+    assert region.secant(0.5) == 5.0
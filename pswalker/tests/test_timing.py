@@ -0,0 +1,118 @@
+############
+# Standard #
+############
+import json
+import logging
+
+###############
+# Third Party #
+###############
+import pytest
+from bluesky import Msg
+from bluesky.preprocessors import run_wrapper
+from ophyd.sim import SynSignal
+
+##########
+# Module #
+##########
+from pswalker.plans import measure
+from pswalker.timing import (
+    Span,
+    SpanRecorder,
+    get_sink,
+    set_sink,
+    span,
+    timed,
+    to_wall_clock,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="function")
+def recorder():
+    recorder = SpanRecorder()
+    previous = set_sink(recorder)
+    yield recorder
+    set_sink(previous)
+
+
+def test_span_disabled():
+    assert get_sink() is None
+    timer = span("measure")
+    with timer:
+        pass
+    timer.finish(shots=1)
+    assert span("walk") is timer
+
+
+def test_span_recorder_breakdown():
+    recorder = SpanRecorder()
+    recorder.record(Span("walk", "m1", 0.0, 10.0, None, None))
+    recorder.record(Span("measure", "y1", 1.0, 3.0, 10, 2))
+    recorder.record(Span("measure", "y1", 5.0, 2.0, 10, 0))
+    recorder.record(Span("imager", "y2", 20.0, 4.0, None, None))
+    assert recorder.self_times() == [5.0, 3.0, 2.0, 4.0]
+    breakdown = recorder.breakdown()
+    assert list(breakdown) == ["walk", "measure", "imager"]
+    assert breakdown["measure"] == {
+        "count": 2,
+        "total": 5.0,
+        "self": 5.0,
+        "shots": 20,
+        "dropped": 2,
+    }
+    assert "measure" in recorder.table().get_string()
+
+
+def test_span_recorder_chrome_trace(tmp_path):
+    recorder = SpanRecorder()
+    recorder.record(Span("measure", "y1", 1.0, 0.5, 10, 2))
+    path = str(tmp_path / "trace.json")
+    recorder.export_chrome_trace(path)
+    with open(path) as f:
+        trace = json.load(f)
+    (event,) = trace["traceEvents"]
+    assert event["ph"] == "X"
+    assert event["ts"] == pytest.approx(to_wall_clock(1.0) * 1e6)
+    assert event["dur"] == 5e5
+    assert event["args"]["dropped"] == 2
+
+
+def test_timed_plan(recorder):
+    @timed("walk", device=lambda args: args["motor"])
+    def walk(motor, fail=False):
+        yield Msg("null")
+        if fail:
+            raise RuntimeError("Walk failed")
+        return motor
+
+    assert list(walk("m1")) == [Msg("null")]
+    # Plans that raise are still timed
+    with pytest.raises(RuntimeError):
+        list(walk("m2", fail=True))
+    assert [(s.phase, s.device) for s in recorder.spans] == [
+        ("walk", "m1"),
+        ("walk", "m2"),
+    ]
+    assert recorder.spans[1].shots is None
+
+
+def test_measure_spans(RE, recorder):
+    index = -1
+
+    def count():
+        nonlocal index
+        index += 1
+        return index
+
+    counter = SynSignal(name="intensity", func=count)
+    # Number the shots from the first trigger, some versions of ophyd also
+    # compute the value when the signal is created
+    index = -1
+    RE(run_wrapper(measure([counter], filters={"intensity": lambda x: x > 2}, num=5)))
+    (timed,) = recorder.spans
+    assert timed.phase == "measure"
+    assert timed.device == "intensity"
+    assert timed.shots == 5
+    assert timed.dropped == 3
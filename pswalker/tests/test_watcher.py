@@ -1,7 +1,15 @@
+############
+# Standard #
+############
+from types import SimpleNamespace
+
 ###############
 # Third Party #
 ###############
+from bluesky import Msg
+
 from pswalker.skywalker import skywalker
+from pswalker.timing import Span, set_sink
 ##########
 # Module #
 ##########
@@ -14,6 +22,7 @@ def test_watcher_report_smoke(RE, lcls_two_bounce_system):
     RE.msg_hook = w
     RE.subscribe(w, "all")
     RE.record_interruptions = True
+    set_sink(w)
     # Run skywalker
     s, m1, m2, y1, y2 = lcls_two_bounce_system
     goals = [150, 150]
@@ -36,5 +45,56 @@ def test_watcher_report_smoke(RE, lcls_two_bounce_system):
     except Exception:
         # We're not testing skywalker, we're testing the report...
         pass
+    finally:
+        set_sink(None)
     # Report
-    w.report()
+    report = w.report()
+    assert "imager" in w.timing.breakdown()
+    assert "Phase" in report
+
+
+def test_watcher_counts():
+    w = Watcher(report_hook=None, history=5)
+    # Spans from an earlier run are not reported
+    w.timing.record(Span("measure", None, 0.0, 1.0, 1, 0))
+    w.start(
+        {
+            "time": 0.0,
+            "detectors": ["y1", "y2"],
+            "mirrors": ["m1", "m2"],
+            "goals": [150, 150],
+            "plan_args": {
+                "averages": 1,
+                "tolerances": 2,
+                "mot_fields": ["pitch"],
+                "det_fields": ["centroid_x"],
+            },
+        }
+    )
+    m1, m2 = SimpleNamespace(name="m1"), SimpleNamespace(name="m2")
+    y1 = SimpleNamespace(name="y1")
+    # The names of the devices are matched exactly
+    m1_pitch = SimpleNamespace(name="m1_pitch")
+    for obj in [y1, m1, y1, m2, m1_pitch, y1, y1]:
+        w(Msg("set", obj, 0))
+    w(Msg("read", m1))
+    for i, (key, value) in enumerate(
+        [
+            ("interruption", "suspend"),
+            ("interruption", "resume"),
+            ("m1_pitch", 2.0),
+            ("y1_detector_stats2_centroid_x", 4.5),
+            ("y1_other", 7.0),
+        ]
+    ):
+        w.event({"time": float(i), "data": {key: value}})
+    w.stop({"time": 10.0, "exit_status": "success", "reason": ""})
+    assert w.summary["moves"] == 2
+    assert w.summary["cycles"] == 2
+    assert w.summary["suspension_count"] == 1
+    assert w.summary["suspended"] == 1.0
+    assert [span.phase for span in w.timing.spans] == ["suspended"]
+    assert w.last_known == {"m1_pitch": 2.0, "y1_detector_stats2_centroid_x": 4.5}
+    # Only the most recent messages are kept
+    assert len(w.msgs) == 5
+    assert w.msgs[-1].command == "read"
@@ -0,0 +1,382 @@
+"""
+Timing spans for the phases of an alignment
+"""
+############
+# Standard #
+############
+import functools
+import inspect
+import json
+import logging
+import time
+from collections import namedtuple
+
+###############
+# Third Party #
+###############
+from prettytable import PrettyTable
+
+##########
+# Module #
+##########
+logger = logging.getLogger(__name__)
+
+
+# A single timed phase of an alignment
+Span = namedtuple("Span", ["phase", "device", "start", "duration", "shots", "dropped"])
+
+# Sink that receives every finished span, None when timing is disabled
+_sink = None
+
+# Spans are timed on the performance counter. A single offset converts them to
+# wall clock time so spans can not drift apart as the two clocks are adjusted
+_wall_offset = time.time() - time.perf_counter()
+
+
+def to_wall_clock(start):
+    """
+    Convert the start of a span to wall clock time
+    """
+    return start + _wall_offset
+
+
+def from_wall_clock(timestamp):
+    """
+    Convert a wall clock timestamp, e.g. from a document, to the clock spans
+    are timed on
+    """
+    return timestamp - _wall_offset
+
+
+def set_sink(sink):
+    """
+    Send the spans of every instrumented plan to a sink
+
+    Parameters
+    ----------
+    sink : object or None
+        Any object with a ``record`` method that accepts a :class:`.Span`,
+        e.g. a :class:`.SpanRecorder` or :class:`.Watcher`. None disables
+        timing
+
+    Returns
+    -------
+    previous : object or None
+        The sink that was replaced
+    """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def get_sink():
+    """
+    The sink that currently receives spans, or None if timing is disabled
+    """
+    return _sink
+
+
+class _Timer(object):
+    """
+    A span that has started but not yet finished
+    """
+
+    __slots__ = ("sink", "phase", "device", "start")
+
+    def __init__(self, sink, phase, device):
+        self.sink = sink
+        self.phase = phase
+        self.device = device
+        self.start = time.perf_counter()
+
+    def finish(self, shots=None, dropped=None):
+        """
+        End the span and send it to the sink, only the first call counts
+        """
+        if self.sink is None:
+            return
+        duration = time.perf_counter() - self.start
+        device = getattr(self.device, "name", self.device)
+        self.sink.record(
+            Span(self.phase, device, self.start, duration, shots, dropped)
+        )
+        self.sink = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.finish()
+
+
+class _NullTimer(object):
+    """
+    Stand-in for a span while timing is disabled
+    """
+
+    __slots__ = ()
+
+    def finish(self, shots=None, dropped=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def span(phase, device=None):
+    """
+    Start timing a phase
+
+    The span is sent to the sink at the end of a ``with`` block, so phases
+    that raise are still recorded, or earlier if :meth:`finish` is called to
+    add the shot counts. Only the first finish is recorded. While no sink is
+    installed a shared, inert object is returned so instrumented plans cost a
+    single global lookup.
+
+    Parameters
+    ----------
+    phase : str
+        Name of the phase, e.g. ``'measure'`` or ``'imager'``
+
+    device : object or str, optional
+        Device the phase acts on, recorded by name
+
+    Example
+    -------
+    .. code::
+
+        with span('measure', detector) as timer:
+            data = yield from measure([detector], num=10)
+            timer.finish(shots=len(data), dropped=data.dropped)
+    """
+    if _sink is None:
+        return _null_timer
+    return _Timer(_sink, phase, device)
+
+
+def timed(phase, device=None, counts=None):
+    """
+    Time every run of a plan as a span
+
+    The span covers the plan from its first message until it returns or
+    raises. Plans that raise are recorded without shot counts.
+
+    Parameters
+    ----------
+    phase : str
+        Name of the phase
+
+    device : callable, optional
+        Called with the arguments of the plan, bound by name, to find the
+        device the phase acts on
+
+    counts : callable, optional
+        Called with the result of the plan to find the number of shots and
+        dropped shots
+
+    Example
+    -------
+    .. code::
+
+        @timed('walk', device=lambda args: args['motor'])
+        def walk(detector, motor):
+            ...
+    """
+
+    def decorator(plan):
+        signature = inspect.signature(plan)
+
+        @functools.wraps(plan)
+        def wrapper(*args, **kwargs):
+            if _sink is None:
+                return (yield from plan(*args, **kwargs))
+            obj = None
+            if device is not None:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                obj = device(bound.arguments)
+            timer = _Timer(_sink, phase, obj)
+            try:
+                result = yield from plan(*args, **kwargs)
+                if counts is not None:
+                    shots, dropped = counts(result)
+                    timer.finish(shots=shots, dropped=dropped)
+                return result
+            finally:
+                timer.finish()
+
+        return wrapper
+
+    return decorator
+
+
+class SpanRecorder(object):
+    """
+    Sink that keeps every span to summarize where an alignment spent its time
+
+    Phases nest, for instance the measurements inside of a walk, so besides
+    the total time of each phase the ``self`` time not spent in any phase
+    nested within it is reported. The self times add up to the time covered
+    by the outermost spans.
+
+    Attributes
+    ----------
+    spans : list of :class:`.Span`
+        Every span that has been recorded, in order of completion
+
+    Example
+    -------
+    .. code::
+
+        recorder = SpanRecorder()
+        set_sink(recorder)
+        RE(skywalker(...))
+        print(recorder.table())
+        recorder.export_chrome_trace('skywalker.json')
+    """
+
+    def __init__(self):
+        self.spans = list()
+
+    def record(self, span):
+        """
+        Keep a finished span
+        """
+        self.spans.append(span)
+
+    def clear(self):
+        """
+        Forget every span
+        """
+        self.spans.clear()
+
+    def self_times(self):
+        """
+        Time spent in each span outside of the spans nested within it
+
+        Returns
+        -------
+        times : list of float
+            Self time of each span in :attr:`.spans`
+        """
+        times = [span.duration for span in self.spans]
+        # Visit outer spans before the spans they contain
+        order = sorted(
+            range(len(self.spans)),
+            key=lambda i: (self.spans[i].start, -self.spans[i].duration),
+        )
+        ends = [span.start + span.duration for span in self.spans]
+        stack = list()
+        for i in order:
+            while stack and self.spans[i].start >= ends[stack[-1]]:
+                stack.pop()
+            if stack:
+                times[stack[-1]] -= self.spans[i].duration
+            stack.append(i)
+        return [max(t, 0.0) for t in times]
+
+    def breakdown(self):
+        """
+        Aggregate the spans by phase
+
+        Returns
+        -------
+        phases : dict
+            Each phase mapped to the ``count`` of spans, the ``total`` and
+            ``self`` time in seconds, and the number of ``shots`` and
+            ``dropped`` shots, in order of decreasing self time
+        """
+        phases = dict()
+        for span, own in zip(self.spans, self.self_times()):
+            entry = phases.setdefault(
+                span.phase,
+                {"count": 0, "total": 0.0, "self": 0.0, "shots": 0, "dropped": 0},
+            )
+            entry["count"] += 1
+            entry["total"] += span.duration
+            entry["self"] += own
+            entry["shots"] += span.shots or 0
+            entry["dropped"] += span.dropped or 0
+        return dict(sorted(phases.items(), key=lambda item: -item[1]["self"]))
+
+    def table(self):
+        """
+        Breakdown of the time spent in each phase
+
+        Returns
+        -------
+        table : prettytable.PrettyTable
+        """
+        pt = PrettyTable(
+            ["Phase", "Count", "Total (s)", "Self (s)", "Shots", "Dropped"]
+        )
+        pt.align = "r"
+        pt.align["Phase"] = "l"
+        pt.float_format = "8.3"
+        for phase, entry in self.breakdown().items():
+            pt.add_row(
+                [
+                    phase,
+                    entry["count"],
+                    entry["total"],
+                    entry["self"],
+                    entry["shots"],
+                    entry["dropped"],
+                ]
+            )
+        return pt
+
+    def chrome_trace(self):
+        """
+        The spans in the Chrome trace event format
+
+        The result can be loaded in ``chrome://tracing`` or Perfetto to view
+        the nested phases as a flame graph.
+
+        Returns
+        -------
+        trace : dict
+        """
+        events = list()
+        for span in self.spans:
+            events.append(
+                {
+                    "name": span.phase,
+                    "cat": "pswalker",
+                    "ph": "X",
+                    "ts": to_wall_clock(span.start) * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": 0,
+                    "tid": 0,
+                    "args": {
+                        "device": span.device,
+                        "shots": span.shots,
+                        "dropped": span.dropped,
+                    },
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        """
+        Write the spans to a Chrome trace JSON file
+
+        Parameters
+        ----------
+        path : str
+            Location of the trace file
+        """
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __repr__(self):
+        return "<SpanRecorder: {} spans>".format(len(self))
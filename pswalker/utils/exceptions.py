@@ -105,6 +105,12 @@ class MonitorException(PSWalkerException):
     pass
 
 
+class MonitorTimeoutError(MonitorException):
+    """Exception to be raised when monitors do not update in time."""
+
+    pass
+
+
 ################################################################################
 #                               Monitor Exceptions                             #
 ################################################################################
@@ -2,8 +2,9 @@
 # Standard #
 ############
 import logging
+import re
 import textwrap
-from collections import namedtuple
+from collections import deque, namedtuple
 
 from bluesky.callbacks import CallbackBase
 ###############
@@ -15,6 +16,8 @@ from prettytable import PrettyTable
 ##########
 # Module #
 ##########
+from .timing import Span, SpanRecorder, from_wall_clock
+
 logger = logging.getLogger(__name__)
 
 
@@ -50,6 +53,14 @@ class Watcher(CallbackBase):
     for the RunEngine to capture motion requests, and finally the
     `record_interruptions` flag should be set to True
 
+    The Watcher is also a sink for the timing spans of the alignment, see
+    :func:`.set_sink`. The time spent in each phase of the run, including
+    suspensions, is then broken down in the report
+
+    The motion of the mirrors and imagers is counted as the messages arrive,
+    only the most recent are kept in :attr:`.msgs`, so the Watcher can be left
+    running through alignments of any length
+
     Parameters
     ----------
     msg_hook : callable, optional
@@ -58,9 +69,12 @@ class Watcher(CallbackBase):
     report_hook : callable, optional
         Send the final report to another process, this will be done
         automatically at the end of a run
+
+    history : int, optional
+        Number of the most recent messages to keep for debugging
     """
 
-    def __init__(self, msg_hook=None, report_hook=None):
+    def __init__(self, msg_hook=None, report_hook=None, history=1000):
         # Hooks for displaying information
         self.msg_hook = msg_hook
         self.report_hook = report_hook or print
@@ -68,24 +82,50 @@ class Watcher(CallbackBase):
         self.summary = dict.fromkeys(RunSummary._fields, "")
         # Change default from str to int
         self.summary["suspension_count"] = 0
+        self.summary["suspended"] = 0.0
         self.summary["moves"] = 0
+        self.summary["cycles"] = 0
         self.last_known = dict()
-        self.msgs = list()
+        self.msgs = deque(maxlen=history)
         self.last_suspension = 0.0
+        self.timing = SpanRecorder()
+        # Names of the devices whose motion is counted
+        self._mirrors = frozenset()
+        self._detectors = frozenset()
+        self._detector_sets = 0
+        # Fields to keep the last value of, and the keys found to match them
+        self._field_matcher = None
+        self._tracked = dict()
 
     def start(self, doc):
         """
         Parse the start document for parameters of Skywalker run as well as
         start time
         """
-        self.summary["detectors"] = ", ".join(doc.get("detectors", []))
-        self.summary["mirrors"] = ", ".join(doc.get("mirrors", []))
+        detectors = doc.get("detectors", [])
+        mirrors = doc.get("mirrors", [])
+        self.summary["detectors"] = ", ".join(detectors)
+        self.summary["mirrors"] = ", ".join(mirrors)
         self.summary["pixels"] = ", ".join([str(goal) for goal in doc.get("goals", [])])
         self.summary["averaging"] = doc.get("plan_args", {}).get("averages")
         self.summary["tolerance"] = doc.get("plan_args", {}).get("tolerances")
         self.mot_fields = doc.get("plan_args", {}).get("mot_fields")
         self.det_fields = doc.get("plan_args", {}).get("det_fields")
         self.summary["elapsed"] = doc["time"]
+        # Break down the time of this run alone
+        self.timing.clear()
+        # Count the motion of this run
+        self._mirrors = frozenset(mirrors)
+        self._detectors = frozenset(detectors)
+        self.summary["moves"] = 0
+        self._detector_sets = 0
+        # Keys are tracked if they contain any of the fields
+        fields = list(self.mot_fields or []) + list(self.det_fields or [])
+        if fields:
+            self._field_matcher = re.compile("|".join(map(re.escape, fields)))
+        else:
+            self._field_matcher = None
+        self._tracked = dict()
         super().start(doc)
 
     def event(self, doc):
@@ -102,15 +142,33 @@ class Watcher(CallbackBase):
                 # Integrate suspension time
                 elif value == "resume":
                     self.summary["suspended"] += doc["time"] - self.last_suspension
+                    self.timing.record(
+                        Span(
+                            "suspended",
+                            None,
+                            from_wall_clock(self.last_suspension),
+                            doc["time"] - self.last_suspension,
+                            None,
+                            None,
+                        )
+                    )
             # Update device state caches
-            elif value and any(
-                [
-                    field in key
-                    for group in [self.mot_fields, self.det_fields]
-                    for field in group
-                ]
-            ):
-                self.last_known.update({key: value})
+            elif value and self._is_tracked(key):
+                self.last_known[key] = value
+
+    def _is_tracked(self, key):
+        """
+        Whether a key contains one of the fields of the run, remembering the
+        answer for the events to come
+        """
+        try:
+            return self._tracked[key]
+        except KeyError:
+            tracked = bool(
+                self._field_matcher is not None and self._field_matcher.search(key)
+            )
+            self._tracked[key] = tracked
+            return tracked
 
     def stop(self, doc):
         """
@@ -121,27 +179,8 @@ class Watcher(CallbackBase):
         self.summary["successful"] = doc["exit_status"]
         self.summary["reason"] = doc["reason"]
         self.summary["elapsed"] = doc["time"] - self.summary["elapsed"]
-        # Find
-        self.summary["moves"] = len(
-            [
-                msg
-                for msg in self.msgs
-                if (msg.command == "set" and msg.obj.name in self.summary["mirrors"])
-            ]
-        )
-        self.summary["cycles"] = round(
-            len(
-                [
-                    msg
-                    for msg in self.msgs
-                    if (
-                        msg.command == "set"
-                        and msg.obj.name in self.summary["detectors"]
-                    )
-                ]
-            )
-            / 2
-        )
+        # Each cycle moves an imager in and out
+        self.summary["cycles"] = round(self._detector_sets / 2)
         # Create last known table
         pt = PrettyTable(["Field", "Last Measured Value"])
 
@@ -181,18 +220,35 @@ class Watcher(CallbackBase):
         report = textwrap.fill(dedented, width=width)
         # Assemble full report
         report = "\n".join(["", report, "", str(self.summary["table"])])
+        # Break down where the time went
+        if self.timing.spans:
+            report = "\n".join([report, "", str(self.timing.table())])
         # Send report to optional hook
         if self.report_hook:
             self.report_hook(report)
         return report
 
+    def record(self, span):
+        """
+        Collect a timing span from an instrumented plan
+        """
+        self.timing.record(span)
+
     def __call__(self, *args):
         if len(args) > 1:
             super().__call__(*args)
         else:
-            self.msgs.append(args[0])
+            msg = args[0]
+            self.msgs.append(msg)
+            # Count the motion of the mirrors and imagers
+            if msg.command == "set":
+                name = getattr(msg.obj, "name", None)
+                if name in self._mirrors:
+                    self.summary["moves"] += 1
+                if name in self._detectors:
+                    self._detector_sets += 1
             if self.msg_hook:
-                self.msg_hook(args[0])
+                self.msg_hook(msg)
 
 
 report_tpl = """\